@@ -0,0 +1,175 @@
+# coding=utf-8
+
+"""
+Asyncio versions of the ``api`` functions (requires python 3.6+).
+
+Loading words and sampling passphrases run on an executor, the event
+loop's default executor unless another is provided, so that reading word
+files and the OS CSPRNG never blocks the event loop. Words are loaded
+into the same process-wide cache used by ``api``.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import asyncio
+import functools
+import itertools
+
+from . import api, internal
+
+# Number of passphrases generated per executor call by ``iter_passphrases``
+CHUNK_SIZE_DEFAULT = 256
+
+
+async def _run(executor, func, *args, **kwargs):
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+async def load_words(word_list=None, word_file=None, executor=None):
+    """
+    Load the words of builtin ``word_list`` and/or ``word_file`` into the cache.
+
+    Each is either a name or a list of names. Answers the cached words,
+    merged if there are several sources, as ``internal.WORDS_CACHE`` does.
+    """
+    if not word_list and not word_file:
+        raise ValueError("at least one of 'word_list' or 'word_file' is required")
+    sources = [("list", name) for name in api._as_list(word_list)]
+    sources.extend(("file", path) for path in api._as_list(word_file))
+    return await _run(executor, internal.WORDS_CACHE.get_merged, sources)
+
+
+async def passphrase_generator(executor=None, **params):
+    """
+    Make an ``api.PassphraseGenerator`` from ``params``.
+
+    The words are loaded on ``executor``, and the generator's methods
+    should also be called on an executor, since they read the OS CSPRNG.
+    """
+    return await _run(executor, api.PassphraseGenerator, **params)
+
+
+async def mkpassphrase(
+    word_list=None,
+    word_file=None,
+    entropy=None,
+    num_words=None,
+    random_case=True,
+    delimiter=internal.DELIMITER,
+    pad=internal.PAD,
+    min_len=None,
+    max_len=None,
+    charset=None,
+    exclude=None,
+    unique_prefix=None,
+    count=1,
+    executor=None,
+    unique=False,
+    stats=None,
+    seed=None,
+    schema=None,
+    max_length=None,
+    exact_length=None,
+):
+    """
+    Make one or more passphrases using the given params.
+
+    The params and result are the same as for ``api.mkpassphrase``,
+    except that the work is done on ``executor``.
+    """
+    if not isinstance(count, int) or count < 1:
+        raise ValueError("'count' must be a positive integer")
+    generator = await passphrase_generator(
+        executor,
+        word_list=word_list,
+        word_file=word_file,
+        entropy=entropy,
+        num_words=num_words,
+        random_case=random_case,
+        delimiter=delimiter,
+        pad=pad,
+        min_len=min_len,
+        max_len=max_len,
+        charset=charset,
+        exclude=exclude,
+        unique_prefix=unique_prefix,
+        stats=stats,
+        seed=seed,
+        schema=schema,
+        max_length=max_length,
+        exact_length=exact_length,
+    )
+    passphrases = await _run(executor, generator.generate_many, count, unique)
+    return (passphrases[0] if count == 1 else passphrases), generator.entropy
+
+
+async def iter_passphrases(
+    word_list=None,
+    word_file=None,
+    entropy=None,
+    num_words=None,
+    random_case=True,
+    delimiter=internal.DELIMITER,
+    pad=internal.PAD,
+    min_len=None,
+    max_len=None,
+    charset=None,
+    exclude=None,
+    unique_prefix=None,
+    count=None,
+    executor=None,
+    chunk_size=CHUNK_SIZE_DEFAULT,
+    unique=False,
+    stats=None,
+    seed=None,
+    schema=None,
+    max_length=None,
+    exact_length=None,
+):
+    """
+    Asynchronously iterate over passphrases made using the given params.
+
+    The params are the same as for ``api.iter_passphrases``, and the
+    iteration is endless if ``count`` is None. Passphrases are generated
+    on ``executor`` in chunks of ``chunk_size``, so at most one chunk is
+    held in memory at a time. Unlike ``api.iter_passphrases``, invalid
+    params are reported on first iteration.
+    """
+    if count is not None and (not isinstance(count, int) or count < 1):
+        raise ValueError("'count' must be a positive integer if provided")
+    if not isinstance(chunk_size, int) or chunk_size < 1:
+        raise ValueError("'chunk_size' must be a positive integer")
+    generator = await passphrase_generator(
+        executor,
+        word_list=word_list,
+        word_file=word_file,
+        entropy=entropy,
+        num_words=num_words,
+        random_case=random_case,
+        delimiter=delimiter,
+        pad=pad,
+        min_len=min_len,
+        max_len=max_len,
+        charset=charset,
+        exclude=exclude,
+        unique_prefix=unique_prefix,
+        stats=stats,
+        seed=seed,
+        schema=schema,
+        max_length=max_length,
+        exact_length=exact_length,
+    )
+    passphrases = generator.iterate(count, unique)
+    while True:
+        chunk = await _run(executor, _take, passphrases, chunk_size)
+        if not chunk:
+            break
+        for passphrase in chunk:
+            yield passphrase
+
+
+def _take(iterator, n):
+    return list(itertools.islice(iterator, n))
@@ -2,7 +2,743 @@
 
 from __future__ import absolute_import, division, print_function
 
-from . import internal
+import bisect
+import fractions
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from . import internal, vectorized
+
+# Maximum number of passphrases generated per task by worker processes
+WORKER_CHUNK_SIZE = 10000
+
+# Number of tasks per worker process that may be pending at a time
+WORKER_TASKS_PENDING = 2
+
+# Seconds to wait for any task to finish when output need not be ordered
+WORKER_POLL_INTERVAL = 0.01
+
+# Max fraction of the possible passphrases that may be generated as a batch
+# of unique passphrases, since drawing a new one takes ever more draws as the
+# batch approaches all possible passphrases
+UNIQUE_MAX_FRACTION = 0.5
+
+# Min number of passphrases generated at once for which NumPy is used if it
+# is installed, since its per-call overhead outweighs its speedup for fewer
+VECTORIZE_MIN_COUNT = 256
+
+# Number of passphrases generated at a time with NumPy when iterating
+VECTORIZE_CHUNK_SIZE = 4096
+
+# Prefix of the names of the metrics of ``Stats.to_prometheus``
+METRICS_PREFIX = "mkpassphrase"
+
+# generator of the current worker process, set by ``_init_worker``
+_worker_generator = None
+
+_timer = getattr(time, "perf_counter", time.time)
+
+
+class Stats(object):
+    """
+    Thread-safe counters and per-stage timings of passphrase generation.
+
+    A ``Stats`` may be passed as the ``stats`` param of the functions and
+    classes of this module, which then record in it:
+
+    - the ``loads`` of wordlists, ``cache_hits`` and ``cache_misses`` of
+      the words cache, ``urandom_bytes`` read from the OS CSPRNG, and
+      ``passphrases`` generated, as counters;
+    - the calls and total seconds of the ``load``, ``calculate`` (of the
+      number of words) and ``sample`` stages, as timings.
+
+    Other counters, timings and gauges may be recorded by callers, such
+    as the ``output`` stage by the command line.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.timings = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name, n=1):
+        """Add ``n`` to counter ``name``."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_time(self, stage, seconds, calls=1):
+        """Add ``calls`` calls taking ``seconds`` in total to ``stage``."""
+        with self._lock:
+            timing = self.timings.get(stage, (0, 0.0))
+            self.timings[stage] = (timing[0] + calls, timing[1] + seconds)
+
+    def set_gauge(self, name, value):
+        """Set gauge ``name`` to ``value``."""
+        with self._lock:
+            self.gauges[name] = value
+
+    @contextmanager
+    def timer(self, stage):
+        """Time the block of the ``with`` statement as a call of ``stage``."""
+        start = _timer()
+        try:
+            yield
+        finally:
+            self.add_time(stage, _timer() - start)
+
+    def as_dict(self):
+        """Answer a dict of the counters, timings and gauges."""
+        with self._lock:
+            timings = {
+                stage: {"calls": calls, "seconds": seconds}
+                for stage, (calls, seconds) in self.timings.items()
+            }
+            return {
+                "counters": dict(self.counters),
+                "timings": timings,
+                "gauges": dict(self.gauges),
+            }
+
+    def merge(self, data):
+        """Add the counters and timings of ``data``, a dict of ``as_dict``."""
+        for name, n in data["counters"].items():
+            self.incr(name, n)
+        for stage, timing in data["timings"].items():
+            self.add_time(stage, timing["seconds"], timing["calls"])
+
+    def clear(self):
+        """Reset all counters, timings and gauges."""
+        with self._lock:
+            self.counters.clear()
+            self.timings.clear()
+            self.gauges.clear()
+
+    def to_json(self):
+        """Answer the ``as_dict`` dict as JSON."""
+        return json.dumps(self.as_dict(), sort_keys=True)
+
+    def to_prometheus(self, prefix=METRICS_PREFIX):
+        """
+        Answer the stats in the Prometheus text exposition format.
+
+        Counters are named ``<prefix>_<name>_total``, gauges
+        ``<prefix>_<name>``, and timings are the ``<prefix>_stage_calls_total``
+        and ``<prefix>_stage_seconds_total`` counters labelled by ``stage``.
+        """
+        data = self.as_dict()
+        lines = []
+        for name, n in sorted(data["counters"].items()):
+            metric = "%s_%s_total" % (prefix, name)
+            lines.append("# TYPE %s counter" % metric)
+            lines.append("%s %d" % (metric, n))
+        for name, value in sorted(data["gauges"].items()):
+            metric = "%s_%s" % (prefix, name)
+            lines.append("# TYPE %s gauge" % metric)
+            lines.append("%s %r" % (metric, value))
+        timings = sorted(data["timings"].items())
+        for field, fmt in (("calls", "%d"), ("seconds", "%r")):
+            if not timings:
+                break
+            metric = "%s_stage_%s_total" % (prefix, field)
+            lines.append("# TYPE %s counter" % metric)
+            for stage, timing in timings:
+                value = fmt % timing[field]
+                lines.append('%s{stage="%s"} %s' % (metric, stage, value))
+        lines.append("")
+        return "\n".join(lines)
+
+    def to_text(self):
+        """Answer the stats as human-readable lines of text."""
+        data = self.as_dict()
+        lines = []
+        for name, n in sorted(data["counters"].items()):
+            lines.append("{:<16}{:>12}".format(name, n))
+        for name, value in sorted(data["gauges"].items()):
+            lines.append("{:<16}{:>12}".format(name, value))
+        for stage, timing in sorted(data["timings"].items()):
+            lines.append(
+                "{:<16}{:>12.6f} s in {} calls".format(
+                    stage + " time", timing["seconds"], timing["calls"]
+                )
+            )
+        lines.append("")
+        return "\n".join(lines)
+
+
+class PassphraseGenerator(object):
+    """
+    Reusable passphrase generator for a fixed passphrase policy.
+
+    The words are loaded and the number of words and entropy are calculated
+    once, when the generator is created, so that generating passphrases
+    only costs the sampling of words. The params are the same as the
+    corresponding params of ``mkpassphrase``.
+
+    The ``words`` (after filtering), ``word_filter``, ``num_words`` and
+    ``entropy`` attributes are available after construction and should be
+    treated as read-only.
+
+    The words of several lists and files are merged into one sorted tuple
+    of unique words, cached by ``internal.WORDS_CACHE`` like the words of
+    each of them, so they are loaded once however they are combined. With
+    a ``schema``, ``words`` are the merged words of all of its positions,
+    and ``positions`` is a tuple of the indices into ``words`` of the words
+    of each position, so passphrases are sampled, packed and rendered as
+    indices into one table (``positions`` is None without a ``schema``).
+
+    With a ``max_length`` or ``exact_length``, passphrases are sampled
+    uniformly from those of at most or exactly that many characters, and
+    ``entropy`` is that of their exact number, using the
+    ``internal.LengthTable`` of the words, ``length_table`` (None
+    otherwise), so no passphrase is drawn again for being too long.
+
+    If ``stats`` (a ``Stats``) is provided, the loading of the words, the
+    calculation of the number of words, and each passphrase generated are
+    recorded in it.
+
+    Random bytes are read from the OS CSPRNG, unless ``random_source`` is
+    provided, a callable like ``os.urandom``, or ``seed`` is provided, in
+    which case they are read from an ``internal.SeededSource`` of the seed,
+    which is FOR TESTING ONLY: the same seed always generates the same
+    passphrases, so they are only as secret as the seed.
+
+    Batches of at least ``VECTORIZE_MIN_COUNT`` passphrases are generated
+    with NumPy (see ``vectorized``) if it is installed, unless
+    ``vectorize`` is false, or a ``seed`` is provided, so that seeded
+    passphrases don't depend on whether NumPy is installed. If
+    ``vectorize`` is true, NumPy is required.
+    """
+
+    def __init__(
+        self,
+        word_list=None,
+        word_file=None,
+        entropy=None,
+        num_words=None,
+        random_case=True,
+        delimiter=internal.DELIMITER,
+        pad=internal.PAD,
+        min_len=None,
+        max_len=None,
+        charset=None,
+        exclude=None,
+        unique_prefix=None,
+        stats=None,
+        seed=None,
+        random_source=None,
+        vectorize=None,
+        schema=None,
+        max_length=None,
+        exact_length=None,
+    ):
+        if schema is not None:
+            if word_list or word_file:
+                msg = "'schema' can't be combined with 'word_list' or 'word_file'"
+                raise ValueError(msg)
+            if not schema or isinstance(schema, internal.TEXT_TYPES):
+                raise ValueError("'schema' must be a non-empty list")
+            if num_words is not None and num_words != len(schema):
+                raise ValueError("'num_words' must be the length of 'schema'")
+        elif not word_list and not word_file:
+            raise ValueError("at least one of 'word_list' or 'word_file' is required")
+        if num_words is not None and (not isinstance(num_words, int) or num_words < 1):
+            raise ValueError("'num_words' must be a positive integer if provided")
+        for name, value in (("max_length", max_length), ("exact_length", exact_length)):
+            if value is not None and (not isinstance(value, int) or value < 1):
+                raise ValueError("'%s' must be a positive integer if provided" % name)
+        if max_length is not None and exact_length is not None:
+            raise ValueError("only one of 'max_length' or 'exact_length' is allowed")
+        length = max_length or exact_length
+        if length and schema is not None:
+            msg = "'schema' can't be combined with 'max_length' or 'exact_length'"
+            raise ValueError(msg)
+        if seed is not None:
+            if random_source is not None:
+                raise ValueError("only one of 'seed' or 'random_source' is allowed")
+            random_source = internal.SeededSource(seed)
+        if vectorize and vectorized.numpy_module() is None:
+            raise ValueError("'vectorize' requires numpy to be installed")
+
+        word_filter = internal.WordFilter(
+            min_len=min_len,
+            max_len=max_len,
+            charset=charset,
+            exclude=exclude,
+            unique_prefix=unique_prefix,
+        )
+        cache = internal.WORDS_CACHE
+        start = _timer()
+        positions = None
+        if schema is None:
+            sources = [("list", name) for name in _as_list(word_list)]
+            sources.extend(("file", path) for path in _as_list(word_file))
+            words = cache.get_merged(sources, word_filter, stats)
+        else:
+            sources = [internal.word_sources(names) for names in schema]
+            words, positions = cache.get_schema(sources, word_filter, stats)
+        if stats is not None:
+            stats.add_time("load", _timer() - start)
+            start = _timer()
+
+        # if num words not provided, we calculate how many to
+        # use based on entropy target provided (or default if not provided)
+        length_table = None
+        if length:
+            length_table, actual_entropy = internal.calculate_length_table(
+                words,
+                length,
+                entropy,
+                num_words,
+                random_case,
+                delimiter,
+                pad,
+                exact=exact_length is not None,
+            )
+            num_words = length_table.num_words
+        elif positions is not None:
+            num_words = len(positions)
+            actual_entropy = internal.calculate_schema_entropy(
+                [len(position) for position in positions], random_case
+            )
+            if entropy is not None and actual_entropy < entropy:
+                msg = "entropy bits (%s) for %d words is less than %d"
+                msg %= (int(actual_entropy), num_words, entropy)
+                raise ValueError(msg)
+        elif num_words is None:
+            num_words, actual_entropy = internal.calculate_num_words(
+                len(words), entropy=entropy, random_case=random_case
+            )
+        else:
+            actual_entropy = internal.calculate_entropy(
+                len(words), num_words, random_case
+            )
+            if entropy is not None and actual_entropy < entropy:
+                msg = "entropy bits (%s) for %d words is less than %d"
+                msg %= (int(actual_entropy), num_words, entropy)
+                raise ValueError(msg)
+        if stats is not None:
+            stats.add_time("calculate", _timer() - start)
+
+        self.words = words
+        self.positions = positions
+        self.length_table = length_table
+        self.max_length = max_length
+        self.exact_length = exact_length
+        self.word_filter = word_filter
+        self.num_words = num_words
+        self.entropy = actual_entropy
+        self.random_case = random_case
+        self.delimiter = delimiter
+        self.pad = pad
+        self.stats = stats
+        self.seed = seed
+        self.vectorize = vectorize
+        self._word_table = None
+        self._max_word_parts = None
+        self._cased_table = None
+        # words whose case bit is always cleared, since they render the same
+        self._caseless = internal.caseless_indices(words) if random_case else ()
+        if stats is None and random_source is None:
+            self._rand = internal.RANDOM_BUFFER
+        else:
+            self._rand = internal.RandomBuffer(stats=stats, source=random_source)
+
+    def generate(self):
+        """Generate a single passphrase."""
+        rand, k, stats = self._rand, self.num_words, self.stats
+        if stats is not None:
+            start = _timer()
+        positions = self.positions
+        if self.length_table is not None:
+            indices = self.length_table.sample(rand)
+        elif positions is None:
+            indices = internal.sample_indices(len(self.words), k, rand)
+        else:
+            indices = [pos[rand.randbelow(len(pos))] for pos in positions]
+        case_bits = rand.randbits(k) if self.random_case else 0
+        passphrase = internal.render_words(
+            self.words, indices, case_bits, self.delimiter
+        )
+        if stats is not None:
+            stats.add_time("sample", _timer() - start)
+            stats.incr("passphrases")
+        return self.pad + passphrase + self.pad
+
+    def sample(self):
+        """
+        Sample the word indices and case bits of a passphrase, without rendering it.
+
+        Answers ``(indices, case_bits)``, a tuple of the distinct indices of
+        the words and an int, where the ``j``-th word of the passphrase is
+        ``words[indices[j]]``, title-cased if bit ``j`` of ``case_bits`` is
+        set. With a ``schema``, the indices need not be distinct, but the
+        ``j``-th is one of ``positions[j]``.
+        """
+        rand, k = self._rand, self.num_words
+        if self.length_table is not None:
+            indices = self.length_table.sample(rand)
+        elif self.positions is None:
+            indices = internal.sample_indices(len(self.words), k, rand)
+        else:
+            indices = [pos[rand.randbelow(len(pos))] for pos in self.positions]
+        case_bits = rand.randbits(k) if self.random_case else 0
+        return tuple(indices), case_bits
+
+    def render(self, indices, case_bits=0):
+        """Render the passphrase of word ``indices`` and ``case_bits``."""
+        passphrase = internal.render_words(
+            self.words, indices, case_bits, self.delimiter
+        )
+        return self.pad + passphrase + self.pad
+
+    def pack(self, indices, case_bits=0):
+        """
+        Pack word ``indices`` and ``case_bits`` into an int key.
+
+        Keys are less than ``num_keys()``, so they take about ``entropy / 8``
+        bytes. The case bit of a word that is the same in title case is
+        cleared, so each distinct passphrase has one key.
+        """
+        case_width = self.num_words if self.random_case else 0
+        if self._caseless:
+            case_bits = self._clear_caseless(indices, case_bits)
+        if self.positions is not None:
+            key = 0
+            for pos, i in zip(self.positions, indices):
+                digit = bisect.bisect_left(pos, i)
+                if digit == len(pos) or pos[digit] != i:
+                    raise ValueError("word index %d is not in its position" % i)
+                key = key * len(pos) + digit
+            return (key << case_width) | case_bits
+        return internal.pack_indices(indices, len(self.words), case_bits, case_width)
+
+    def unpack(self, key):
+        """Answer the ``(indices, case_bits)`` of int ``key``."""
+        case_width = self.num_words if self.random_case else 0
+        if self.positions is not None:
+            if not 0 <= key < self.num_possible():
+                raise ValueError("key out of range")
+            case_bits = key & ((1 << case_width) - 1)
+            key >>= case_width
+            indices = []
+            for pos in reversed(self.positions):
+                key, digit = divmod(key, len(pos))
+                indices.append(pos[digit])
+            return tuple(reversed(indices)), case_bits
+        indices, case_bits = internal.unpack_indices(
+            key, len(self.words), self.num_words, case_width
+        )
+        return tuple(indices), case_bits
+
+    def _clear_caseless(self, indices, case_bits):
+        """Answer ``case_bits`` without the bits of the caseless words."""
+        caseless = self._caseless
+        for j, i in enumerate(indices):
+            if i in caseless:
+                case_bits &= ~(1 << j)
+        return case_bits
+
+    def generate_key(self):
+        """Generate the int key of a single passphrase, without rendering it."""
+        return self.pack(*self.sample())
+
+    def decode(self, key):
+        """Render the passphrase of int ``key``."""
+        return self.render(*self.unpack(key))
+
+    def encode(self, passphrase):
+        """
+        Answer the int key of ``passphrase``, the inverse of ``decode``.
+
+        Raises ``ValueError`` if ``passphrase`` could not have been
+        generated by this generator. A word that is the same in title case
+        is encoded as not title-cased, so ``encode(decode(key))`` may differ
+        from ``key``, but ``decode(encode(passphrase))`` is ``passphrase``.
+        Words that contain the delimiter (like "t-shirt") are found by
+        joining parts of the passphrase split at each delimiter.
+        """
+        if self.max_length is not None and len(passphrase) > self.max_length:
+            raise ValueError(
+                "passphrase is longer than %d characters" % self.max_length
+            )
+        if self.exact_length is not None and len(passphrase) != self.exact_length:
+            raise ValueError("passphrase is not %d characters" % self.exact_length)
+        pad = self.pad
+        if pad:
+            if (
+                len(passphrase) < 2 * len(pad)
+                or not passphrase.startswith(pad)
+                or not passphrase.endswith(pad)
+            ):
+                raise ValueError("passphrase is not padded with %r" % pad)
+            passphrase = passphrase[len(pad) : len(passphrase) - len(pad)]
+        if not self.delimiter:
+            raise ValueError("can't encode passphrases without a delimiter")
+        parts = passphrase.split(self.delimiter)
+        if len(parts) > self.num_words:
+            # some words may contain the delimiter, and so span several parts
+            found = self._join_parts(parts)
+            if found is not None:
+                return self.pack(*found)
+        if len(parts) != self.num_words:
+            raise ValueError("passphrase must have %d words" % self.num_words)
+        indices, case_bits = [], 0
+        for j, part in enumerate(parts):
+            i, title = self._lookup(part)
+            if i is None:
+                raise ValueError("not a word of the wordlist: %r" % part)
+            indices.append(i)
+            case_bits |= title << j
+        if self.positions is None and len(set(indices)) != len(indices):
+            raise ValueError("passphrase has repeated words")
+        return self.pack(indices, case_bits)
+
+    def _join_parts(self, parts):
+        """
+        Answer the ``(indices, case_bits)`` of the words joined from ``parts``.
+
+        The ``parts`` are the consecutive parts of a passphrase split at each
+        delimiter, joined the first way into ``num_words`` words that the
+        passphrase could have been generated from. Answers None if there is
+        no such way.
+        """
+        if self._max_word_parts is None:
+            delimiter = self.delimiter
+            self._max_word_parts = 1 + max(w.count(delimiter) for w in self.words)
+        max_parts, k, positions = self._max_word_parts, self.num_words, self.positions
+
+        def join(start, j, indices, case_bits):
+            if j == k:
+                return (indices, case_bits) if start == len(parts) else None
+            # leave at least one part for each of the remaining words
+            stop = min(start + max_parts, len(parts) - (k - j - 1))
+            for end in range(start + 1, stop + 1):
+                i, title = self._lookup(self.delimiter.join(parts[start:end]))
+                if i is None:
+                    continue
+                if positions is None:
+                    if i in indices:
+                        continue
+                else:
+                    digit = bisect.bisect_left(positions[j], i)
+                    if digit == len(positions[j]) or positions[j][digit] != i:
+                        continue
+                found = join(end, j + 1, indices + [i], case_bits | title << j)
+                if found is not None:
+                    return found
+            return None
+
+        return join(0, 0, [], 0)
+
+    def _lookup(self, part):
+        """
+        Answer ``(i, title)``, the index of the word ``part`` is and its case.
+
+        ``title`` is 1 if the word is title-cased. Answers ``(None, 0)`` if
+        ``part`` is not a word.
+        """
+        i = self._index(part)
+        if i is None and self.random_case:
+            i = self._index(part.lower())
+            if i is not None and self.words[i].title() == part:
+                return i, 1
+            return None, 0
+        return i, 0
+
+    def _index(self, word):
+        words = self.words
+        i = bisect.bisect_left(words, word)
+        return i if i < len(words) and words[i] == word else None
+
+    def num_possible(self):
+        """
+        Answer the number of possible distinct passphrases.
+
+        A word that is the same in title case (like "100") adds one
+        passphrase, not two, even if ``random_case``.
+        """
+        caseless, k = self._caseless, self.num_words
+        if self.length_table is not None:
+            if caseless:
+                return self._cased_length_table().num_possible()
+            possible = self.length_table.num_possible()
+        elif self.positions is None:
+            if caseless:
+                n = len(self.words)
+                return internal.num_possible_cased(n - len(caseless), len(caseless), k)
+            possible = internal.num_possible(len(self.words), k)
+        else:
+            possible = 1
+            for pos in self.positions:
+                cased = sum(1 for i in pos if i not in caseless)
+                possible *= len(pos) + cased if self.random_case else len(pos)
+            return possible
+        return possible << k if self.random_case else possible
+
+    def _cased_length_table(self):
+        """
+        Answer the ``length_table`` of the words split by caseness.
+
+        Each word that may be title-cased counts twice, so the table's
+        ``num_possible()`` is that of the passphrases as rendered.
+        """
+        if self._cased_table is None:
+            table, caseless = self.length_table, self._caseless
+            buckets, weights = [], []
+            for size, indices in table.buckets:
+                for weight in (2, 1):
+                    bucket = tuple(
+                        i for i in indices if (i in caseless) == (weight == 1)
+                    )
+                    if bucket:
+                        buckets.append((size, bucket))
+                        weights.append(weight)
+            self._cased_table = internal.LengthTable(
+                buckets, table.num_words, table.chars, table.exact, weights
+            )
+        return self._cased_table
+
+    def num_keys(self):
+        """Answer the number of keys of ``pack``."""
+        if self.positions is not None:
+            possible = 1
+            for pos in self.positions:
+                possible *= len(pos)
+        else:
+            possible = internal.num_possible(len(self.words), self.num_words)
+        return possible << self.num_words if self.random_case else possible
+
+    def generate_many(self, count, unique=False):
+        """
+        Generate a list of ``count`` passphrases.
+
+        If ``unique`` is true, the passphrases are all different.
+        """
+        if not isinstance(count, int) or count < 1:
+            raise ValueError("'count' must be a positive integer")
+        if unique:
+            return list(self.iterate(count, unique))
+        if count >= VECTORIZE_MIN_COUNT and self._vectorized():
+            return self._generate_vectorized(count)
+        return [self.generate() for _ in range(count)]
+
+    def iterate(self, count=None, unique=False):
+        """
+        Iterate over ``count`` passphrases, or endlessly if ``count`` is None.
+
+        Passphrases are generated lazily, so memory use does not depend
+        on ``count``, unless ``unique`` is true. Then the passphrases are
+        all different, since each draw of word indices and case bits is
+        remembered in an ``internal.SeenSet``, which takes a few bytes
+        per passphrase, and drawn again if it was drawn before. A ``count``
+        is then required, and must be at most ``UNIQUE_MAX_FRACTION`` of
+        the number of possible passphrases.
+        """
+        if count is not None and (not isinstance(count, int) or count < 1):
+            raise ValueError("'count' must be a positive integer")
+        if not unique:
+            return self._iterate(count)
+        if count is None:
+            raise ValueError("'count' is required if 'unique' is true")
+        possible = self.num_possible()
+        # exact, since the number of possible passphrases may overflow a float
+        if count > possible * fractions.Fraction(UNIQUE_MAX_FRACTION):
+            msg = "'count' (%d) must be at most %s of the %d possible passphrases"
+            raise ValueError(msg % (count, UNIQUE_MAX_FRACTION, possible))
+        return self._iterate_unique(count)
+
+    def _iterate(self, count):
+        if (count is None or count >= VECTORIZE_MIN_COUNT) and self._vectorized():
+            while count is None or count > 0:
+                size = VECTORIZE_CHUNK_SIZE
+                if count is not None:
+                    size = min(size, count)
+                    count -= size
+                for passphrase in self._generate_vectorized(size):
+                    yield passphrase
+            return
+        if count is None:
+            while True:
+                yield self.generate()
+        for _ in range(count):
+            yield self.generate()
+
+    def _vectorized(self):
+        """Answer whether batches of passphrases are generated with NumPy."""
+        if self._word_table is None:
+            use = (
+                self.vectorize is not False
+                and self.seed is None
+                and self.positions is None
+                and self.length_table is None
+                and vectorized.supports(len(self.words), self.num_words)
+            )
+            self._word_table = use and vectorized.WordTable(
+                self.words, self.random_case
+            )
+        return bool(self._word_table)
+
+    def _generate_vectorized(self, count):
+        stats = self.stats
+        if stats is not None:
+            start = _timer()
+        passphrases = vectorized.generate(
+            self._word_table,
+            self._rand,
+            count,
+            self.num_words,
+            self.delimiter,
+            self.pad,
+        )
+        if stats is not None:
+            stats.add_time("sample", _timer() - start, count)
+            stats.incr("passphrases", count)
+        return passphrases
+
+    def _iterate_unique(self, count):
+        words, n, k = self.words, len(self.words), self.num_words
+        rand, stats = self._rand, self.stats
+        case_width = k if self.random_case else 0
+        seen = internal.SeenSet(self.num_keys(), count)
+        while len(seen) < count:
+            if stats is not None:
+                start = _timer()
+            if self.positions is not None or self.length_table is not None:
+                indices, case_bits = self.sample()
+                key = self.pack(indices, case_bits)
+            else:
+                indices = internal.sample_indices(n, k, rand)
+                case_bits = rand.randbits(k) if case_width else 0
+                if self._caseless:
+                    case_bits = self._clear_caseless(indices, case_bits)
+                key = internal.pack_indices(indices, n, case_bits, case_width)
+            if not seen.add(key):
+                if stats is not None:
+                    stats.incr("duplicates")
+                continue
+            passphrase = internal.render_words(
+                words, indices, case_bits, self.delimiter
+            )
+            if stats is not None:
+                stats.add_time("sample", _timer() - start)
+                stats.incr("passphrases")
+            yield self.pad + passphrase + self.pad
+
+    def __iter__(self):
+        """Iterate over an endless sequence of passphrases."""
+        return self.iterate()
+
+
+def _as_list(names):
+    if not names:
+        return []
+    if isinstance(names, internal.TEXT_TYPES):
+        return [names]
+    return list(names)
 
 
 def mkpassphrase(
@@ -13,16 +749,37 @@ def mkpassphrase(
     random_case=True,
     delimiter=internal.DELIMITER,
     pad=internal.PAD,
+    min_len=None,
+    max_len=None,
+    charset=None,
+    exclude=None,
+    unique_prefix=None,
     count=1,
+    workers=None,
+    ordered=True,
+    unique=False,
+    stats=None,
+    seed=None,
+    schema=None,
+    max_length=None,
+    exact_length=None,
 ):
     """
     Make one or more passphrases using the given params.
 
+    If any of the word filter params (``min_len``, ``max_len``, ``charset``,
+    ``exclude`` and ``unique_prefix``) are provided, only words that pass
+    all of them are used, and the number of words and entropy are based
+    on the number of words left after filtering.
+
     :params:
-    - word_list: name of a builtin wordlist ('eff-large', 'eff1', or 'eff2')
+    - word_list: name of a builtin wordlist ('eff-large', 'eff1', or 'eff2'),
+            or a list of names.
     - word_file: path to a word file, one word per line, encoded with a
             character encoding that is compatible with the python default
-            encoding if ``ascii`` is true.
+            encoding if ``ascii`` is true, or a list of paths. The words of
+            all of the lists and files are merged into one sorted list of
+            unique words.
     - entropy: optional bits of entropy minimum that will be used to
            calculate the number of words to use if ``num_words`` not provided,
            or used to verify ``num_words`` is sufficient if both provided.
@@ -34,48 +791,288 @@ def mkpassphrase(
              probability 0.5
     - delimiter: the delimiter to use for joining the words in the passphrase.
     - pad: a string to use as a prefix and suffix of the generated passphrase.
+    - min_len: optional minimum length of words to use.
+    - max_len: optional maximum length of words to use.
+    - charset: optional string of the only characters that words may contain.
+    - exclude: optional iterable of words not to use.
+    - unique_prefix: optional number of leading characters that no two words
+             may have in common; of the words that do, only the first in
+             sorted order is used.
     - count: positive integer representing the number of passwords to generate,
              defaulting to 1. If greater than one, the ``passphrase`` returned
              will be a list of passphrases. If equal to one, the ``passphrase``
              will be just a string passphrase and not a one-element list.
+    - workers: optional number of worker processes to split the generation
+             of ``count`` passphrases between.
+    - ordered: whether the passphrases of worker processes are returned in
+             the order the work was split (the default), or as each
+             worker finishes, which is faster if ``workers`` is provided.
+    - unique: whether the ``count`` passphrases must all be different, which
+             requires ``count`` to be at most ``UNIQUE_MAX_FRACTION`` of the
+             number of possible passphrases, and can't be combined with
+             ``workers``.
+    - stats: optional ``Stats`` in which to record counters and timings of
+             the generation, including that of worker processes.
+    - seed: optional seed (bytes, string or int) FOR TESTING ONLY, to
+             generate the same passphrases for the same seed and params
+             from an ``internal.SeededSource`` instead of the OS CSPRNG.
+    - schema: optional list with the words of each position of the
+             passphrase, instead of ``word_list`` and ``word_file``: the name
+             of a builtin wordlist or the path of a word file, or a list of
+             them to merge. Each word is chosen independently from the
+             words of its position, so ``num_words`` is the length of the
+             schema.
+    - max_length: optional max number of characters of the passphrases,
+             including the delimiters and pad. The passphrases are chosen
+             uniformly from those that fit, and the number of words and
+             entropy are based on the exact number of them.
+    - exact_length: optional exact number of characters of the passphrases,
+             like ``max_length``.
 
     :return:
     - passphrase: the generated passphrase (string) or list of passphrases
     - entropy bits: entropy in bits of the generated passphrase(s)
     """
-    if not bool(word_file) ^ bool(word_list):
-        raise ValueError("exactly one of 'word_list' or " "'word_file' is required")
-    if num_words is not None and (not isinstance(num_words, int) or num_words < 1):
-        raise ValueError("'num_words' must be a positive integer if provided")
     if not isinstance(count, int) or count < 1:
         raise ValueError("'count' must be a positive integer")
 
-    load, src = (
-        (internal.load_words_from_file, word_file)
-        if word_file
-        else (internal.load_words_from_list, word_list)
+    passphrases, actual_entropy = iter_passphrases(
+        word_list=word_list,
+        word_file=word_file,
+        entropy=entropy,
+        num_words=num_words,
+        random_case=random_case,
+        delimiter=delimiter,
+        pad=pad,
+        min_len=min_len,
+        max_len=max_len,
+        charset=charset,
+        exclude=exclude,
+        unique_prefix=unique_prefix,
+        count=count,
+        workers=workers,
+        ordered=ordered,
+        unique=unique,
+        stats=stats,
+        seed=seed,
+        schema=schema,
+        max_length=max_length,
+        exact_length=exact_length,
     )
-    words = load(src)
+    passphrases = list(passphrases)
+    return (passphrases[0] if count == 1 else passphrases), actual_entropy
 
-    # if num words not provided, we calculate how many to
-    # use based on entropy target provided (or default if not provided)
-    if num_words is None:
-        num_words, actual_entropy = internal.calculate_num_words(
-            len(words), entropy=entropy, random_case=random_case
-        )
-    else:
-        actual_entropy = internal.calculate_entropy(len(words), num_words, random_case)
-        if entropy is not None and actual_entropy < entropy:
-            msg = "entropy bits (%s) for %d words is less than %d"
-            msg %= (int(actual_entropy), num_words, entropy)
-            raise ValueError(msg)
 
-    passphrases = []
-    for _ in range(count):
-        passphrase = internal.sample_words(
-            words, num_words, delimiter=delimiter, random_case=random_case
-        )
-        passphrase = pad + passphrase + pad
-        passphrases.append(passphrase)
+def iter_passphrases(
+    word_list=None,
+    word_file=None,
+    entropy=None,
+    num_words=None,
+    random_case=True,
+    delimiter=internal.DELIMITER,
+    pad=internal.PAD,
+    min_len=None,
+    max_len=None,
+    charset=None,
+    exclude=None,
+    unique_prefix=None,
+    count=None,
+    workers=None,
+    ordered=True,
+    unique=False,
+    stats=None,
+    seed=None,
+    schema=None,
+    max_length=None,
+    exact_length=None,
+):
+    """
+    Make an iterator of passphrases using the given params.
 
-    return (passphrases[0] if count == 1 else passphrases), actual_entropy
+    The params are the same as for ``mkpassphrase``, except that ``count``
+    defaults to None, meaning the iterator is endless. Passphrases are
+    generated only as the iterator is consumed, so this is suitable for
+    generating very many passphrases in constant memory. Invalid params
+    are reported immediately rather than on first iteration.
+
+    If ``workers`` is provided, ``count`` is required, and the passphrases
+    are generated in chunks by a pool of that many worker processes, each
+    of which loads the words once and samples from its own OS CSPRNG.
+    The number of chunks pending at a time is bounded, so memory use
+    stays constant if the iterator is consumed slowly.
+
+    :return:
+    - passphrases: an iterator of passphrase strings
+    - entropy bits: entropy in bits of the generated passphrases
+    """
+    if count is not None and (not isinstance(count, int) or count < 1):
+        raise ValueError("'count' must be a positive integer if provided")
+    if workers is not None:
+        if not isinstance(workers, int) or workers < 1:
+            raise ValueError("'workers' must be a positive integer if provided")
+        if count is None:
+            raise ValueError("'count' is required if 'workers' is provided")
+        if unique and workers > 1:
+            raise ValueError("'unique' can't be combined with 'workers'")
+
+    params = dict(
+        word_list=word_list,
+        word_file=word_file,
+        entropy=entropy,
+        num_words=num_words,
+        random_case=random_case,
+        delimiter=delimiter,
+        pad=pad,
+        min_len=min_len,
+        max_len=max_len,
+        charset=charset,
+        exclude=exclude,
+        unique_prefix=unique_prefix,
+        seed=seed,
+        schema=schema,
+        max_length=max_length,
+        exact_length=exact_length,
+    )
+    generator = PassphraseGenerator(stats=stats, **params)
+    if not workers or workers == 1 or count == 1:
+        return generator.iterate(count, unique), generator.entropy
+
+    # workers don't need to recalculate the number of words
+    params["num_words"] = generator.num_words
+    passphrases = _iter_parallel(params, count, workers, ordered, stats)
+    return passphrases, generator.entropy
+
+
+def optimize_length(
+    entropy=None,
+    word_list=None,
+    word_file=None,
+    min_len=None,
+    max_len=None,
+    random_case=True,
+    delimiter=internal.DELIMITER,
+    pad=internal.PAD,
+    charset=None,
+    exclude=None,
+):
+    """
+    Find the params of the shortest expected passphrases of ``entropy`` bits.
+
+    Each of the builtin wordlists ``word_list`` and word files ``word_file``
+    (a name or a list of names, or all of the builtin wordlists if neither
+    is provided) is a candidate, and so is each min and max word length
+    unless ``min_len`` or ``max_len`` is provided, and each of
+    ``random_case`` and ``delimiter`` if a list is provided. The words of
+    each candidate wordlist are filtered by ``charset`` and ``exclude``,
+    and the configs are searched by ``internal.shortest_config`` using the
+    ``internal.length_histogram`` of the words, which is cached with them.
+
+    :return:
+    - params: dict of the ``PassphraseGenerator`` params of the config
+    - expected_length: expected number of characters of its passphrases
+    """
+    sources = [("list", name) for name in _as_list(word_list)]
+    sources.extend(("file", path) for path in _as_list(word_file))
+    if not sources:
+        sources = [("list", name) for name in sorted(internal.WORD_LISTS)]
+    word_filter = internal.WordFilter(charset=charset, exclude=exclude)
+    histograms = []
+    for source in sources:
+        words = internal.WORDS_CACHE.get_merged([source], word_filter)
+        histograms.append((source, internal.length_histogram(words)))
+    config = internal.shortest_config(
+        histograms,
+        entropy,
+        None if min_len is None else [min_len],
+        None if max_len is None else [max_len],
+        random_case if isinstance(random_case, (list, tuple)) else [random_case],
+        _as_list(delimiter) or [delimiter],
+        pad,
+    )
+    kind, src = config["source"]
+    params = {
+        "word_list" if kind == "list" else "word_file": src,
+        "entropy": entropy,
+        "num_words": config["num_words"],
+        "random_case": config["random_case"],
+        "delimiter": config["delimiter"],
+        "pad": pad,
+        "min_len": config["min_len"],
+        "max_len": config["max_len"],
+        "charset": charset,
+        "exclude": exclude,
+    }
+    return params, config["expected_length"]
+
+
+def _init_worker(params, with_stats):
+    global _worker_generator
+    stats = Stats() if with_stats else None
+    _worker_generator = PassphraseGenerator(stats=stats, **params)
+
+
+def _generate_chunk(index, size):
+    generator = _worker_generator
+    if generator.seed is not None:
+        # each chunk has its own stream of the seed, so that the passphrases
+        # don't depend on which worker generates which chunk
+        source = internal.SeededSource(generator.seed, index + 1)
+        generator._rand = internal.RandomBuffer(stats=generator.stats, source=source)
+    passphrases = generator.generate_many(size)
+    stats = generator.stats
+    if stats is None:
+        return passphrases, None
+    data = stats.as_dict()
+    stats.clear()
+    return passphrases, data
+
+
+def _iter_parallel(params, count, workers, ordered, stats=None):
+    """
+    Iterate over ``count`` passphrases generated by ``workers`` processes.
+
+    Each worker builds its generator from the ``PassphraseGenerator`` params
+    once, and then generates chunks of passphrases on request. Bytes of the
+    CSPRNG that are buffered by the parent process are never used by a
+    worker, since ``internal.RandomBuffer`` discards them after a fork.
+    If ``stats`` is provided, the stats recorded by each worker since its
+    last chunk are returned with each chunk and merged into ``stats``.
+    If the params include a ``seed``, each chunk is generated from its own
+    stream of the seed, so the passphrases only depend on the seed, the
+    params, ``count`` and ``workers``.
+    """
+    import multiprocessing
+
+    chunk_size = min(WORKER_CHUNK_SIZE, -(-count // workers))
+    sizes = [chunk_size] * (count // chunk_size)
+    if count % chunk_size:
+        sizes.append(count % chunk_size)
+    sizes = enumerate(sizes)
+
+    pool = multiprocessing.Pool(workers, _init_worker, (params, stats is not None))
+    try:
+        pending = deque()
+        for args in sizes:
+            pending.append(pool.apply_async(_generate_chunk, args))
+            if len(pending) == workers * WORKER_TASKS_PENDING:
+                break
+        while pending:
+            if ordered:
+                result = pending.popleft()
+            else:
+                result = next((r for r in pending if r.ready()), None)
+                if result is None:
+                    pending[0].wait(WORKER_POLL_INTERVAL)
+                    continue
+                pending.remove(result)
+            chunk, data = result.get()
+            if data is not None:
+                stats.merge(data)
+            for args in sizes:
+                pending.append(pool.apply_async(_generate_chunk, args))
+                break
+            for passphrase in chunk:
+                yield passphrase
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,266 @@
+# coding=utf-8
+
+"""
+Benchmarks for mkpassphrase, run as `python -m mkpassphrase.bench`.
+
+Each benchmark is run ``repeat`` times, and the min, median and max time
+per call are reported. Results can be saved as JSON with ``--json`` and
+compared with the saved results of another release with ``--compare``,
+which exits with an error if any benchmark got slower than allowed.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# Number of times each benchmark is run by default
+REPEAT_DEFAULT = 10
+
+# Default max allowed fractional increase of median time compared to baseline
+THRESHOLD_DEFAULT = 0.25
+
+# Entropy bits targets of the ``calculate_num_words`` benchmarks
+ENTROPY_TARGETS = (40, 80, 128, 256, 512)
+
+# Numbers of words of the ``sample_words`` benchmarks
+SAMPLE_SIZES = tuple(range(4, 21, 4))
+
+# Numbers of passphrases of the ``mkpassphrase`` benchmarks
+COUNTS = (1, 1000, 1000000)
+
+# Max number of calls per run of a benchmark, so that each run takes long
+# enough to measure, but fast benchmarks don't take too long in total
+_CALLS_PER_RUN = 1000
+
+_timer = getattr(time, "perf_counter", time.time)
+
+
+def summarize(times):
+    """Answer a dict of the min, median and max of ``times`` in seconds."""
+    times = sorted(times)
+    return {
+        "min": times[0],
+        "median": times[len(times) // 2],
+        "max": times[-1],
+        "repeat": len(times),
+    }
+
+
+def time_func(func, number, repeat=REPEAT_DEFAULT):
+    """
+    Time ``repeat`` runs of ``number`` calls of ``func`` and summarize them.
+
+    The summarized times are per call of ``func``.
+    """
+    times = []
+    for _ in range(repeat):
+        start = _timer()
+        for _ in range(number):
+            func()
+        times.append((_timer() - start) / number)
+    return summarize(times)
+
+
+def time_command(cmd, repeat=REPEAT_DEFAULT):
+    """Time ``repeat`` runs of the ``cmd`` subprocess and summarize them."""
+    times = []
+    with open(os.devnull, "wb") as devnull:
+        for _ in range(repeat):
+            start = _timer()
+            subprocess.check_call(cmd, stdout=devnull)
+            times.append(_timer() - start)
+    return summarize(times)
+
+
+def bench_startup(repeat=REPEAT_DEFAULT):
+    """
+    Time cold starts of `mkpassphrase -q` in a new python process.
+
+    The start of a python process that does nothing is timed too, since
+    the difference is what mkpassphrase itself costs.
+    """
+    return {
+        "python": time_command([sys.executable, "-c", "pass"], repeat),
+        "mkpassphrase": time_command(
+            [sys.executable, "-m", "mkpassphrase.main", "-q"], repeat
+        ),
+    }
+
+
+def iter_benchmarks():
+    """
+    Iterate over ``(name, func, number)`` for each in-process benchmark.
+
+    Each ``func`` is timed over ``number`` calls per run.
+    """
+    from mkpassphrase import api, internal
+
+    for name in sorted(internal.WORD_LISTS):
+        yield (
+            "load_words_from_list[%s]" % name,
+            lambda name=name: internal.load_words_from_list(name),
+            10,
+        )
+    words = internal.load_words_from_list(internal.WORD_LIST_DEFAULT)
+    for entropy in ENTROPY_TARGETS:
+        yield (
+            "calculate_num_words[%d]" % entropy,
+            lambda entropy=entropy: internal.calculate_num_words(len(words), entropy),
+            _CALLS_PER_RUN,
+        )
+    for k in SAMPLE_SIZES:
+        yield (
+            "sample_words[%d]" % k,
+            lambda k=k: internal.sample_words(words, k),
+            _CALLS_PER_RUN // 10,
+        )
+    for count in COUNTS:
+        yield (
+            "mkpassphrase[%d]" % count,
+            lambda count=count: api.mkpassphrase(
+                word_list=internal.WORD_LIST_DEFAULT, count=count
+            ),
+            max(1, _CALLS_PER_RUN // count),
+        )
+
+
+def run(select=None, repeat=REPEAT_DEFAULT, startup=True, log=None):
+    """
+    Run the benchmarks and answer a dict of the results by benchmark name.
+
+    Only benchmarks whose name contains ``select`` are run, if provided,
+    and each result is logged to ``log``, a file, if provided. Benchmarks
+    of a single (slow) call per run are run at most 3 times.
+    """
+    results = {}
+    for name, func, number in iter_benchmarks():
+        if select and select not in name:
+            continue
+        runs = repeat if number > 1 else min(repeat, 3)
+        results[name] = time_func(func, number, runs)
+        _log(log, name, results[name])
+    if not startup:
+        return results
+    names = {"startup[%s]" % name: name for name in ("mkpassphrase", "python")}
+    if not select or any(select in name for name in names):
+        startup_results = bench_startup(repeat)
+        for name in sorted(names):
+            if not select or select in name:
+                results[name] = startup_results[names[name]]
+                _log(log, name, results[name])
+    return results
+
+
+def compare(results, baseline, threshold=THRESHOLD_DEFAULT):
+    """
+    Compare ``results`` to the ``baseline`` results of an earlier run.
+
+    Answers a list of ``(name, ratio)`` for each benchmark whose median time
+    is more than ``1 + threshold`` times its median time in ``baseline``.
+    Benchmarks that are only in one of the results are ignored.
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if not base or not base["median"]:
+            continue
+        ratio = result["median"] / base["median"]
+        if ratio > 1 + threshold:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def _log(log, name, result):
+    if log is not None:
+        print(
+            "{:<36} min {:>12}  median {:>12}".format(
+                name, _format_time(result["min"]), _format_time(result["median"])
+            ),
+            file=log,
+        )
+        log.flush()
+
+
+def _format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e3), ("us", 1e6)):
+        if seconds * scale >= 1:
+            return "%.3f %s" % (seconds * scale, unit)
+    return "%.1f ns" % (seconds * 1e9)
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    import mkpassphrase as MP
+
+    parser = argparse.ArgumentParser(
+        prog="python -m mkpassphrase.bench", description="Run benchmarks."
+    )
+    parser.add_argument(
+        "-k",
+        "--select",
+        metavar="SUBSTRING",
+        help="Only run benchmarks whose name contains SUBSTRING",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=REPEAT_DEFAULT,
+        metavar="REPEAT",
+        help="Run each benchmark REPEAT times "
+        "(the default is {})".format(REPEAT_DEFAULT),
+    )
+    parser.add_argument(
+        "--json", metavar="PATH", help="Save the results as JSON to PATH"
+    )
+    parser.add_argument(
+        "--compare",
+        metavar="BASELINE",
+        help="Exit with an error if any benchmark is slower than in the "
+        "JSON results at BASELINE by more than the threshold",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=THRESHOLD_DEFAULT,
+        metavar="FRACTION",
+        help="Max allowed increase in median time compared to BASELINE "
+        "(the default is {})".format(THRESHOLD_DEFAULT),
+    )
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.exit("--repeat must be positive")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    results = run(select=args.select, repeat=args.repeat, log=sys.stdout)
+    if args.json:
+        data = {
+            "mkpassphrase": MP.__version__,
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "results": results,
+        }
+        with open(args.json, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for name, ratio in regressions:
+            print("regression: {} is {:.2f}x slower".format(name, ratio))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
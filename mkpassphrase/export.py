@@ -0,0 +1,168 @@
+# coding=utf-8
+
+"""
+Bulk export of passphrases to files, as used by `mkpassphrase --output`.
+
+Passphrases are consumed lazily in blocks, and each block is formatted,
+encoded as UTF-8 once and written with a single ``os.write`` call (or as
+few as the OS allows), so exporting millions of passphrases costs little
+more than generating them and uses memory for one block at a time.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import itertools
+import json
+import os
+
+from . import internal
+
+# Formats of exported passphrases: one per line, NUL-terminated, CSV with
+# entropy and number of words columns, or one JSON object per line
+FORMATS = ("text", "nul", "csv", "jsonl")
+
+# Number of passphrases formatted and written at a time
+BLOCK_SIZE = 8192
+
+# First line of the CSV format
+CSV_HEADER = "passphrase,entropy,num_words"
+
+# Mode of exported files, since they usually contain credentials
+FILE_MODE = 0o600
+
+
+def _csv_field(value):
+    if any(c in value for c in ',"\r\n'):
+        return '"%s"' % value.replace('"', '""')
+    return value
+
+
+def _formatter(format, entropy, num_words):
+    """Answer a function that formats a list of passphrases as a string."""
+    if format == "text":
+        return lambda block: "\n".join(block) + "\n"
+    if format == "nul":
+        return lambda block: "\0".join(block) + "\0"
+    if format not in FORMATS:
+        raise ValueError("'format' must be one of: %s" % ", ".join(FORMATS))
+    if entropy is None or num_words is None:
+        raise ValueError("'entropy' and 'num_words' are required for %s" % format)
+    if format == "csv":
+        suffix = ",%r,%d\r\n" % (entropy, num_words)
+        return lambda block: "".join(_csv_field(p) + suffix for p in block)
+    suffix = ', "entropy": %s, "num_words": %d}\n' % (json.dumps(entropy), num_words)
+    return lambda block: "".join(
+        '{"passphrase": ' + json.dumps(p) + suffix for p in block
+    )
+
+
+def iter_chunks(
+    passphrases, format="text", entropy=None, num_words=None, block_size=BLOCK_SIZE
+):
+    """
+    Iterate over the UTF-8 encoded chunks of ``passphrases`` in ``format``.
+
+    Each chunk contains ``block_size`` passphrases, except the last, and
+    the first chunk of the CSV format starts with ``CSV_HEADER``. The
+    ``entropy`` and ``num_words`` of the passphrases are required for the
+    CSV and JSONL formats.
+    """
+    if not isinstance(block_size, int) or block_size < 1:
+        raise ValueError("'block_size' must be a positive integer")
+    format_block = _formatter(format, entropy, num_words)
+    passphrases = iter(passphrases)
+    header = CSV_HEADER + "\r\n" if format == "csv" else ""
+    while True:
+        block = list(itertools.islice(passphrases, block_size))
+        if not block:
+            break
+        yield (header + format_block(block)).encode("utf-8")
+        header = ""
+
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view) :]
+
+
+def write_fd(
+    fd,
+    passphrases,
+    format="text",
+    entropy=None,
+    num_words=None,
+    block_size=BLOCK_SIZE,
+    stats=None,
+):
+    """
+    Write ``passphrases`` in ``format`` to file descriptor ``fd``.
+
+    The params are the same as for ``iter_chunks``. If ``stats`` (an
+    ``api.Stats``) is provided, the writing of each chunk is timed as its
+    ``output`` stage. Answers the number of bytes written.
+    """
+    chunks = iter_chunks(passphrases, format, entropy, num_words, block_size)
+    written = 0
+    for chunk in chunks:
+        if stats is None:
+            _write_all(fd, chunk)
+        else:
+            with stats.timer("output"):
+                _write_all(fd, chunk)
+        written += len(chunk)
+    return written
+
+
+def export(
+    path,
+    passphrases,
+    format="text",
+    entropy=None,
+    num_words=None,
+    fsync=False,
+    block_size=BLOCK_SIZE,
+    stats=None,
+):
+    """
+    Write ``passphrases`` in ``format`` to a new file at ``path``.
+
+    The passphrases are written to a temporary file, readable only by its
+    owner, that replaces ``path`` only once complete, so ``path`` never
+    contains a partial export. If ``fsync`` is true, the file is synced to
+    disk before it replaces ``path``, and the directory after. The other
+    params are the same as for ``write_fd``, and the number of bytes
+    written is answered.
+    """
+    tmp = "%s.%d.tmp" % (path, os.getpid())
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, FILE_MODE)
+    try:
+        try:
+            written = write_fd(
+                fd, passphrases, format, entropy, num_words, block_size, stats
+            )
+            if fsync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+        internal._replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    if fsync:
+        _fsync_dir(os.path.dirname(os.path.abspath(path)))
+    return written
+
+
+def _fsync_dir(path):
+    """Sync directory ``path``, where the OS supports it."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:  # e.g. windows
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
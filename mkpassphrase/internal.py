@@ -2,21 +2,35 @@
 
 from __future__ import absolute_import, division, print_function
 
+import binascii
+import bisect
 import codecs
+import heapq
+import hashlib
+import hmac
 import math
+import operator
 import os
 import random as _random
 import sys
+import tempfile
+import struct
+import threading
+import functools
+from collections import OrderedDict, namedtuple
 
-import pkg_resources
+try:
+    from collections.abc import Sequence
+except ImportError:  # python2
+    from collections import Sequence
 
-import six
+from . import packed
 
 # require CSPRNG
 try:
     os.urandom(1)
 except NotImplementedError:
-    six.print_(
+    print(
         "cryptographically secure pseudo-random number generator not available",
         file=sys.stderr,
     )
@@ -24,15 +38,71 @@ except NotImplementedError:
 else:
     RAND = _random.SystemRandom()
 
+# ``math.perm`` is much faster than a python loop, but requires python 3.8+
+_perm = getattr(math, "perm", None)
+
+_LN2 = math.log(2)
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ``hmac.digest`` is faster than ``hmac.new``, but requires python 3.7+
+_hmac_digest = getattr(
+    hmac,
+    "digest",
+    lambda key, msg, digest: hmac.new(key, msg, digest).digest(),
+)
+
+# stream and counter of each block of a ``SeededSource``
+_SEEDED_BLOCK = struct.Struct(">QQ")
+
+# ``os.replace`` atomically replaces an existing file on all platforms, but
+# requires python 3.3+, and ``os.rename`` does the same on posix
+_replace = getattr(os, "replace", os.rename)
+
+# Types of a text name, on python 2 (str or unicode) and python 3 (str)
+TEXT_TYPES = (str, type(b"".decode("ascii")))
+
 # defaults
-PAD = six.u("")  # prefix/suffix of passphrase
-DELIMITER = six.u(" ")
+PAD = ""  # prefix/suffix of passphrase
+DELIMITER = " "
 
 # Default entropy bits to use for determining number of words to use
 ENTROPY_DEFAULT = 80
 
 WORD_LIST_DEFAULT = "eff-large"
 
+# Number of random bytes read from the OS CSPRNG at a time by ``RandomBuffer``
+BUFFER_SIZE_DEFAULT = 4096
+
+# Max number of bytes of the bitset of a ``SeenSet``, which uses a hash table
+# of its keys instead if its keyspace needs a larger bitset
+SEEN_BITSET_MAX_BYTES = 1 << 24
+
+# Max number of keys per slot of the hash table of a ``SeenSet``
+SEEN_LOAD_FACTOR = 0.75
+
+# Number of lines read between calls of the progress callback of
+# ``iter_sorted_words``
+PROGRESS_INTERVAL = 100000
+
+# Max number of sorted temporary files of ``iter_sorted_words`` merged at
+# once, so that the number of open files grows with the log of the number
+# of temporary files written
+MERGE_MAX_RUNS = 16
+
+# Estimated bytes of memory used per word held in memory by
+# ``iter_sorted_words``, in addition to the size of the str itself
+_WORD_OVERHEAD = 40
+
+# Maximum number of loaded wordlists kept in ``WORDS_CACHE``
+CACHE_SIZE_DEFAULT = 32
+
+# Maximum number of delimiters whose rendered words a ``WordTable`` keeps
+RENDERED_TABLES_MAX = 4
+
+# Maximum number of ``LengthTable`` objects a ``WordTable`` keeps
+LENGTH_TABLES_MAX = 16
+
 # Map from wordlist name to filename. The three EFF files are as follows:
 
 # WORD_LIST_DEFAULT: 7,776 words, average 7.0 chars in length;
@@ -64,6 +134,8 @@ def num_possible(num_candidates, num_words):
         raise ValueError("num_words must be positive")
 
     n, k = num_candidates, num_words
+    if _perm is not None:
+        return _perm(n, k)
     possible = 1
     while k > 0:
         possible *= n
@@ -72,6 +144,43 @@ def num_possible(num_candidates, num_words):
     return possible
 
 
+def num_possible_cased(num_cased, num_caseless, num_words):
+    """
+    Calculate the number of distinct passphrases of words in random case.
+
+    Answers the number of passphrases of ``num_words`` distinct words, each
+    of ``num_cased`` words that may be title-cased or of ``num_caseless``
+    words that are the same in title case, as rendered.
+    """
+    cased = _weighted_combs(num_cased, num_words, 2)
+    caseless = _weighted_combs(num_caseless, num_words)
+    possible = 0
+    for m in range(max(0, num_words - len(caseless) + 1), len(cased)):
+        possible += cased[m] * caseless[num_words - m]
+    for i in range(2, num_words + 1):
+        possible *= i
+    return possible
+
+
+def log2_num_possible(num_candidates, num_words):
+    """
+    Calculate the base 2 log of ``num_possible`` in constant time.
+
+    The result is computed in log space using ``math.lgamma``, so it is
+    only approximate, and is negative infinity if ``num_words`` exceeds
+    ``num_candidates``.
+    """
+    if num_candidates < 1:
+        raise ValueError("num_candidates must be positive")
+    if num_words < 1:
+        raise ValueError("num_words must be positive")
+
+    n, k = num_candidates, num_words
+    if k > n:
+        return float("-inf")
+    return (math.lgamma(n + 1) - math.lgamma(n - k + 1)) / _LN2
+
+
 def calculate_entropy(dict_size, num_words, random_case=True):
     """Calculate entropy bits for ``num_words`` chosen from ``dict_size``."""
     if random_case:
@@ -79,48 +188,452 @@ def calculate_entropy(dict_size, num_words, random_case=True):
     return math.log(num_possible(dict_size, num_words), 2)
 
 
+def calculate_schema_entropy(dict_sizes, random_case=True):
+    """
+    Calculate entropy bits for one word chosen from each of ``dict_sizes``.
+
+    Each item of ``dict_sizes`` is the number of words that one word of the
+    passphrase is chosen from, independently of the others.
+    """
+    bits = sum(math.log(size, 2) for size in dict_sizes)
+    return bits + len(dict_sizes) if random_case else bits
+
+
+def word_sources(names):
+    """
+    Answer the word source of each of ``names``, a name or a list of names.
+
+    Each source is ``("list", name)`` or ``("file", path)``. A name of a
+    builtin wordlist is a list, and any other name is the path of a word
+    file.
+    """
+    if isinstance(names, TEXT_TYPES):
+        names = [names]
+    return [("list" if name in WORD_LISTS else "file", name) for name in names]
+
+
 def calculate_num_words(dict_size, entropy=None, random_case=True):
     """
     Calculate number of words needed for given entropy drawn from dict size.
+
+    The number of words is found by a binary search using the approximate
+    ``log2_num_possible``, and then adjusted using the exact
+    ``calculate_entropy`` of the neighboring numbers of words, so the
+    result is the same as checking each number of words in turn. The words
+    of a passphrase are distinct, so there are at most ``dict_size`` of
+    them, even if ``random_case``.
     """
     if entropy is None:
         entropy = ENTROPY_DEFAULT
 
-    n = 1
+    size = dict_size * 2 if random_case else dict_size
+    lo, hi = 1, dict_size
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if log2_num_possible(size, mid) < entropy:
+            lo = mid + 1
+        else:
+            hi = mid
+    n = lo
+
     result_entropy = calculate_entropy(dict_size, n, random_case)
-    while result_entropy < entropy:
+    while result_entropy < entropy and n < dict_size:
         n += 1
         result_entropy = calculate_entropy(dict_size, n, random_case)
+    if result_entropy < entropy:
+        msg = "entropy bits (%s) for %d words is less than %d"
+        raise ValueError(msg % (int(result_entropy), n, entropy))
+    while n > 1:
+        prev_entropy = calculate_entropy(dict_size, n - 1, random_case)
+        if prev_entropy < entropy:
+            break
+        n, result_entropy = n - 1, prev_entropy
     return n, result_entropy
 
 
-def load_from_stream(stream, test=None):
-    words = list(set(filter(test, (line.strip().lower() for line in stream))))
+def entropy_table(dict_size, max_words, random_case=True):
+    """
+    Calculate entropy bits for each number of words up to ``max_words``.
+
+    Answers a list whose i-th item is the (approximate) entropy bits of
+    ``i + 1`` words chosen from ``dict_size``, computed as running sums of
+    logs in a single pass. The list is shorter than ``max_words`` if there
+    are fewer than ``max_words`` words, since the words of a passphrase are
+    distinct.
+    """
+    if dict_size < 1:
+        raise ValueError("dict_size must be positive")
+    size = dict_size * 2 if random_case else dict_size
+    table = []
+    total = 0.0
+    for i in range(min(max_words, dict_size)):
+        total += math.log(size - i, 2)
+        table.append(total)
+    return table
+
+
+def length_histogram(words):
+    """
+    Answer a tuple of the number of ``words`` of each length.
+
+    Item ``i`` of the tuple is the number of words of ``i`` characters. The
+    histogram of a ``WordTable`` is computed once and kept with it.
+    """
+    if isinstance(words, WordTable):
+        return words.lengths
+    return _length_histogram(words)
+
+
+def length_buckets(words):
+    """
+    Answer a tuple of ``(length, indices)`` pairs of each length of ``words``.
+
+    The pairs are in ascending order of length, and ``indices`` is a tuple
+    of the indices of the words of that length. The buckets of a
+    ``WordTable`` are computed once and kept with it.
+    """
+    if isinstance(words, WordTable):
+        return words.buckets
+    return _length_buckets(words)
+
+
+def _max_total_length(buckets, k):
+    """
+    Answer the total length of the ``k`` longest words of ``buckets``.
+
+    If there are fewer than ``k`` words, it is the total length of all of
+    them.
+    """
+    total = 0
+    for size, indices in reversed(buckets):
+        m = min(k, len(indices))
+        total += m * size
+        k -= m
+        if not k:
+            break
+    return total
+
+
+def _length_buckets(words):
+    buckets = {}
+    for i, word in enumerate(words):
+        buckets.setdefault(len(word), []).append(i)
+    return tuple((size, tuple(buckets[size])) for size in sorted(buckets))
+
+
+def caseless_indices(words):
+    """
+    Answer the frozenset of the indices of the words the same in title case.
+
+    A caseless word (like "100") renders the same whatever its case bit,
+    so a passphrase has a case bit only for each of its other words.
+    """
+    if isinstance(words, WordTable):
+        return words.caseless
+    return _caseless_indices(words)
+
+
+def _caseless_indices(words):
+    return frozenset(i for i, word in enumerate(words) if word.title() == word)
+
+
+def _length_histogram(words):
+    counts = [0]
+    for word in words:
+        size = len(word)
+        if size >= len(counts):
+            counts.extend([0] * (size + 1 - len(counts)))
+        counts[size] += 1
+    return tuple(counts)
+
+
+def shortest_config(
+    histograms,
+    entropy=None,
+    min_lens=None,
+    max_lens=None,
+    random_cases=(True,),
+    delimiters=(DELIMITER,),
+    pad=PAD,
+):
+    """
+    Find the config of the shortest expected passphrase of ``entropy`` bits.
+
+    ``histograms`` is a list of ``(source, histogram)`` pairs, one per
+    candidate wordlist, of the ``length_histogram`` of its words. Each
+    combination of a source, a min and max word length (each of the word
+    lengths of the source if ``min_lens`` or ``max_lens`` is None), and
+    one of ``random_cases`` and ``delimiters`` is a config, whose number
+    of words is the fewest that reach ``entropy`` (``ENTROPY_DEFAULT`` if
+    None). The expected length of a passphrase of ``k`` words is ``k``
+    times the mean length of the words left by the length filter, plus
+    the delimiters and ``pad``, since each word is equally likely to be
+    any of them.
+
+    The counts and total lengths of each range of word lengths come from
+    running sums of the histograms, so each config takes constant time
+    apart from calculating its number of words.
+
+    Answers a dict of the ``source``, ``min_len`` and ``max_len`` (None if
+    the filter drops no words), ``random_case``, ``delimiter``,
+    ``num_words``, ``entropy`` and ``expected_length`` of the config with
+    the shortest expected length, and of those with the most entropy.
+    Raises ``ValueError`` if no config reaches ``entropy``.
+    """
+    if entropy is None:
+        entropy = ENTROPY_DEFAULT
+    best, best_key = None, None
+    for source, histogram in histograms:
+        lengths = [size for size, count in enumerate(histogram) if count]
+        if not lengths:
+            continue
+        counts, totals = [0], [0]
+        for size, count in enumerate(histogram):
+            counts.append(counts[-1] + count)
+            totals.append(totals[-1] + size * count)
+        top = len(histogram) - 1
+        for lo in lengths if min_lens is None else min_lens:
+            lo = max(lo or 0, 0)
+            for hi in lengths if max_lens is None else max_lens:
+                hi = top if hi is None else min(hi, top)
+                if lo > hi:
+                    continue
+                n = counts[hi + 1] - counts[lo]
+                if not n:
+                    continue
+                mean = (totals[hi + 1] - totals[lo]) / n
+                for random_case in random_cases:
+                    try:
+                        k, bits = calculate_num_words(n, entropy, random_case)
+                    except ValueError:
+                        continue
+                    if k > n:
+                        # the words of a passphrase are distinct
+                        continue
+                    for delimiter in delimiters:
+                        length = k * mean + (k - 1) * len(delimiter) + 2 * len(pad)
+                        key = (length, -bits)
+                        if best_key is None or key < best_key:
+                            best_key = key
+                            best = {
+                                "source": source,
+                                "min_len": lo if lo > lengths[0] else None,
+                                "max_len": hi if hi < lengths[-1] else None,
+                                "random_case": random_case,
+                                "delimiter": delimiter,
+                                "num_words": k,
+                                "entropy": bits,
+                                "expected_length": length,
+                            }
+    if best is None:
+        raise ValueError("no configuration reaches %d entropy bits" % entropy)
+    return best
+
+
+def load_from_stream(stream, test=None, memory_limit=None, progress=None):
+    """
+    Get sorted unique words from the lines of ``stream``.
+
+    Each line is stripped and lowercased, and only lines for which ``test``
+    is true are kept, or non-empty lines if ``test`` is None.
+
+    If ``memory_limit`` is provided, the words are sorted using bounded
+    memory by ``iter_sorted_words``, which also calls ``progress``.
+    """
+    if memory_limit is not None:
+        words = list(iter_sorted_words(stream, test, memory_limit, progress))
+    else:
+        words = list(set(filter(test, (line.strip().lower() for line in stream))))
+        words.sort()
     if not words:
         raise RuntimeError("no words loaded")
-    words.sort()
     return words
 
 
+def iter_sorted_words(stream, test=None, memory_limit=None, progress=None):
+    """
+    Iterate over the sorted unique words of ``stream`` using bounded memory.
+
+    The words are the same as those of ``load_from_stream``, but the lines
+    are read one at a time, and whenever the unique words held in memory
+    take more than about ``memory_limit`` bytes, they are sorted and
+    written to a temporary file. The sorted files are then merged, so
+    memory use depends on ``memory_limit`` and not on the size of
+    ``stream``. If ``memory_limit`` is None, no temporary files are used.
+    Whenever ``MERGE_MAX_RUNS`` files of the same number of merges are
+    open, they are merged into one file, so the number of open files
+    grows with the log of the size of ``stream``.
+
+    If provided, ``progress`` is called with the number of lines read and
+    the number of temporary files written every ``PROGRESS_INTERVAL``
+    lines and after the last line.
+    """
+    words = set()
+    size = 0
+    runs = []  # (level, file), in nonincreasing order of level
+    spilled = 0
+    lines = 0
+    try:
+        for line in stream:
+            lines += 1
+            word = line.strip().lower()
+            if (test(word) if test else word) and word not in words:
+                words.add(word)
+                size += sys.getsizeof(word) + _WORD_OVERHEAD
+                if memory_limit is not None and size > memory_limit:
+                    _add_run(runs, _spill_words(words))
+                    spilled += 1
+                    words = set()
+                    size = 0
+            if progress and lines % PROGRESS_INTERVAL == 0:
+                progress(lines, spilled)
+        if progress and (not lines or lines % PROGRESS_INTERVAL):
+            progress(lines, spilled)
+
+        if not runs:
+            for word in sorted(words):
+                yield word
+            return
+        if words:
+            _add_run(runs, _spill_words(words))
+            words = None
+        for word in _merge_words([run for _, run in runs]):
+            yield word
+    finally:
+        for _, run in runs:
+            run.close()
+
+
+def _spill_words(words, sort=True):
+    """Write the sorted ``words`` to a new temporary file, and answer it."""
+    run = tempfile.TemporaryFile()
+    try:
+        words = sorted(words) if sort else words
+        run.writelines(word.encode("utf-8") + b"\n" for word in words)
+        run.seek(0)
+    except Exception:
+        run.close()
+        raise
+    return run
+
+
+def _iter_run(run):
+    for line in run:
+        yield line[:-1].decode("utf-8")
+
+
+def _merge_words(runs):
+    """Iterate over the sorted unique words of the sorted files ``runs``."""
+    last = None
+    for word in heapq.merge(*[_iter_run(run) for run in runs]):
+        if word != last:
+            yield word
+            last = word
+
+
+def _add_run(runs, run):
+    """
+    Add the sorted file ``run`` to the ``(level, file)`` pairs of ``runs``.
+
+    Whenever the last ``MERGE_MAX_RUNS`` files are of the same level, they
+    are merged into one file of the next level, and closed.
+    """
+    runs.append((0, run))
+    while len(runs) >= MERGE_MAX_RUNS:
+        level = runs[-1][0]
+        if runs[-MERGE_MAX_RUNS][0] != level:
+            break
+        merged = [file for _, file in runs[-MERGE_MAX_RUNS:]]
+        del runs[-MERGE_MAX_RUNS:]
+        try:
+            run = _spill_words(_merge_words(merged), sort=False)
+        finally:
+            for file in merged:
+                file.close()
+        runs.append((level + 1, run))
+
+
 def load_words_from_list(name):
     filename = WORD_LISTS.get(name)
     if not filename:
         raise ValueError("Invalid wordlist: %s" % (name,))
-    path = "wordlists/" + filename
-    fullfilepath = pkg_resources.resource_filename("mkpassphrase", path)
-    with codecs.open(fullfilepath, "r", "utf-8") as f:
+    with _open_word_list(filename) as f:
         return load_from_stream(f)
 
 
+def _open_word_list(filename):
+    """
+    Open the bundled wordlist file ``filename`` for reading.
+
+    The file is opened directly from the package directory if possible,
+    and otherwise (e.g., if installed as a zip file) using
+    ``importlib.resources``, which is only imported if needed since
+    importing it is slower than loading a wordlist.
+    """
+    path = os.path.join(_PACKAGE_DIR, "wordlists", filename)
+    if os.path.isfile(path):
+        return codecs.open(path, "r", "utf-8")
+    from importlib import resources
+
+    resource = resources.files(__package__).joinpath("wordlists").joinpath(filename)
+    return resource.open("r", encoding="utf-8")
+
+
 def load_words_from_file(path):
     """
     Get sorted unique words from word file.
+
+    If the word file is a packed wordlist (see ``compile_words``), it is
+    mapped into memory and a read-only ``packed.PackedWords`` sequence of
+    the words is returned instead of a list.
     """
+    if packed.is_packed(path):
+        return packed.open_packed(path)
     with codecs.open(path, "r", "utf-8") as f:
         return load_from_stream(f)
 
 
-def sample_words(all_words, k, delimiter=DELIMITER, random_case=True):
+def compile_words(path, output, memory_limit=None, progress=None):
+    """
+    Compile the word file at ``path`` into a packed wordlist at ``output``.
+
+    The packed wordlist contains the same sorted unique words that
+    ``load_words_from_file`` loads from ``path``, and loading it doesn't
+    depend on the number of words. Answers the number of words.
+
+    If ``memory_limit`` is provided, the words are sorted and written to
+    ``output`` as they are read, using bounded memory (see
+    ``iter_sorted_words``, which also calls ``progress``). The packed
+    wordlist is written to a temporary file that replaces ``output`` only
+    once complete.
+    """
+    tmp = "%s.%d.tmp" % (output, os.getpid())
+    # opened before the try, so that the temporary file exists if removed
+    f = open(tmp, "wb")
+    try:
+        with f:
+            if packed.is_packed(path):
+                words = packed.open_packed(path)
+                try:
+                    count = packed.write_packed(f, words)
+                finally:
+                    words.close()
+            else:
+                with codecs.open(path, "r", "utf-8") as stream:
+                    words = iter_sorted_words(
+                        stream, memory_limit=memory_limit, progress=progress
+                    )
+                    count = packed.write_packed(f, words)
+        if not count:
+            raise RuntimeError("no words loaded")
+        _replace(tmp, output)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return count
+
+
+def sample_words(all_words, k, delimiter=DELIMITER, random_case=True, rand=None):
     """
     Sample ``k`` words from the ``all_words`` word sequence and join them.
 
@@ -129,13 +642,961 @@ def sample_words(all_words, k, delimiter=DELIMITER, random_case=True):
     If ``random_case`` is true (the default), then each word will
     with probability 0.5 be converted to title case, otherwise
     the word is used unchanged as sampled from ``all_words``.
+
+    The random bytes are drawn from ``rand``, a ``RandomBuffer``, or from
+    ``RANDOM_BUFFER`` if not provided. If ``all_words`` is a sequence, only
+    the ``k`` sampled words are accessed, so the cost doesn't depend on the
+    number of words; other iterables are copied to a list first.
     """
-    all_words = list(all_words)
-    if k > len(all_words):
-        raise ValueError("can't sample %d of %d words" % (k, len(all_words)))
-    words = RAND.sample(all_words, k)
-    if random_case:
+    if not isinstance(all_words, Sequence):
+        all_words = list(all_words)
+    if rand is None:
+        rand = RANDOM_BUFFER
+    indices = sample_indices(len(all_words), k, rand)
+    case_bits = rand.randbits(k) if random_case else 0
+    return render_words(all_words, indices, case_bits, delimiter)
+
+
+class SeededSource(object):
+    """
+    Deterministic source of pseudo-random bytes derived from a ``seed``.
+
+    FOR TESTING ONLY: anyone who knows or guesses the seed can reproduce
+    every passphrase generated from it, so it must never be used for real
+    passphrases, for which the OS CSPRNG is used by default.
+
+    The bytes are the HMAC-SHA512 digests, keyed by the seed, of a counter
+    and ``stream``, so a seed and stream give the same bytes on every
+    machine and python version, and each stream of a seed gives different
+    bytes. The ``seed`` may be bytes, a string (encoded as UTF-8), or an
+    int. An instance is a callable like ``os.urandom``, so it can be the
+    ``source`` of a ``RandomBuffer``.
+    """
+
+    def __init__(self, seed, stream=0):
+        if not isinstance(seed, bytes):
+            if not isinstance(seed, TEXT_TYPES):
+                seed = "%d" % operator.index(seed)
+            seed = seed.encode("utf-8")
+        self.seed = seed
+        self.stream = stream
+        self._counter = 0
+
+    def __call__(self, n):
+        """Answer the next ``n`` bytes (rounded up to 64 byte blocks)."""
+        blocks = []
+        for _ in range(-(-n // 64)):
+            msg = _SEEDED_BLOCK.pack(self.stream, self._counter)
+            blocks.append(_hmac_digest(self.seed, msg, hashlib.sha512))
+            self._counter += 1
+        return b"".join(blocks)[:n]
+
+
+class RandomBuffer(object):
+    """
+    Thread-safe buffered reader of random bytes from the OS CSPRNG.
+
+    Random bytes are read from ``os.urandom`` ``size`` bytes at a time, so
+    that sampling many words costs one system call per buffer instead of
+    one or more per word. Buffered bytes are discarded when the process
+    id changes, so a forked child never reuses bytes its parent may use.
+
+    Bytes are read from ``source`` instead if provided, a callable that
+    answers the given number of bytes, such as a ``SeededSource``. If
+    ``stats`` (an ``api.Stats``) is provided, the number of bytes read
+    from ``os.urandom`` is counted as its ``urandom_bytes``, or from
+    another source as its ``source_bytes``.
+    """
+
+    def __init__(self, size=BUFFER_SIZE_DEFAULT, stats=None, source=None):
+        if not isinstance(size, int) or size < 1:
+            raise ValueError("size must be a positive integer")
+        self.size = size
+        self.stats = stats
+        self.source = os.urandom if source is None else source
+        self._counter = "urandom_bytes" if source is None else "source_bytes"
+        self._buf = b""
+        self._pos = 0
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def read(self, n):
+        """Read ``n`` random bytes."""
+        with self._lock:
+            pid = os.getpid()
+            if pid != self._pid:
+                self._buf, self._pos, self._pid = b"", 0, pid
+            end = self._pos + n
+            if end > len(self._buf):
+                rest = self._buf[self._pos :]
+                nbytes = max(self.size, n - len(rest))
+                self._buf = rest + self.source(nbytes)
+                if self.stats is not None:
+                    self.stats.incr(self._counter, nbytes)
+                self._pos, end = 0, n
+            data = self._buf[self._pos : end]
+            self._pos = end
+            return data
+
+    def randbits(self, k):
+        """Answer a non-negative int with ``k`` random bits."""
+        if k <= 0:
+            return 0
+        nbytes = (k + 7) // 8
+        value = int(binascii.hexlify(self.read(nbytes)), 16)
+        return value >> (nbytes * 8 - k)
+
+    def randbelow(self, n):
+        """
+        Answer a random int in ``range(n)``.
+
+        Uses rejection sampling of ``n.bit_length()`` bits, so every
+        value is equally likely.
+        """
+        if n < 1:
+            raise ValueError("n must be positive")
+        k = (n - 1).bit_length()
+        value = self.randbits(k)
+        while value >= n:
+            value = self.randbits(k)
+        return value
+
+
+# process-wide buffer used for sampling unless another one is provided
+RANDOM_BUFFER = RandomBuffer()
+
+
+def sample_indices(n, k, rand=None):
+    """
+    Sample ``k`` distinct indices from ``range(n)`` in random order.
+
+    The random bytes are drawn from ``rand``, a ``RandomBuffer``, or from
+    ``RANDOM_BUFFER`` if not provided.
+    """
+    if k > n:
+        raise ValueError("can't sample %d of %d words" % (k, n))
+    if rand is None:
+        rand = RANDOM_BUFFER
+    if 4 * k > n:
+        # partial Fisher-Yates shuffle when most indices will be chosen,
+        # to avoid many rejections of already chosen indices
+        pool = list(range(n))
+        for i in range(k):
+            j = i + rand.randbelow(n - i)
+            pool[i], pool[j] = pool[j], pool[i]
+        return pool[:k]
+    indices = []
+    seen = set()
+    while len(indices) < k:
+        i = rand.randbelow(n)
+        if i not in seen:
+            seen.add(i)
+            indices.append(i)
+    return indices
+
+
+def render_words(all_words, indices, case_bits=0, delimiter=DELIMITER):
+    """
+    Join the words of ``all_words`` at ``indices`` using ``delimiter``.
+
+    The i-th word is converted to title case if bit i of ``case_bits`` is set.
+    If ``all_words`` is a ``WordTable``, the words are looked up in its
+    table of rendered words, so that joining them is the only string work.
+    """
+    if isinstance(all_words, WordTable):
+        n = len(all_words)
+        if not delimiter:
+            table = all_words.cased
+            return "".join(
+                [
+                    table[i + n if case_bits >> j & 1 else i]
+                    for j, i in enumerate(indices)
+                ]
+            )
+        table = all_words.rendered(delimiter)
+        return "".join(
+            [table[i + n if case_bits >> j & 1 else i] for j, i in enumerate(indices)]
+        )[: -len(delimiter)]
+    words = [all_words[i] for i in indices]
+    if case_bits:
         for i, word in enumerate(words):
-            if RAND.choice((True, False)):
+            if case_bits >> i & 1:
                 words[i] = word.title()
     return delimiter.join(words)
+
+
+def pack_indices(indices, n, case_bits=0, case_width=0):
+    """
+    Pack distinct word ``indices`` of ``n`` words and ``case_bits`` into an int.
+
+    The indices are ranked as a permutation: the ``j``-th index is a digit
+    of radix ``n - j``, counting only the indices not used before it. The
+    rank is shifted left by ``case_width`` bits to make room for the
+    ``case_bits``, so the draws of ``k`` indices and case bits pack onto
+    exactly ``range(num_possible(n, k) << case_width)``.
+    """
+    key = 0
+    used = []  # sorted
+    for j, i in enumerate(indices):
+        pos = bisect.bisect_left(used, i)
+        key = key * (n - j) + i - pos
+        used.insert(pos, i)
+    return key << case_width | case_bits
+
+
+def unpack_indices(key, n, k, case_width=0):
+    """
+    Answer the ``(indices, case_bits)`` of ``key``, the inverse of ``pack_indices``.
+
+    The ``key`` is of ``k`` indices of a table of ``n`` words. Raises
+    ``ValueError`` if ``key`` isn't the key of any draw.
+    """
+    if key < 0:
+        raise ValueError("key out of range")
+    case_bits = key & ((1 << case_width) - 1)
+    key >>= case_width
+    digits = []
+    for j in range(k - 1, -1, -1):
+        key, digit = divmod(key, n - j)
+        digits.append(digit)
+    if key:
+        raise ValueError("key out of range")
+    indices = []
+    used = []  # sorted
+    for digit in reversed(digits):
+        i = digit
+        for u in used:
+            if u > i:
+                break
+            i += 1
+        bisect.insort(used, i)
+        indices.append(i)
+    return indices, case_bits
+
+
+def _int_to_bytes(n, width):
+    """Answer non-negative int ``n`` as ``width`` big-endian bytes."""
+    return binascii.unhexlify("%0*x" % (2 * width, n))
+
+
+class SeenSet(object):
+    """
+    Compact set of up to ``capacity`` ints in ``range(keyspace)``.
+
+    If a bitset of ``keyspace`` bits takes at most ``SEEN_BITSET_MAX_BYTES``
+    (or less than the alternative), the set is a bitset. Otherwise it is an
+    open-addressing hash table of the keys, each stored in the fewest bytes
+    that fit any key, in a single ``bytearray`` sized for ``capacity`` keys,
+    which takes a small fraction of the memory of a ``set`` of ints or of
+    the passphrases themselves.
+    """
+
+    def __init__(self, keyspace, capacity):
+        if not isinstance(capacity, int) or capacity < 1:
+            raise ValueError("capacity must be a positive integer")
+        self.keyspace = keyspace
+        self.capacity = capacity
+        self._len = 0
+        # keys are stored plus one, so that all zero bytes is an empty slot
+        self._width = (keyspace.bit_length() + 7) // 8
+        self._slots = int(capacity / SEEN_LOAD_FACTOR) + 1
+        nbytes = (keyspace + 7) // 8
+        if nbytes <= max(SEEN_BITSET_MAX_BYTES, self._slots * self._width):
+            self._bits = bytearray(nbytes)
+            self._table = None
+        else:
+            self._bits = None
+            self._table = bytearray(self._slots * self._width)
+            self._empty = bytes(bytearray(self._width))
+
+    def __len__(self):
+        return self._len
+
+    def add(self, key):
+        """Add ``key``, answering whether it was not already in the set."""
+        if not 0 <= key < self.keyspace:
+            raise ValueError("key out of range")
+        bits = self._bits
+        if bits is not None:
+            pos, bit = key >> 3, 1 << (key & 7)
+            if bits[pos] & bit:
+                return False
+            bits[pos] |= bit
+            self._len += 1
+            return True
+        table, width, slots = self._table, self._width, self._slots
+        data = _int_to_bytes(key + 1, width)
+        slot = hash(key) % slots
+        while True:
+            pos = slot * width
+            entry = table[pos : pos + width]
+            if entry == data:
+                return False
+            if entry == self._empty:
+                if self._len >= self.capacity:
+                    raise ValueError("seen set is full")
+                table[pos : pos + width] = data
+                self._len += 1
+                return True
+            slot = slot + 1 if slot + 1 < slots else 0
+
+
+class WordTable(tuple):
+    """
+    Tuple of sorted unique words that builds tables of rendered words.
+
+    The ``cased`` table is the words followed by their title case
+    versions, so word ``i`` in title case is at ``i + len(words)``, like
+    the doubled number of words of ``calculate_entropy`` if random_case.
+    The table of each delimiter (see ``rendered``) is the ``cased`` words
+    followed by the delimiter. The tables, and the ``lengths`` histogram,
+    ``buckets`` and ``caseless`` indices of the words, are built on first
+    use, and at most ``RENDERED_TABLES_MAX`` delimiters are kept. So are
+    the ``LengthTable`` objects of the words (see ``length_table``), of
+    which at most ``LENGTH_TABLES_MAX`` are kept.
+    """
+
+    @property
+    def cased(self):
+        """Answer the words followed by their title case versions."""
+        cased = self.__dict__.get("_cased")
+        if cased is None:
+            cased = self._cased = self + tuple([word.title() for word in self])
+        return cased
+
+    @property
+    def lengths(self):
+        """Answer the ``length_histogram`` of the words."""
+        lengths = self.__dict__.get("_lengths")
+        if lengths is None:
+            lengths = self._lengths = _length_histogram(self)
+        return lengths
+
+    @property
+    def buckets(self):
+        """Answer the ``length_buckets`` of the words."""
+        buckets = self.__dict__.get("_buckets")
+        if buckets is None:
+            buckets = self._buckets = _length_buckets(self)
+        return buckets
+
+    @property
+    def caseless(self):
+        """Answer the ``caseless_indices`` of the words."""
+        caseless = self.__dict__.get("_caseless")
+        if caseless is None:
+            caseless = self._caseless = _caseless_indices(self)
+        return caseless
+
+    def length_table(self, num_words, chars, exact=False):
+        """Answer the ``LengthTable`` of the words' ``buckets``."""
+        tables = self.__dict__.get("_length_tables")
+        if tables is None:
+            tables = self._length_tables = OrderedDict()
+        key = (num_words, chars, exact)
+        table = tables.pop(key, None)
+        if table is None:
+            table = LengthTable(self.buckets, num_words, chars, exact)
+        tables[key] = table
+        while len(tables) > LENGTH_TABLES_MAX:
+            tables.popitem(last=False)
+        return table
+
+    def rendered(self, delimiter):
+        """Answer the ``cased`` words, each followed by ``delimiter``."""
+        tables = self.__dict__.get("_rendered")
+        if tables is None:
+            tables = self._rendered = OrderedDict()
+        table = tables.get(delimiter)
+        if table is None:
+            table = tuple([word + delimiter for word in self.cased])
+            tables[delimiter] = table
+            while len(tables) > RENDERED_TABLES_MAX:
+                tables.popitem(last=False)
+        return table
+
+
+class LengthTable(object):
+    """
+    Table of the number of passphrases of words with a limited total length.
+
+    The words are grouped by length into the ``buckets`` of
+    ``length_buckets``, and ``counts[b][j][c]`` is the number of ways to
+    choose ``j`` distinct words from bucket ``b`` onwards whose lengths
+    add up to exactly ``c`` characters, or at most ``c`` characters unless
+    ``exact``. Taking ``m`` of the ``n`` words of a bucket of length ``l``
+    can be done in ``C(n, m)`` ways, so::
+
+        counts[b][j][c] = sum(C(n, m) * counts[b + 1][j - m][c - m * l])
+
+    and each set of ``num_words`` words has ``num_words!`` orders, so the
+    number of passphrases of ``num_words`` words of at most (or exactly)
+    ``chars`` characters in all is ``num_words! * counts[0][num_words][chars]``.
+    No passphrase is longer than its ``num_words`` longest words, so
+    ``chars`` is clamped to their total length (and there are no
+    passphrases of exactly more characters), and the table takes at most
+    ``len(buckets) * num_words * min(chars, longest)`` ints.
+
+    If ``weights`` is provided, each way of taking ``m`` words of bucket
+    ``b`` counts ``weights[b] ** m`` times, for example 2 for the words
+    that render differently in title case.
+    """
+
+    def __init__(self, buckets, num_words, chars, exact=False, weights=None):
+        self.buckets = buckets
+        self.num_words = num_words
+        self.chars = chars
+        self.exact = exact
+        self.weights = weights
+        k = num_words
+        longest = _max_total_length(buckets, k)
+        if chars > longest:
+            chars = -1 if exact else longest
+        self._chars = chars
+        # no words left to choose fit in any number of characters left,
+        # unless the words must fill all of them
+        width = max(chars + 1, 0)
+        base = [1] + [0] * (width - 1) if exact and width else [1] * width
+        counts = [[base] + [[0] * (chars + 1) for _ in range(k)]]
+        for b in range(len(buckets) - 1, -1, -1):
+            size, indices = buckets[b]
+            combs = _weighted_combs(len(indices), k, weights[b] if weights else 1)
+            after = counts[-1]
+            table = []
+            for j in range(k + 1):
+                row = []
+                for c in range(chars + 1):
+                    total = 0
+                    for m in range(min(j, len(combs) - 1, c // size) + 1):
+                        total += combs[m] * after[j - m][c - m * size]
+                    row.append(total)
+                table.append(row)
+            counts.append(table)
+        counts.reverse()
+        self.counts = counts
+        self._cumulatives = {}
+
+    def num_possible(self):
+        """Answer the number of passphrases of the words, in any order."""
+        if self._chars < 0:
+            return 0
+        possible = self.counts[0][self.num_words][self._chars]
+        for i in range(2, self.num_words + 1):
+            possible *= i
+        return possible
+
+    def sample(self, rand=None):
+        """
+        Sample the indices of ``num_words`` distinct words, in random order.
+
+        The lengths of the words add up to at most (or exactly) ``chars``,
+        and each of the ``num_possible()`` passphrases is equally likely. One
+        random int below ``num_possible()`` is split into an int below
+        ``counts[0][num_words][chars]``, which draws the number of words of
+        each bucket in proportion to the number of passphrases that remain
+        possible, and an int below ``num_words!``, which draws the order of
+        the words. The words of each bucket are then drawn uniformly by
+        ``unpack_indices``.
+        """
+        if rand is None:
+            rand = RANDOM_BUFFER
+        counts, j, c = self.counts, self.num_words, self._chars
+        possible = self.num_possible()
+        if not possible:
+            raise ValueError("no passphrases fit in %d characters" % self.chars)
+        order, r = divmod(rand.randbelow(possible), counts[0][j][c])
+        indices = []
+        for b, (size, bucket) in enumerate(self.buckets):
+            cumulative = self._cumulatives.get((b, j, c))
+            if cumulative is None:
+                cumulative = self._cumulatives[b, j, c] = self._cumulative(b, j, c)
+            m = bisect.bisect_right(cumulative, r)
+            # r is uniform below the weight of m, and so the rest of r is
+            # uniform below the number of choices of the later buckets
+            if m:
+                r -= cumulative[m - 1]
+            r %= counts[b + 1][j - m][c - m * size]
+            if m:
+                key = rand.randbelow(num_possible(len(bucket), m))
+                chosen, _ = unpack_indices(key, len(bucket), m)
+                indices.extend(bucket[i] for i in chosen)
+            j, c = j - m, c - m * size
+            if not j:
+                break
+        # shuffle by the digits of order in the factorial number system
+        for i in range(len(indices) - 1, 0, -1):
+            order, x = divmod(order, i + 1)
+            indices[i], indices[x] = indices[x], indices[i]
+        return indices
+
+    def _cumulative(self, b, j, c):
+        """
+        Answer the running sums of the passphrases from bucket ``b`` onwards.
+
+        The sums are of the number of passphrases of ``j`` words of ``c``
+        characters from bucket ``b`` onwards that have each number of words
+        of bucket ``b``.
+        """
+        size, bucket = self.buckets[b]
+        after = self.counts[b + 1]
+        weight = self.weights[b] if self.weights else 1
+        combs = _weighted_combs(len(bucket), min(j, c // size), weight)
+        cumulative, total = [], 0
+        for m, comb in enumerate(combs):
+            total += comb * after[j - m][c - m * size]
+            cumulative.append(total)
+        return cumulative
+
+
+def _weighted_combs(n, k, weight=1):
+    """Answer ``C(n, m) * weight ** m`` for each ``m`` up to ``min(n, k)``."""
+    combs = [1]
+    for m in range(1, min(n, k) + 1):
+        combs.append(combs[-1] * (n - m + 1) // m * weight)
+    return combs
+
+
+def calculate_length_table(
+    buckets,
+    length,
+    entropy=None,
+    num_words=None,
+    random_case=True,
+    delimiter=DELIMITER,
+    pad=PAD,
+    exact=False,
+):
+    """
+    Calculate the ``LengthTable`` of passphrases of at most ``length`` characters.
+
+    The passphrases are of the words of ``buckets``, and of exactly
+    ``length`` characters if ``exact``. The length includes the delimiters
+    and pad.
+
+    If ``num_words`` is None, it is the fewest words whose passphrases
+    reach ``entropy`` (``ENTROPY_DEFAULT`` if None). Answers the table and
+    the entropy bits of its exact number of passphrases, and raises
+    ``ValueError`` if ``entropy`` isn't reached.
+
+    If ``buckets`` is a ``WordTable``, its buckets are used, and the
+    tables are cached with it, so they are built once per words.
+    """
+    if entropy is None and num_words is None:
+        entropy = ENTROPY_DEFAULT
+    words = None
+    if isinstance(buckets, WordTable):
+        words, buckets = buckets, buckets.buckets
+    sizes = sorted(size for size, indices in buckets for _ in indices)
+    best = None
+    for k in [num_words] if num_words else range(1, len(sizes) + 1):
+        chars = length - 2 * len(pad) - (k - 1) * len(delimiter)
+        if chars < sum(sizes[:k]):
+            # longer passphrases don't fit either
+            if num_words:
+                msg = "no passphrases of %d words fit in %d characters"
+                raise ValueError(msg % (k, length))
+            break
+        if exact and chars > _max_total_length(buckets, k):
+            # even the longest words don't fill the characters
+            continue
+        if words is not None:
+            table = words.length_table(k, chars, exact)
+        else:
+            table = LengthTable(buckets, k, chars, exact)
+        possible = table.num_possible()
+        if not possible:
+            continue
+        bits = math.log(possible, 2) + (k if random_case else 0)
+        if entropy is None or bits >= entropy:
+            return table, bits
+        if best is None or bits > best[1]:
+            best = k, bits
+    if best is None:
+        raise ValueError("no passphrases fit in %d characters" % length)
+    msg = "entropy bits (%s) for %d words of %s %d characters is less than %d"
+    kind = "exactly" if exact else "at most"
+    raise ValueError(msg % (int(best[1]), best[0], kind, length, entropy))
+
+
+class WordFilter(
+    namedtuple("WordFilter", "min_len max_len charset exclude unique_prefix")
+):
+    """
+    Declarative filter of the words of a wordlist.
+
+    Words shorter than ``min_len`` or longer than ``max_len``, words with
+    characters that aren't in the ``charset`` string, and words in the
+    ``exclude`` iterable (compared after stripping and lowercasing) are
+    dropped. If ``unique_prefix`` is provided, only the first word (in
+    sorted order) of words that start with the same ``unique_prefix``
+    characters is kept. Filters are hashable, so they can be used as
+    part of a cache key.
+    """
+
+    __slots__ = ()
+
+    def __new__(
+        cls, min_len=None, max_len=None, charset=None, exclude=None, unique_prefix=None
+    ):
+        for name, value in (
+            ("min_len", min_len),
+            ("max_len", max_len),
+            ("unique_prefix", unique_prefix),
+        ):
+            if value is not None and (not isinstance(value, int) or value < 1):
+                raise ValueError("'%s' must be a positive integer if provided" % name)
+        if min_len is not None and max_len is not None and min_len > max_len:
+            raise ValueError("'min_len' must not be greater than 'max_len'")
+        if charset is not None:
+            charset = frozenset(charset)
+        if exclude is not None:
+            exclude = frozenset(word.strip().lower() for word in exclude)
+        return super(WordFilter, cls).__new__(
+            cls, min_len, max_len, charset, exclude, unique_prefix
+        )
+
+    def compile(self):
+        """
+        Compile the per-word conditions into a single word predicate.
+
+        Answers None if there are no per-word conditions. The
+        ``unique_prefix`` condition depends on other words, so it is only
+        applied by ``apply``.
+        """
+        min_len, max_len, charset, exclude, _ = self
+        if min_len is None and max_len is None and charset is None and not exclude:
+            return None
+        min_len = min_len or 0
+        exclude = exclude or ()
+
+        def test(word):
+            return (
+                min_len <= len(word)
+                and (max_len is None or len(word) <= max_len)
+                and (charset is None or charset.issuperset(word))
+                and word not in exclude
+            )
+
+        return test
+
+    def apply(self, words):
+        """
+        Filter the sorted unique ``words`` in a single pass.
+
+        Answers a tuple of the words that pass the filter, and raises
+        ``ValueError`` if there are none.
+        """
+        test = self.compile()
+        if test is not None:
+            words = [word for word in words if test(word)]
+        n = self.unique_prefix
+        if n is not None:
+            unique = []
+            for word in words:
+                if not unique or unique[-1][:n] != word[:n]:
+                    unique.append(word)
+            words = unique
+        if not words:
+            raise ValueError("no words match the word filter")
+        return tuple(words)
+
+
+class _PendingLoad(object):
+    """Words of a ``WordCache`` key that are being loaded by a thread."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._words = None
+        self._error = None
+
+    def set(self, words=None, error=None):
+        """Set the loaded ``words``, or the ``error`` of loading them."""
+        self._words, self._error = words, error
+        self._event.set()
+
+    def wait(self):
+        """Answer the loaded words, or raise the error of loading them."""
+        self._event.wait()
+        if self._error is not None:
+            raise self._error
+        return self._words
+
+
+class WordCache(object):
+    """
+    Thread-safe LRU cache of loaded wordlists.
+
+    Built-in lists are keyed by name, and word files are keyed by their
+    real path plus the mtime, size, and inode reported by ``os.stat``, so
+    a word file that changes on disk is reloaded on next use. Cached
+    words are stored as ``WordTable`` tuples, or ``packed.PackedWords`` for
+    packed wordlists and wordlists shared between processes (see
+    ``share_list``), so they can be shared safely between callers and
+    threads, along with their tables of rendered words.
+
+    If a ``WordFilter`` is provided when getting words, the filtered words
+    are cached too, keyed by the words' key and the filter.
+
+    Words are loaded without holding the cache's lock, so a slow load
+    doesn't block other threads' hits, and a thread that misses a key
+    that another thread is loading waits for those words, so each key is
+    loaded once.
+
+    If ``stats`` (an ``api.Stats``) is provided when getting words, each
+    cache lookup is counted as one of its ``cache_hits`` or
+    ``cache_misses``, and each wordlist read as one of its ``loads``.
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE_DEFAULT):
+        if not isinstance(maxsize, int) or maxsize < 1:
+            raise ValueError("maxsize must be a positive integer")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _get(self, key, load, word_filter=None, stats=None):
+        if word_filter is not None and word_filter != _NO_FILTER:
+            return self._get(
+                key + (word_filter,),
+                lambda: word_filter.apply(self._get(key, load, stats=stats)),
+                stats=stats,
+            )
+        with self._lock:
+            words = self._entries.pop(key, None)
+            if words is not None:
+                self.hits += 1
+                if stats is not None:
+                    stats.incr("cache_hits")
+                self._put(key, words)
+                return words
+            pending = self._pending.get(key)
+            loading = pending is None
+            if loading:
+                pending = self._pending[key] = _PendingLoad()
+                self.misses += 1
+                if stats is not None:
+                    stats.incr("cache_misses")
+        if not loading:
+            # another thread is loading the words, so wait for them
+            words = pending.wait()
+            with self._lock:
+                self.hits += 1
+                if stats is not None:
+                    stats.incr("cache_hits")
+            return words
+        # load without the lock, so hits of other keys aren't blocked
+        try:
+            words = load()
+            if isinstance(words, (list, tuple)):
+                words = WordTable(words)
+        except BaseException as e:
+            with self._lock:
+                del self._pending[key]
+            pending.set(error=e)
+            raise
+        with self._lock:
+            del self._pending[key]
+            self._put(key, words)
+        pending.set(words)
+        return words
+
+    def _put(self, key, words):
+        # (re)insert as most recently used, evicting the least recent
+        self._entries[key] = words
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get_list(self, name, word_filter=None, stats=None):
+        """
+        Get the words of builtin wordlist ``name`` as a tuple.
+
+        The words are filtered by ``word_filter`` if provided.
+        """
+        key, load = self._source("list", name, stats)
+        return self._get(key, load, word_filter, stats)
+
+    def get_file(self, path, word_filter=None, stats=None):
+        """
+        Get the sorted unique words from word file ``path`` as a sequence.
+
+        The words are filtered by ``word_filter`` if provided.
+        """
+        key, load = self._source("file", path, stats)
+        return self._get(key, load, word_filter, stats)
+
+    def share_list(self, name, shm_name=None):
+        """
+        Share the words of builtin wordlist ``name`` in a shared memory block.
+
+        The block is shared between processes (see ``packed.share_words``).
+        If ``shm_name`` is None, the words are copied into a new block, and
+        the ``name`` of the answered ``packed.SharedWords`` is passed to
+        other processes, which call this method with it as ``shm_name`` to
+        attach to the block instead of loading the words. Either way, the
+        shared words replace any cached words of ``name``, so ``get_list``
+        and generators use them until they are invalidated or evicted, which
+        should be done before they are closed.
+        """
+        if shm_name is None:
+            words = packed.share_words(load_words_from_list(name))
+        elif name not in WORD_LISTS:
+            raise ValueError("Invalid wordlist: %s" % (name,))
+        else:
+            words = packed.attach_words(shm_name)
+        with self._lock:
+            self.invalidate(name=name)
+            self._put(("list", name), words)
+        return words
+
+    def get_merged(self, sources, word_filter=None, stats=None):
+        """
+        Get the sorted unique words of all of the ``sources`` as a tuple.
+
+        Each source is a ``("list", name)`` or ``("file", path)`` pair, and
+        is loaded and cached once, like the words of ``get_list`` and
+        ``get_file``. The merged words are cached too, keyed by the keys of
+        the sources, and filtered by ``word_filter`` if provided.
+        """
+        if len(sources) == 1:
+            key, load = self._source(sources[0][0], sources[0][1], stats)
+            return self._get(key, load, word_filter, stats)
+        parts = [self._source(kind, src, stats) for kind, src in sources]
+        key = ("merged",) + tuple(sorted(set(part_key for part_key, _ in parts)))
+
+        def load():
+            tables = [
+                self._get(part_key, part_load, stats=stats)
+                for part_key, part_load in parts
+            ]
+            return merge_words(tables)
+
+        return self._get(key, load, word_filter, stats)
+
+    def get_schema(self, schema, word_filter=None, stats=None):
+        """
+        Get the merged words and the positions of a schema.
+
+        ``schema`` is a list of the sources of each position, like those of
+        ``get_merged``. Answers the words of all of the positions merged into
+        one ``WordTable``, and the tuple of ascending indices into it of the
+        words of each position (see ``merge_positions``), cached keyed by
+        the keys of the sources of each position and ``word_filter``, so
+        the table and its tables of rendered words are built once.
+        """
+        if word_filter == _NO_FILTER:
+            word_filter = None
+        positions = [
+            tuple(sorted(set(self._source(kind, src, stats)[0] for kind, src in srcs)))
+            for srcs in schema
+        ]
+        key = ("schema", word_filter) + tuple(positions)
+
+        def load():
+            tables = [self.get_merged(srcs, word_filter, stats) for srcs in schema]
+            return _Schema(*merge_positions(tables))
+
+        merged = self._get(key, load, stats=stats)
+        return merged.words, merged.positions
+
+    def _source(self, kind, src, stats):
+        """Answer the key and load function of the words of a source."""
+        if kind == "list":
+            load = functools.partial(_counted_load, load_words_from_list, src, stats)
+            return ("list", src), load
+        if kind != "file":
+            raise ValueError("unknown kind of word source: %r" % (kind,))
+        path = os.path.realpath(src)
+        st = os.stat(path)
+        key = ("file", path, st.st_mtime, st.st_size, st.st_ino)
+        load = functools.partial(_counted_load, load_words_from_file, path, stats)
+        return key, load
+
+    def invalidate(self, name=None, path=None):
+        """
+        Drop cached words.
+
+        Drops the builtin wordlist ``name`` and/or every cached version of
+        word file ``path`` if either is given, as well as the merged words
+        of any sources including them, otherwise clears the whole cache.
+        Hit and miss counters are left unchanged.
+        """
+        with self._lock:
+            if name is None and path is None:
+                self._entries.clear()
+                return
+            if path is not None:
+                path = os.path.realpath(path)
+            dropped = (("list", name), ("file", path))
+            for key in list(self._entries):
+                if key[0] == "schema":
+                    parts = [part for position in key[2:] for part in position]
+                elif key[0] == "merged":
+                    parts = key[1:]
+                else:
+                    parts = (key,)
+                if any(part[:2] in dropped for part in parts):
+                    del self._entries[key]
+
+    def info(self):
+        """Answer a dict of the cache's hits, misses, size and maxsize."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+
+def merge_words(tables):
+    """
+    Merge the sorted unique words of each of ``tables`` into one list.
+
+    The merged words are also sorted and unique.
+    """
+    words = []
+    for word in heapq.merge(*tables):
+        if not words or words[-1] != word:
+            words.append(word)
+    return words
+
+
+def merge_positions(tables):
+    """
+    Merge the word ``tables`` of each position of a schema.
+
+    Answers the merged words as a ``WordTable``, and the tuple of
+    ascending indices into them of the words of each table.
+    """
+    words = WordTable(merge_words(tables))
+    positions = tuple(
+        tuple(bisect.bisect_left(words, word) for word in table) for table in tables
+    )
+    return words, positions
+
+
+class _Schema(object):
+    """Merged words and positions of a schema, cached by ``get_schema``."""
+
+    def __init__(self, words, positions):
+        self.words = words
+        self.positions = positions
+
+
+def _counted_load(load, src, stats):
+    if stats is not None:
+        stats.incr("loads")
+    return load(src)
+
+
+_NO_FILTER = WordFilter()
+
+# process-wide cache used by ``api`` for all wordlist loading
+WORDS_CACHE = WordCache()
@@ -5,18 +5,244 @@
 from __future__ import absolute_import, division, print_function
 
 import argparse
+import codecs
 import math
 import os
 import sys
 
+# Number of passphrases written to stdout at a time
+OUTPUT_BLOCK_SIZE = 1024
 
-def main():
+# Formats of the stats printed by ``--stats``
+STATS_FORMATS = ("text", "json", "prometheus")
+
+# Targets of ``--optimize``
+OPTIMIZE_TARGETS = ("length",)
+
+
+def write_lines(stream, lines, block_size=OUTPUT_BLOCK_SIZE, stats=None):
+    """
+    Write each of the ``lines`` strings as a line to ``stream``.
+
+    The lines are consumed lazily and written and flushed in blocks of
+    ``block_size`` lines, so memory use does not depend on the number of
+    lines. If ``stats`` (an ``api.Stats``) is provided, the writing of each
+    block is timed as its ``output`` stage.
+    """
+    block = []
+    for line in lines:
+        block.append(line)
+        if len(block) >= block_size:
+            _write_block(stream, block, stats)
+            block = []
+    if block:
+        _write_block(stream, block, stats)
+
+
+def _write_block(stream, block, stats):
+    block.append("")
+    if stats is None:
+        stream.write("\n".join(block))
+        stream.flush()
+        return
+    with stats.timer("output"):
+        stream.write("\n".join(block))
+        stream.flush()
+
+
+def write_stats(stream, stats, format="text"):
+    """Write ``stats`` (an ``api.Stats``) to ``stream`` in ``format``."""
+    if format == "json":
+        stream.write(stats.to_json() + "\n")
+    elif format == "prometheus":
+        stream.write(stats.to_prometheus())
+    else:
+        stream.write(stats.to_text())
+    stream.flush()
+
+
+def optimized_options(config, expected_length):
+    """
+    Answer a line of the options that select the words of an optimized config.
+
+    The ``config`` is one answered by ``api.optimize_length``.
+    """
+    if config.get("word_list"):
+        options = ["--word-list", config["word_list"]]
+    else:
+        options = ["--word-file", config["word_file"]]
+    for name in ("min_len", "max_len", "num_words"):
+        if config[name] is not None:
+            options.extend(["--" + name.replace("_", "-"), str(config[name])])
+    return "optimized for length: %s (%.1f characters expected)" % (
+        " ".join(options),
+        expected_length,
+    )
+
+
+def parse_schema(value):
+    """
+    Parse a ``--schema`` value into the word sources of each position.
+
+    Answers a list of the list of wordlist names or word file paths of each
+    position.
+    """
+    schema = [position.split("+") for position in value.split(",")]
+    if not all(all(names) for names in schema):
+        raise argparse.ArgumentTypeError("invalid schema: %r" % value)
+    return schema
+
+
+def compile_main(argv):
+    """Command-line entry point of `mkpassphrase compile`."""
+    from mkpassphrase import internal, packed
+
+    parser = argparse.ArgumentParser(
+        prog="mkpassphrase compile",
+        description="Compile a word file into a packed wordlist, "
+        "which loads in constant time regardless of the number of words.",
+    )
+    parser.add_argument(
+        "word_file", metavar="WORD_FILE", help="Word file path (one word per line)"
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        metavar="OUTPUT",
+        help="Packed wordlist path (the default is WORD_FILE "
+        "with its extension replaced by {})".format(packed.SUFFIX),
+    )
+    parser.add_argument(
+        "-m",
+        "--max-memory",
+        type=int,
+        metavar="MB",
+        help="Sort the words using temporary files so that the words held in "
+        "memory take at most about MB megabytes (the default is to sort "
+        "all the words in memory)",
+    )
+    parser.add_argument(
+        "--progress",
+        action="store_true",
+        help="Show the number of lines read so far on stderr",
+    )
+    args = parser.parse_args(argv)
+    if args.max_memory is not None and args.max_memory < 1:
+        parser.exit("--max-memory must be positive if provided")
+    if not os.access(args.word_file, os.R_OK):
+        parser.exit("word file does not exist or is not readable: %s" % args.word_file)
+    output = args.output or os.path.splitext(args.word_file)[0] + packed.SUFFIX
+    if os.path.abspath(output) == os.path.abspath(args.word_file):
+        parser.exit("output path must differ from word file path")
+
+    def progress(lines, runs):
+        print("read {} lines, {} temporary files".format(lines, runs), file=sys.stderr)
+
+    memory_limit = args.max_memory * 1024 * 1024 if args.max_memory else None
+    try:
+        count = internal.compile_words(
+            args.word_file,
+            output,
+            memory_limit=memory_limit,
+            progress=progress if args.progress else None,
+        )
+    except (IOError, OSError) as e:
+        parser.exit("can't write {}: {}".format(output, e.strerror))
+    print("compiled {} words to {}".format(count, output))
+
+
+def serve_main(argv):
+    """Command-line entry point of `mkpassphrase serve`."""
+    from mkpassphrase import server
+
+    parser = argparse.ArgumentParser(
+        prog="mkpassphrase serve",
+        description="Serve passphrases from pools of pregenerated passphrases "
+        "to clients that send a JSON request per line.",
+    )
+    parser.add_argument(
+        "-H",
+        "--host",
+        default="127.0.0.1",
+        metavar="HOST",
+        help="Listen on HOST (the default is 127.0.0.1)",
+    )
+    parser.add_argument(
+        "-P",
+        "--port",
+        type=int,
+        default=0,
+        metavar="PORT",
+        help="Listen on PORT (the default is any free port)",
+    )
+    parser.add_argument(
+        "-U",
+        "--unix",
+        dest="path",
+        metavar="PATH",
+        help="Listen on the unix socket PATH instead of on HOST and PORT",
+    )
+    parser.add_argument(
+        "-z",
+        "--pool-size",
+        type=int,
+        default=server.POOL_SIZE_DEFAULT,
+        metavar="SIZE",
+        help="Keep SIZE passphrases pregenerated per policy "
+        "(the default is {})".format(server.POOL_SIZE_DEFAULT),
+    )
+    parser.add_argument(
+        "-m",
+        "--max-served",
+        type=int,
+        default=server.MAX_SERVED,
+        metavar="COUNT",
+        help="Serve at most COUNT passphrases per policy, so that none is "
+        "served twice (the default is {})".format(server.MAX_SERVED),
+    )
+    parser.add_argument(
+        "-W",
+        "--word-file",
+        dest="word_files",
+        action="append",
+        metavar="PATH",
+        help="Allow policies to use the word file PATH (may be repeated)",
+    )
+    args = parser.parse_args(argv)
+    if args.pool_size < 1:
+        parser.exit("--pool-size must be positive")
+    if args.max_served < 1:
+        parser.exit("--max-served must be positive")
+
+    server.serve(
+        args.host,
+        args.port,
+        args.path,
+        args.pool_size,
+        args.max_served,
+        args.word_files,
+    )
+
+
+def main(argv=None):
     """Command-line entry point."""
     import mkpassphrase as MP
-    from mkpassphrase import api, internal
+    from mkpassphrase import api, export, internal
+
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv[:1] == ["compile"]:
+        return compile_main(argv[1:])
+    if argv[:1] == ["serve"]:
+        return serve_main(argv[1:])
 
     wordlists = sorted(internal.WORD_LISTS)
-    parser = argparse.ArgumentParser(description="Generate a passphrase.")
+    parser = argparse.ArgumentParser(
+        description="Generate a passphrase.",
+        epilog="Run `mkpassphrase compile --help` for how to compile a word file "
+        "into a packed wordlist, and `mkpassphrase serve --help` for how to run "
+        "a passphrase server.",
+    )
     parser.add_argument(
         "-n",
         "--num-words",
@@ -41,14 +267,74 @@ def main():
         type=str,
         metavar="WORD_LIST",
         choices=wordlists,
-        help="Use built-in wordlist (eff-large [default], eff1, or eff2)",
+        action="append",
+        help="Use built-in wordlist (eff-large [default], eff1, or eff2); "
+        "may be repeated, and combined with --word-file, to merge the words",
     )
     parser.add_argument(
         "-f",
         "--word-file",
         type=str,
         metavar="WORD_FILE",
-        help="Word file path (one word per line)",
+        action="append",
+        help="Word file path (one word per line); may be repeated",
+    )
+    parser.add_argument(
+        "--schema",
+        type=parse_schema,
+        metavar="SCHEMA",
+        help="Choose each word from its own wordlists: a comma-separated list "
+        "of one position per word, each a built-in wordlist or word file path, "
+        "or several joined by '+' to merge them (e.g. eff1,eff2+words.txt,eff1)",
+    )
+    parser.add_argument(
+        "--optimize",
+        choices=OPTIMIZE_TARGETS,
+        metavar="TARGET",
+        help="Choose the wordlist (of the given or built-in wordlists), word "
+        "lengths and number of words that reach the target entropy with the "
+        "shortest expected passphrase; TARGET must be length",
+    )
+    parser.add_argument(
+        "--min-len",
+        type=int,
+        metavar="MIN_LEN",
+        help="Use only words with at least MIN_LEN characters",
+    )
+    parser.add_argument(
+        "--max-len",
+        type=int,
+        metavar="MAX_LEN",
+        help="Use only words with at most MAX_LEN characters",
+    )
+    parser.add_argument(
+        "--max-length",
+        type=int,
+        metavar="LENGTH",
+        help="Make passphrases of at most LENGTH characters, chosen evenly from "
+        "all that fit, with the entropy of their exact number",
+    )
+    parser.add_argument(
+        "--exact-length",
+        type=int,
+        metavar="LENGTH",
+        help="Make passphrases of exactly LENGTH characters, like --max-length",
+    )
+    parser.add_argument(
+        "--charset",
+        metavar="CHARS",
+        help="Use only words whose characters are all in the string CHARS",
+    )
+    parser.add_argument(
+        "--exclude-file",
+        metavar="EXCLUDE_FILE",
+        help="Don't use words in EXCLUDE_FILE (one word per line)",
+    )
+    parser.add_argument(
+        "--unique-prefix",
+        type=int,
+        metavar="N",
+        help="Use only the first of words that start with the same N characters",
     )
     parser.add_argument(
         "-l",
@@ -87,6 +373,65 @@ def main():
         help="Generate TIMES different passphrases "
         "(the default is to generate 1 passphrase)",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        dest="workers",
+        type=int,
+        metavar="JOBS",
+        help="Split generation of passphrases between JOBS processes "
+        "(the default is to generate all passphrases in this process)",
+    )
+    parser.add_argument(
+        "-u",
+        "--unordered",
+        action="store_false",
+        dest="ordered",
+        default=True,
+        help="Output passphrases of each process as soon as they are available, "
+        "instead of in the order the work was split (only used with --jobs)",
+    )
+    parser.add_argument(
+        "--unique",
+        action="store_true",
+        help="Make all TIMES passphrases different, which takes a few bytes "
+        "of memory per passphrase (not allowed with --jobs)",
+    )
+    parser.add_argument(
+        "--seed",
+        metavar="SEED",
+        help="FOR TESTING ONLY: generate the same passphrases every time for "
+        "the same SEED and options, instead of secret passphrases from the "
+        "OS random number generator",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        metavar="FILE",
+        help="Write the passphrases to FILE, which is replaced only once all "
+        "are written (the default is to write them to stdout)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=export.FORMATS,
+        metavar="FORMAT",
+        help="Write the passphrases as FORMAT, one of {} (the default is "
+        "text, one per line)".format(", ".join(export.FORMATS)),
+    )
+    parser.add_argument(
+        "--fsync",
+        action="store_true",
+        help="Sync the --output FILE to disk before replacing FILE",
+    )
+    parser.add_argument(
+        "--stats",
+        nargs="?",
+        const="text",
+        choices=STATS_FORMATS,
+        metavar="FORMAT",
+        help="Print counters and per-stage timings to stderr as FORMAT, "
+        "one of {} (the default is text)".format(", ".join(STATS_FORMATS)),
+    )
     parser.add_argument("-V", "--version", action="store_true", help="Show version")
     parser.add_argument(
         "-q",
@@ -96,7 +441,7 @@ def main():
         "is to also show the security-level of the generated passphrase(s))",
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     if args.version:
         print("%s %s" % (MP.__name__, MP.__version__))
         sys.exit(0)
@@ -104,29 +449,128 @@ def main():
         parser.exit("--num-words must be positive if provided")
     if args.times < 1:
         parser.exit("--times must be positive if provided")
-    if args.word_list and args.word_file:
-        parser.exit("only one of --word-list and --word-file is allowed")
-    if args.word_file and not os.access(args.word_file, os.R_OK):
-        parser.exit("word file does not exist or is not readable: %s" % args.word_file)
+    if args.workers is not None and args.workers < 1:
+        parser.exit("--jobs must be positive if provided")
+    word_files = list(args.word_file or [])
+    if args.schema:
+        if args.word_list or args.word_file:
+            parser.exit("--schema is not allowed with --word-list or --word-file")
+        if args.num_words is not None:
+            parser.exit("--num-words is not allowed with --schema")
+        for names in args.schema:
+            word_files.extend(name for name in names if name not in wordlists)
+    if args.optimize:
+        if args.num_words is not None:
+            parser.exit("--num-words is not allowed with --optimize")
+        if args.schema or args.unique_prefix:
+            parser.exit("--schema and --unique-prefix are not allowed with --optimize")
+    for word_file in word_files:
+        if not os.access(word_file, os.R_OK):
+            parser.exit("word file does not exist or is not readable: %s" % word_file)
+    for name in ("min_len", "max_len", "max_length", "exact_length", "unique_prefix"):
+        value = getattr(args, name)
+        if value is not None and value < 1:
+            option = "--" + name.replace("_", "-")
+            parser.exit("%s must be positive if provided" % option)
+    if args.max_length and args.exact_length:
+        parser.exit("only one of --max-length and --exact-length is allowed")
+    length = args.max_length or args.exact_length
+    if length and (args.schema or args.optimize):
+        msg = "--schema and --optimize are not allowed with --max-length or "
+        parser.exit(msg + "--exact-length")
+    if args.min_len and args.max_len and args.min_len > args.max_len:
+        parser.exit("--min-len must not be greater than --max-len")
+    if args.unique and args.workers and args.workers > 1:
+        parser.exit("--unique is not allowed with --jobs")
+    if args.fsync and not args.output:
+        parser.exit("--fsync requires --output")
+    if args.exclude_file and not os.access(args.exclude_file, os.R_OK):
+        parser.exit(
+            "exclude file does not exist or is not readable: %s" % args.exclude_file
+        )
 
     params = vars(args)
+    exclude_file = params.pop("exclude_file", None)
+    if exclude_file:
+        with codecs.open(exclude_file, "r", "utf-8") as f:
+            params["exclude"] = f.read().split()
     quiet = params.pop("quiet", False)
     times = params.pop("times", 1)
+    stats_format = params.pop("stats", None)
+    output = params.pop("output", None)
+    output_format = params.pop("format", None)
+    fsync = params.pop("fsync", False)
     params.pop("version", None)
+    optimize = params.pop("optimize", None)
+    stats = api.Stats() if stats_format else None
+
+    try:
+        if optimize:
+            config, expected_length = api.optimize_length(
+                params["entropy"],
+                params.pop("word_list"),
+                params.pop("word_file"),
+                params["min_len"],
+                params["max_len"],
+                params["random_case"],
+                params["delimiter"],
+                params["pad"],
+                params["charset"],
+                params.get("exclude"),
+            )
+            params.update(word_list=None, word_file=None)
+            params.update(config)
 
-    # use the default wordlist if no list or file was provided
-    if not args.word_file and not args.word_list:
-        params["word_list"] = internal.WORD_LIST_DEFAULT
+        # use the default wordlist if no list or file was provided
+        if not params["word_file"] and not params["word_list"] and not args.schema:
+            params["word_list"] = internal.WORD_LIST_DEFAULT
 
-    passphrases, entropy = api.mkpassphrase(count=times, **params)
-    if times == 1:
-        passphrases = [passphrases]
-    for passphrase in passphrases:
-        print(passphrase)
+        if output_format in ("csv", "jsonl") and params["num_words"] is None:
+            # these formats include the number of words, so calculate it first
+            policy = dict(params)
+            del policy["workers"], policy["ordered"], policy["unique"]
+            params["num_words"] = api.PassphraseGenerator(**policy).num_words
+            params["entropy"] = None
+        passphrases, entropy = api.iter_passphrases(count=times, stats=stats, **params)
+    except ValueError as e:
+        parser.exit(str(e))
+    if output:
+        export.export(
+            output,
+            passphrases,
+            output_format or "text",
+            entropy,
+            params["num_words"],
+            fsync=fsync,
+            stats=stats,
+        )
+    elif output_format:
+        sys.stdout.flush()
+        export.write_fd(
+            sys.stdout.fileno(),
+            passphrases,
+            output_format,
+            entropy,
+            params["num_words"],
+            stats=stats,
+        )
+    else:
+        write_lines(sys.stdout, passphrases, stats=stats)
 
     if not quiet:
-        print()
-        print("{}-bit security level".format(int(math.floor(entropy))))
+        level = "{}-bit security level".format(int(math.floor(entropy)))
+        if args.seed is not None:
+            level += " (NOT SECURE: generated from --seed for testing only)"
+        lines = [level]
+        if optimize:
+            lines.append(optimized_options(config, expected_length))
+        if output or output_format:
+            print("\n".join(lines), file=sys.stderr)
+        else:
+            print()
+            print("\n".join(lines))
+    if stats is not None:
+        write_stats(sys.stderr, stats, stats_format)
 
 
 if __name__ == "__main__":
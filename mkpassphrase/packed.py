@@ -0,0 +1,249 @@
+# coding=utf-8
+
+"""
+Packed binary wordlist format, for loading large wordlists with ``mmap``.
+
+A packed wordlist consists of a header, the UTF-8 encoded words
+concatenated without separators, and an array of the ``count + 1``
+offsets of the words relative to the end of the header, so word ``i`` is
+the bytes between offsets ``i`` and ``i + 1``. The words are sorted and
+unique, like the words of ``internal.load_from_stream``, and are decoded
+one at a time only when indexed, so opening a packed wordlist costs the
+same regardless of the number of words.
+
+The same layout can be shared between processes in a named block of
+shared memory (see ``share_words`` and ``attach_words``, which require
+python 3.8+), so that many worker processes use one copy of the words.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import array
+import contextlib
+import io
+import mmap
+import struct
+import threading
+
+try:
+    from collections.abc import Sequence
+except ImportError:  # python2
+    from collections import Sequence
+
+# like PNG, the non-ASCII first byte and the line endings detect text files
+# and line ending conversion
+MAGIC = b"\x89MKPW\r\n\x1a"
+VERSION = 1
+
+# file extension conventionally used for packed wordlists
+SUFFIX = ".mkpw"
+
+# magic, version, flags, reserved, number of words, position of offsets
+HEADER = struct.Struct("<8sHHIQQ")
+OFFSET = struct.Struct("<Q")
+OFFSET_PAIR = struct.Struct("<QQ")
+
+# number of offsets packed per write
+_OFFSETS_CHUNK = 4096
+
+# serializes attaching to shared memory blocks without tracking them
+_untracked_lock = threading.Lock()
+
+
+class FormatError(Exception):
+    """Invalid packed wordlist."""
+
+
+class PackedWords(Sequence):
+    """
+    Read-only sequence of the words of a packed wordlist in a buffer.
+
+    The ``buf`` may be any object supporting the buffer protocol and
+    slicing, such as an ``mmap`` or a ``memoryview``.
+    """
+
+    def __init__(self, buf):
+        if len(buf) < HEADER.size:
+            raise FormatError("packed wordlist too short")
+        magic, version, _, _, count, offsets_pos = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise FormatError("not a packed wordlist")
+        if version != VERSION:
+            raise FormatError("unsupported packed wordlist version: %d" % version)
+        offsets_end = offsets_pos + (count + 1) * OFFSET.size
+        if offsets_pos < HEADER.size or offsets_end > len(buf):
+            raise FormatError("packed wordlist corrupt or truncated")
+        self._buf = buf
+        self._count = count
+        self._offsets_pos = offsets_pos
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("word index out of range")
+        pos = self._offsets_pos + index * OFFSET.size
+        start, end = OFFSET_PAIR.unpack_from(self._buf, pos)
+        start += HEADER.size
+        end += HEADER.size
+        return bytes(self._buf[start:end]).decode("utf-8")
+
+    def close(self):
+        """Release the underlying buffer, if it can be closed."""
+        close = getattr(self._buf, "close", None)
+        if close is not None:
+            close()
+
+
+class SharedWords(PackedWords):
+    """
+    Read-only sequence of the words of a packed wordlist in shared memory.
+
+    The words are in ``shm``, a ``shared_memory.SharedMemory`` block.
+
+    The block's ``name`` is passed to other processes to attach to it with
+    ``attach_words``. Each process should ``close`` its words when done,
+    and the process that created the block should also ``unlink`` it.
+    """
+
+    def __init__(self, shm):
+        PackedWords.__init__(self, shm.buf)
+        self.shm = shm
+        self.name = shm.name
+
+    def close(self):
+        """Release this process's view of the shared memory block."""
+        self._buf = None
+        self.shm.close()
+
+    def unlink(self):
+        """Destroy the shared memory block, once every process closed it."""
+        self.shm.unlink()
+
+
+def write_packed(stream, words):
+    """
+    Write the ``words`` to binary ``stream`` as a packed wordlist.
+
+    The ``words`` may be any iterable of sorted unique strings, and are
+    consumed one at a time, but ``stream`` must be seekable since the
+    header is written last. Answers the number of words written.
+    """
+    start = stream.tell()
+    stream.write(b"\0" * HEADER.size)
+    offsets = _new_offsets()
+    offsets.append(0)
+    for word in words:
+        data = word.encode("utf-8")
+        stream.write(data)
+        offsets.append(offsets[-1] + len(data))
+    for i in range(0, len(offsets), _OFFSETS_CHUNK):
+        chunk = offsets[i : i + _OFFSETS_CHUNK]
+        stream.write(struct.pack("<%dQ" % len(chunk), *chunk))
+    end = stream.tell()
+    count = len(offsets) - 1
+    offsets_pos = HEADER.size + offsets[-1]
+    stream.seek(start)
+    stream.write(HEADER.pack(MAGIC, VERSION, 0, 0, count, offsets_pos))
+    stream.seek(end)
+    return count
+
+
+def _new_offsets():
+    """Answer a new empty list of offsets, as compact as supported."""
+    try:
+        return array.array("Q")
+    except ValueError:  # python2
+        return []
+
+
+def is_packed(path):
+    """Answer whether the file at ``path`` is a packed wordlist."""
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _shared_memory():
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        raise ImportError("shared memory wordlists require python 3.8+")
+    return shared_memory
+
+
+def share_words(words, name=None):
+    """
+    Copy the sorted unique ``words`` into a new shared memory block.
+
+    The block holds the words as a packed wordlist, and is named ``name``
+    or a random name if None.
+
+    Answers the ``SharedWords`` of the block, which remains until it is
+    unlinked (or this process exits without unlinking it, in which case
+    python's resource tracker unlinks it and warns of a leak).
+    """
+    stream = io.BytesIO()
+    write_packed(stream, words)
+    data = stream.getvalue()
+    shm = _shared_memory().SharedMemory(name, create=True, size=len(data))
+    shm.buf[: len(data)] = data
+    return SharedWords(shm)
+
+
+def attach_words(name):
+    """
+    Attach to the shared memory block ``name`` of ``share_words``.
+
+    Only the creator of the block is responsible for unlinking it, so the
+    block isn't registered with python's resource tracker, which would
+    otherwise unlink it when this process exits.
+    """
+    shared_memory = _shared_memory()
+    try:
+        shm = shared_memory.SharedMemory(name, track=False)
+    except TypeError:  # before python 3.13, which added ``track``
+        with _untracked():
+            shm = shared_memory.SharedMemory(name)
+    try:
+        return SharedWords(shm)
+    except FormatError:
+        shm.close()
+        raise
+
+
+@contextlib.contextmanager
+def _untracked():
+    """Skip registering shared memory blocks with the resource tracker."""
+    from multiprocessing import resource_tracker
+
+    register = resource_tracker.register
+
+    def skip_shared_memory(name, rtype):
+        if rtype != "shared_memory":
+            register(name, rtype)
+
+    with _untracked_lock:
+        resource_tracker.register = skip_shared_memory
+        try:
+            yield
+        finally:
+            resource_tracker.register = register
+
+
+def open_packed(path):
+    """Open the packed wordlist file at ``path`` using ``mmap``."""
+    with open(path, "rb") as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            raise FormatError("packed wordlist too short")
+    try:
+        return PackedWords(buf)
+    except FormatError:
+        buf.close()
+        raise
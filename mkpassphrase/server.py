@@ -0,0 +1,491 @@
+# coding=utf-8
+
+"""
+Local passphrase server, run as `mkpassphrase serve` (requires python 3.5+).
+
+The server keeps a pool of pregenerated passphrases for each policy that
+has been requested, and refills the pools in the background, so requests
+are answered without waiting for passphrases to be generated.
+
+Clients send one JSON object per line, and get one JSON object per line
+in response. A request for passphrases looks like::
+
+    {"policy": {"word_list": "eff1", "entropy": 64}, "count": 2}
+
+where the optional ``policy`` has the same keys as the params of
+``api.PassphraseGenerator`` (but ``word_file`` only for the word files
+the server was started with), and the optional ``count`` defaults to 1.
+The response contains ``passphrases``, ``entropy`` and ``num_words``.
+A request of ``{"stats": true}`` gets a response with the server's
+``stats``, including the counters and timings of passphrase generation
+as ``generation``, and a request of ``{"stats": true, "format":
+"prometheus"}`` gets the same stats as a string in the Prometheus text
+format. An invalid request gets a response with an ``error``.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import asyncio
+import collections
+import functools
+import json
+import time
+
+from . import api, internal
+
+# Number of passphrases kept in the pool of each policy by default
+POOL_SIZE_DEFAULT = 1024
+
+# Max number of policies, and so pools, of a server
+MAX_POOLS = 64
+
+# Max number of passphrases per request
+MAX_COUNT = 1024
+
+# Number of passphrases generated between yields to the event loop when
+# refilling a pool
+REFILL_CHUNK_SIZE = 64
+
+# Number of most recent request latencies used for the latency stats
+LATENCY_SAMPLES = 1024
+
+# Formats of the stats of a stats request
+STATS_FORMATS = ("json", "prometheus")
+
+# Max number of passphrases served per policy by default, which bounds the
+# memory taken by the keys of the passphrases served
+MAX_SERVED = 1 << 18
+
+# Keys allowed in a request's policy, and also "word_file" if the server
+# has word files
+POLICY_KEYS = frozenset(
+    [
+        "word_list",
+        "entropy",
+        "num_words",
+        "random_case",
+        "delimiter",
+        "pad",
+        "min_len",
+        "max_len",
+        "charset",
+        "exclude",
+        "unique_prefix",
+        "schema",
+        "max_length",
+        "exact_length",
+    ]
+)
+
+# Bounds of the numeric values of a request's policy, which bound the time
+# taken to create the generator of a policy
+POLICY_BOUNDS = {
+    "entropy": (1, 256),
+    "num_words": (1, 32),
+    "max_length": (1, 256),
+    "exact_length": (1, 256),
+    "min_len": (0, 256),
+    "max_len": (0, 256),
+    "unique_prefix": (0, 256),
+}
+
+# Max length of the string values, and of the list values, of a policy
+MAX_POLICY_STRING = 256
+MAX_POLICY_LIST = 1024
+
+_timer = getattr(time, "perf_counter", time.time)
+
+# ``asyncio.current_task`` requires python 3.7+
+_current_task = getattr(asyncio, "current_task", None) or asyncio.Task.current_task
+
+
+class RequestError(Exception):
+    """Invalid request."""
+
+
+class PassphrasePool(object):
+    """
+    Bounded pool of pregenerated passphrases of one generator.
+
+    The int key of every passphrase the pool has generated is recorded in
+    an ``internal.SeenSet``, and a passphrase whose key was already
+    recorded is discarded, so the pool never hands out the same passphrase
+    twice over its whole lifetime, not only while it is pooled. Keys are
+    canonical (see ``api.PassphraseGenerator.pack``), so passphrases that
+    differ only in the case bit of a word that is the same in title case
+    have the same key. The set holds at most ``max_served + size`` keys,
+    and the generator must have at least twice as many possible
+    passphrases (as rendered), so that a new passphrase is found in two
+    draws on average.
+    Once ``max_served`` passphrases have been served, the pool is exhausted.
+    """
+
+    def __init__(self, generator, size=POOL_SIZE_DEFAULT, max_served=MAX_SERVED):
+        capacity = max_served + size
+        if generator.num_possible() < 2 * capacity:
+            msg = "policy has too few possible passphrases to serve %d" % max_served
+            raise ValueError(msg)
+        self.generator = generator
+        self.size = size
+        self.max_served = max_served
+        self.generated = 0
+        self.served = 0
+        self.misses = 0
+        self.refill_time = 0.0
+        self._seen = internal.SeenSet(generator.num_keys(), capacity)
+        self._items = collections.deque()
+        self._wanted = asyncio.Event()
+        self._wanted.set()
+        self._task = None
+
+    def __len__(self):
+        return len(self._items)
+
+    def start(self):
+        """Start refilling the pool in the background."""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._refill())
+
+    def stop(self):
+        """Stop refilling the pool, answering the cancelled task if any."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+        return task
+
+    def take(self, count):
+        """
+        Take ``count`` passphrases from the pool.
+
+        If the pool has fewer than ``count`` passphrases, the rest are
+        generated immediately, and counted as misses. Raises
+        ``RequestError`` if that would serve more than ``max_served``.
+        """
+        if self.served + count > self.max_served:
+            raise RequestError("policy is exhausted")
+        passphrases = []
+        while self._items and len(passphrases) < count:
+            passphrases.append(self._items.popleft())
+        while len(passphrases) < count:
+            passphrases.append(self._generate())
+            self.misses += 1
+        self.served += count
+        self._wanted.set()
+        return passphrases
+
+    def stats(self):
+        """Answer a dict of the pool's stats."""
+        rate = self.generated / self.refill_time if self.refill_time else None
+        return {
+            "depth": len(self._items),
+            "size": self.size,
+            "generated": self.generated,
+            "served": self.served,
+            "misses": self.misses,
+            "refill_rate": rate,
+        }
+
+    def _generate(self):
+        """Generate a passphrase that the pool has never generated."""
+        generator, stats = self.generator, self.generator.stats
+        if stats is not None:
+            start = _timer()
+        key = generator.generate_key()
+        while not self._seen.add(key):
+            key = generator.generate_key()
+        passphrase = generator.decode(key)
+        if stats is not None:
+            stats.add_time("sample", _timer() - start)
+            stats.incr("passphrases")
+        return passphrase
+
+    def _wanted_count(self):
+        """Answer the number of passphrases to generate to refill the pool."""
+        remaining = self.max_served - self.served - len(self._items)
+        return min(self.size - len(self._items), remaining)
+
+    async def _refill(self):
+        while True:
+            await self._wanted.wait()
+            while self._wanted_count() > 0:
+                start = _timer()
+                for _ in range(min(REFILL_CHUNK_SIZE, self._wanted_count())):
+                    self._items.append(self._generate())
+                    self.generated += 1
+                self.refill_time += _timer() - start
+                await asyncio.sleep(0)
+            self._wanted.clear()
+
+
+def _is_number(value, types=(int, float)):
+    """Answer whether ``value`` is a JSON number of ``types``, and not a bool."""
+    return isinstance(value, types) and not isinstance(value, bool)
+
+
+def _check_strings(key, value, max_items=MAX_POLICY_LIST):
+    """Answer the list of strings of ``value``, a string or a list of them."""
+    if isinstance(value, str):
+        value = [value]
+    if (
+        not isinstance(value, list)
+        or len(value) > max_items
+        or not all(isinstance(item, str) for item in value)
+    ):
+        msg = "'%s' must be a string or a list of at most %d strings"
+        raise RequestError(msg % (key, max_items))
+    return value
+
+
+class PassphraseServer(object):
+    """
+    Server of passphrases from a pool per policy.
+
+    The values of a request's policy are checked against ``POLICY_BOUNDS``
+    and the other limits above, and each generator is created in the
+    loop's default executor, so that no request blocks the event loop. Word
+    files can only be used by a policy if they are among ``word_files``.
+    """
+
+    def __init__(
+        self, pool_size=POOL_SIZE_DEFAULT, max_served=MAX_SERVED, word_files=None
+    ):
+        self.pool_size = pool_size
+        self.max_served = max_served
+        self.word_files = frozenset(word_files or ())
+        self.pools = {}
+        self.requests = 0
+        self.errors = 0
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.generation_stats = api.Stats()
+        self._pending = {}
+        self._servers = []
+        self._connections = set()
+
+    def check_policy(self, policy):
+        """
+        Answer a copy of ``policy``, with the default word list if it has no words.
+
+        Raises ``RequestError`` if the policy is not allowed.
+        """
+        if not isinstance(policy, dict):
+            raise RequestError("'policy' must be an object")
+        keys = POLICY_KEYS | {"word_file"} if self.word_files else POLICY_KEYS
+        unknown = set(policy) - keys
+        if unknown:
+            raise RequestError("unknown policy keys: %s" % ", ".join(sorted(unknown)))
+        words = set(internal.WORD_LISTS) | self.word_files
+        for key, value in policy.items():
+            if value is None:
+                continue
+            if key in POLICY_BOUNDS:
+                lo, hi = POLICY_BOUNDS[key]
+                if key == "entropy":
+                    types, kind = (int, float), "a number"
+                else:
+                    types, kind = int, "an integer"
+                if not _is_number(value, types) or not lo <= value <= hi:
+                    msg = "'%s' must be %s from %d to %d"
+                    raise RequestError(msg % (key, kind, lo, hi))
+            elif key in ("delimiter", "pad", "charset"):
+                if not isinstance(value, str) or len(value) > MAX_POLICY_STRING:
+                    msg = "'%s' must be a string of at most %d characters"
+                    raise RequestError(msg % (key, MAX_POLICY_STRING))
+            elif key == "random_case":
+                if not isinstance(value, bool):
+                    raise RequestError("'random_case' must be a boolean")
+            elif key == "exclude":
+                _check_strings(key, value)
+            elif key == "word_file":
+                if not self.word_files.issuperset(_check_strings(key, value)):
+                    raise RequestError("'word_file' must be one of the server's")
+            elif key == "word_list":
+                _check_strings(key, value)
+            elif key == "schema":
+                if not isinstance(value, list) or not value:
+                    raise RequestError("'schema' must be a non-empty list")
+                if len(value) > POLICY_BOUNDS["num_words"][1]:
+                    msg = "'schema' must have at most %d items"
+                    raise RequestError(msg % POLICY_BOUNDS["num_words"][1])
+                for item in value:
+                    if not words.issuperset(_check_strings(key, item)):
+                        msg = "'schema' items must be word lists or the server's files"
+                        raise RequestError(msg)
+        policy = dict(policy)
+        if not any(policy.get(key) for key in ("word_list", "word_file", "schema")):
+            policy["word_list"] = internal.WORD_LIST_DEFAULT
+        return policy
+
+    async def get_pool(self, policy):
+        """Get the pool of ``policy``, creating it if needed."""
+        policy = self.check_policy(policy)
+        key = json.dumps(policy, sort_keys=True)
+        pool = self.pools.get(key)
+        if pool is not None:
+            return pool
+        task = self._pending.get(key)
+        if task is None:
+            if len(self.pools) + len(self._pending) >= MAX_POOLS:
+                raise RequestError("too many policies")
+            task = asyncio.ensure_future(self._create_pool(key, policy))
+            self._pending[key] = task
+        # a cancelled request must not cancel the creation for other requests
+        return await asyncio.shield(task)
+
+    async def _create_pool(self, key, policy):
+        """Create the pool of ``policy``, creating its generator in the executor."""
+        create = functools.partial(
+            api.PassphraseGenerator, stats=self.generation_stats, **policy
+        )
+        try:
+            generator = await asyncio.get_event_loop().run_in_executor(None, create)
+            pool = PassphrasePool(generator, self.pool_size, self.max_served)
+        except (ValueError, TypeError, IOError, OSError) as e:
+            raise RequestError(str(e))
+        finally:
+            del self._pending[key]
+        self.pools[key] = pool
+        pool.start()
+        return pool
+
+    async def handle_request(self, request):
+        """Answer the response dict of the ``request`` dict."""
+        if not isinstance(request, dict):
+            raise RequestError("request must be an object")
+        if request.get("stats"):
+            stats_format = request.get("format", "json")
+            if stats_format not in STATS_FORMATS:
+                msg = "'format' must be one of: %s" % ", ".join(STATS_FORMATS)
+                raise RequestError(msg)
+            if stats_format == "prometheus":
+                return {"stats": self.metrics()}
+            return {"stats": self.stats()}
+        count = request.get("count", 1)
+        if not _is_number(count, int) or count < 1:
+            raise RequestError("'count' must be a positive integer")
+        if count > MAX_COUNT:
+            raise RequestError("'count' must be at most %d" % MAX_COUNT)
+        pool = await self.get_pool(request.get("policy", {}))
+        return {
+            "passphrases": pool.take(count),
+            "entropy": pool.generator.entropy,
+            "num_words": pool.generator.num_words,
+        }
+
+    async def handle_line(self, line):
+        """Answer the response line of request ``line``, both bytes."""
+        start = _timer()
+        self.requests += 1
+        try:
+            try:
+                request = json.loads(line.decode("utf-8"))
+            except ValueError:
+                raise RequestError("request must be a JSON object")
+            response = await self.handle_request(request)
+        except RequestError as e:
+            self.errors += 1
+            response = {"error": str(e)}
+        data = json.dumps(response).encode("utf-8") + b"\n"
+        self.latencies.append(_timer() - start)
+        return data
+
+    def latency(self):
+        """Answer a dict of the number, p50, p99 and max of recent latencies."""
+        latencies = sorted(self.latencies)
+        latency = {"samples": len(latencies)}
+        if latencies:
+            for name, fraction in (("p50", 0.5), ("p99", 0.99)):
+                latency[name] = latencies[int(fraction * (len(latencies) - 1))]
+            latency["max"] = latencies[-1]
+        return latency
+
+    def stats(self):
+        """Answer a dict of the server's stats, including each pool's stats."""
+        pools = []
+        for key, pool in sorted(self.pools.items()):
+            stats = pool.stats()
+            stats["policy"] = json.loads(key)
+            pools.append(stats)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency": self.latency(),
+            "pools": pools,
+            "generation": self.generation_stats.as_dict(),
+        }
+
+    def metrics(self):
+        """Answer the server's stats in the Prometheus text format."""
+        stats = api.Stats()
+        stats.merge(self.generation_stats.as_dict())
+        stats.incr("requests", self.requests)
+        stats.incr("errors", self.errors)
+        stats.set_gauge("pools", len(self.pools))
+        stats.set_gauge("pooled", sum(len(pool) for pool in self.pools.values()))
+        for name, value in self.latency().items():
+            if name != "samples":
+                stats.set_gauge("latency_%s_seconds" % name, value)
+        return stats.to_prometheus()
+
+    async def handle_connection(self, reader, writer):
+        """Answer each request line of a client connection."""
+        task = _current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                writer.write(await self.handle_line(line))
+                await writer.drain()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def start(self, host=None, port=None, path=None):
+        """Listen on the unix socket ``path`` if provided, else on TCP."""
+        if path:
+            server = await asyncio.start_unix_server(self.handle_connection, path)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+        self._servers.append(server)
+        return server
+
+    async def close(self):
+        """Stop listening, close client connections and stop refilling pools."""
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+        tasks = list(self._connections)
+        tasks.extend(self._pending.values())
+        tasks.extend(pool.stop() for pool in self.pools.values())
+        for task in tasks:
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*filter(None, tasks), return_exceptions=True)
+
+
+def serve(
+    host="127.0.0.1",
+    port=0,
+    path=None,
+    pool_size=POOL_SIZE_DEFAULT,
+    max_served=MAX_SERVED,
+    word_files=None,
+):
+    """Run a ``PassphraseServer`` until interrupted."""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    server = PassphraseServer(pool_size, max_served, word_files)
+    listener = loop.run_until_complete(server.start(host, port, path))
+    for sock in listener.sockets:
+        print("listening on {}".format(sock.getsockname()), flush=True)
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(server.close())
+        loop.close()
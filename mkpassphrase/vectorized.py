@@ -0,0 +1,133 @@
+# coding=utf-8
+
+"""
+Vectorised generation of passphrases in bulk, using NumPy if installed.
+
+A batch of passphrases is sampled as a matrix of word indices, one row
+per passphrase, from one large read of random bytes, using the same
+rejection sampling as ``internal.RandomBuffer.randbelow`` on whole arrays
+at a time. The case bits are applied by offsetting the indices into a
+table of the words followed by their title case versions, so rendering a
+passphrase is just a gather and a join.
+
+NumPy is imported only when first needed, so that importing this module
+costs nothing when it isn't installed or batches are small.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from . import internal
+
+# Max number of words of a table for which passphrases are vectorised,
+# since the table of the words and their title case versions is kept in
+# memory; the indices are sampled from 32-bit random values
+MAX_WORDS = 1 << 22
+
+# the numpy module once imported, or False if it isn't installed
+_numpy = None
+
+
+def numpy_module():
+    """Answer the ``numpy`` module, or None if it isn't installed."""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy = numpy
+    return _numpy or None
+
+
+def supports(n, k):
+    """
+    Answer whether passphrases of ``k`` of ``n`` words can be vectorised.
+
+    Rows of indices with repeated words are drawn again, so, as for the
+    partial shuffle of ``internal.sample_indices``, most words of small
+    tables are better sampled by a shuffle in pure python.
+    """
+    return 4 * k <= n <= MAX_WORDS and numpy_module() is not None
+
+
+class WordTable(object):
+    """
+    Array of the ``words`` and, if ``random_case``, their title case versions.
+
+    The title case version of a word is at the index of the word plus
+    ``len(words)``.
+    """
+
+    def __init__(self, words, random_case=True):
+        np = numpy_module()
+        self.n = len(words)
+        if not random_case:
+            words = list(words)
+        elif isinstance(words, internal.WordTable):
+            words = words.cased
+        else:
+            words = list(words)
+            words.extend([word.title() for word in words])
+        self.random_case = random_case
+        self.table = np.array(words, dtype=object)
+
+
+def sample_index_matrix(rand, n, m, k):
+    """
+    Sample ``m`` rows of ``k`` distinct indices from ``range(n)``.
+
+    The random bytes are read from ``rand``, a ``internal.RandomBuffer``.
+    Each row is uniformly distributed, since the indices are sampled by
+    rejection, and rows with a repeated index are sampled again as a whole.
+    Answers an ``(m, k)`` array.
+    """
+    np = numpy_module()
+    indices = np.empty((m, k), dtype=np.int64)
+    rows = np.arange(m)
+    while len(rows):
+        indices[rows] = _sample_below(np, rand, n, len(rows) * k).reshape(-1, k)
+        ordered = np.sort(indices[rows], axis=1)
+        rows = rows[(ordered[:, 1:] == ordered[:, :-1]).any(axis=1)]
+    return indices
+
+
+def _sample_below(np, rand, n, count):
+    """Answer an array of ``count`` random ints in ``range(n)``."""
+    bits = (n - 1).bit_length()
+    dtype = "<u2" if bits <= 16 else "<u4"
+    size = np.dtype(dtype).itemsize
+    mask = (1 << bits) - 1
+    values = np.empty(count, dtype=np.int64)
+    filled = 0
+    while filled < count:
+        # at least half of the masked values are accepted, so drawing the
+        # expected number of values needed plus a margin rarely repeats
+        wanted = count - filled
+        draw = int(wanted * (mask + 1) / n) + 16
+        drawn = np.frombuffer(rand.read(draw * size), dtype=dtype) & mask
+        drawn = drawn[drawn < n][:wanted]
+        values[filled : filled + len(drawn)] = drawn
+        filled += len(drawn)
+    return values
+
+
+def generate(word_table, rand, m, k, delimiter, pad=""):
+    """
+    Generate a list of ``m`` passphrases of ``k`` words of ``word_table``.
+
+    The words are joined by ``delimiter``, and each is title-cased with
+    probability 1/2 if the table is ``random_case``, like the passphrases
+    of ``api.PassphraseGenerator.generate``.
+    """
+    np = numpy_module()
+    n = word_table.n
+    indices = sample_index_matrix(rand, n, m, k)
+    if word_table.random_case:
+        data = rand.read(-(-m * k // 8))
+        case_bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+        indices += case_bits[: m * k].reshape(m, k).astype(np.int64) * n
+    rows = word_table.table[indices].tolist()
+    join = delimiter.join
+    if pad:
+        return [pad + join(row) + pad for row in rows]
+    return [join(row) for row in rows]
@@ -52,12 +52,13 @@ setup(
     # include_package_data=True,
     platforms="any",
     cmdclass={"test": PyTest},
-    install_requires=["six"],
+    install_requires=[],
     tests_require=["six", "pytest"],
     test_suite="tests",
     extras_require={
         "testing": ["pytest", "mock", "pytest-flake8", "pytest-pep257", "pytest-cov"],
         "develop": ["wheel"],
+        "numpy": ["numpy"],
     },
     entry_points={
         "console_scripts": [
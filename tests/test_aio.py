@@ -0,0 +1,115 @@
+# coding=utf-8
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import six
+
+import pytest
+
+from mkpassphrase import aio, api, internal
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def collect(passphrases):
+    async def consume():
+        return [passphrase async for passphrase in passphrases]
+
+    return run(consume())
+
+
+def test_load_words(word_file):
+    words = run(aio.load_words(word_file=word_file))
+    assert words is internal.WORDS_CACHE.get_file(word_file)
+    words = run(aio.load_words(word_list="eff1"))
+    assert words is internal.WORDS_CACHE.get_list("eff1")
+
+
+def test_load_words_requires_file_or_list():
+    with pytest.raises(ValueError) as err:
+        run(aio.load_words())
+    assert "at least one of" in str(err.value)
+
+
+def test_load_words_file_and_list(word_file):
+    words = internal.load_words_from_file(word_file)
+    merged = run(aio.load_words(word_list="eff1", word_file=[word_file]))
+    eff1 = internal.load_words_from_list("eff1")
+    assert list(merged) == sorted(set(eff1) | set(words))
+
+
+def test_passphrase_generator(word_file):
+    generator = run(aio.passphrase_generator(word_file=word_file, num_words=3))
+    assert isinstance(generator, api.PassphraseGenerator)
+    assert generator.num_words == 3
+
+
+def test_mkpassphrase(word_file):
+    passphrase, entropy = run(aio.mkpassphrase(word_file=word_file, num_words=3))
+    assert isinstance(passphrase, six.text_type)
+    assert len(passphrase.split(internal.DELIMITER)) == 3
+    assert entropy > 0
+
+
+def test_mkpassphrase_count_executor(word_file):
+    with ThreadPoolExecutor(2) as executor:
+        passphrases, _ = run(
+            aio.mkpassphrase(word_file=word_file, count=3, executor=executor)
+        )
+    assert len(passphrases) == 3
+
+
+def test_mkpassphrase_invalid_count(word_file):
+    with pytest.raises(ValueError) as err:
+        run(aio.mkpassphrase(word_file=word_file, count=0))
+    assert "'count' must be a positive integer" == str(err.value)
+
+
+@pytest.mark.parametrize("count,chunk_size", [(1, 1), (5, 2), (10, 10), (7, 100)])
+def test_iter_passphrases(word_file, count, chunk_size):
+    passphrases = aio.iter_passphrases(
+        word_file=word_file, num_words=2, count=count, chunk_size=chunk_size
+    )
+    passphrases = collect(passphrases)
+    assert len(passphrases) == count
+    for passphrase in passphrases:
+        assert len(passphrase.split(internal.DELIMITER)) == 2
+
+
+def test_iter_passphrases_endless(word_file):
+    async def take(n):
+        passphrases = []
+        async for passphrase in aio.iter_passphrases(word_file=word_file, chunk_size=3):
+            passphrases.append(passphrase)
+            if len(passphrases) == n:
+                return passphrases
+
+    assert len(run(take(10))) == 10
+
+
+@pytest.mark.parametrize(
+    "params,msg",
+    [
+        ({"count": 0}, "'count' must be a positive integer if provided"),
+        ({"chunk_size": 0}, "'chunk_size' must be a positive integer"),
+    ],
+)
+def test_iter_passphrases_invalid(word_file, params, msg):
+    with pytest.raises(ValueError) as err:
+        collect(aio.iter_passphrases(word_file=word_file, **params))
+    assert msg == str(err.value)
+
+
+def test_iter_passphrases_unique():
+    passphrases = aio.iter_passphrases(
+        word_list="eff1", num_words=1, count=600, chunk_size=64, unique=True
+    )
+    passphrases = collect(passphrases)
+    assert len(set(passphrases)) == len(passphrases) == 600
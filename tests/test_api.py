@@ -1,10 +1,14 @@
 # coding=utf-8
 
+import itertools
+import json
+import math
+
 import six
 
 import pytest
 
-from mkpassphrase import api, internal
+from mkpassphrase import api, internal, vectorized
 
 
 def test_mkpassword_defaults(word_file):
@@ -18,10 +22,10 @@ def test_mkpassword_defaults(word_file):
         assert passphrase.endswith(internal.PAD)
 
 
-def test_mkpassword_not_file_and_list(word_file):
+def test_mkpassword_requires_file_or_list():
     with pytest.raises(ValueError) as err:
-        api.mkpassphrase(word_file=word_file, word_list=internal.WORD_LIST_DEFAULT)
-    assert "exactly one of" in str(err.value)
+        api.mkpassphrase()
+    assert "at least one of" in str(err.value)
 
 
 @pytest.mark.parametrize("num_words", [0, "1"])
@@ -98,3 +102,577 @@ def test_mkpassphrase_count_multiple(word_file, count):
     assert isinstance(passphrases, list)
     assert isinstance(passphrases[0], six.text_type)
     assert len(set(passphrases)) == len(passphrases)
+
+
+def test_passphrase_generator_precomputes(word_file):
+    generator = api.PassphraseGenerator(word_file=word_file, num_words=3)
+    assert generator.num_words == 3
+    assert generator.entropy == internal.calculate_entropy(
+        len(generator.words), 3, True
+    )
+    assert generator.words == internal.WORDS_CACHE.get_file(word_file)
+    passphrase = generator.generate()
+    assert isinstance(passphrase, six.text_type)
+    assert len(passphrase.split(internal.DELIMITER)) == 3
+
+
+def test_passphrase_generator_generate_many(word_file):
+    generator = api.PassphraseGenerator(word_file=word_file, pad="//")
+    passphrases = generator.generate_many(4)
+    assert len(passphrases) == 4
+    for passphrase in passphrases:
+        assert passphrase.startswith("//")
+        assert passphrase.endswith("//")
+
+
+@pytest.mark.parametrize("count", [0, 1.0])
+def test_passphrase_generator_generate_many_invalid_count(word_file, count):
+    generator = api.PassphraseGenerator(word_file=word_file)
+    with pytest.raises(ValueError) as err:
+        generator.generate_many(count)
+    assert "'count' must be a positive integer" == str(err.value)
+
+
+def test_passphrase_generator_iter(word_file):
+    generator = api.PassphraseGenerator(word_file=word_file, num_words=2)
+    it = iter(generator)
+    passphrases = [next(it) for _ in range(3)]
+    assert all(len(p.split(internal.DELIMITER)) == 2 for p in passphrases)
+
+
+def test_passphrase_generator_file_and_list(word_file):
+    words = internal.load_words_from_file(word_file)
+    generator = api.PassphraseGenerator(
+        word_file=word_file, word_list=["eff1", "eff2"], num_words=3
+    )
+    merged = set(words) | set(internal.load_words_from_list("eff1"))
+    merged |= set(internal.load_words_from_list("eff2"))
+    assert list(generator.words) == sorted(merged)
+    assert generator.entropy == internal.calculate_entropy(len(merged), 3)
+    assert generator.positions is None
+
+
+def test_passphrase_generator_text_names():
+    eff1 = six.text_type("eff1")
+    generator = api.PassphraseGenerator(word_list=eff1, num_words=2)
+    assert list(generator.words) == list(internal.load_words_from_list("eff1"))
+    generator = api.PassphraseGenerator(schema=[eff1, [eff1]])
+    assert generator.num_words == 2
+    with pytest.raises(ValueError) as err:
+        api.PassphraseGenerator(schema=eff1)
+    assert "'schema' must be a non-empty list" == str(err.value)
+
+
+def test_passphrase_generator_merged_sources_loaded_once(word_file):
+    internal.WORDS_CACHE.invalidate()
+    stats = api.Stats()
+    api.PassphraseGenerator(word_list=["eff1", "eff2"], stats=stats)
+    api.PassphraseGenerator(word_list=["eff2", "eff1"], stats=stats)
+    api.PassphraseGenerator(schema=["eff1", ["eff2"]], stats=stats)
+    api.PassphraseGenerator(word_list="eff1", word_file=word_file, stats=stats)
+    assert stats.as_dict()["counters"]["loads"] == 3
+
+
+def test_passphrase_generator_schema(word_file):
+    words = internal.load_words_from_file(word_file)
+    schema = ["eff1", [word_file, "eff2"], "eff1"]
+    generator = api.PassphraseGenerator(schema=schema, delimiter="_")
+    eff1 = internal.load_words_from_list("eff1")
+    middle = sorted(set(words) | set(internal.load_words_from_list("eff2")))
+    assert generator.num_words == 3
+    sizes = [len(eff1), len(middle), len(eff1)]
+    assert generator.entropy == internal.calculate_schema_entropy(sizes)
+    assert generator.num_possible() == (len(eff1) ** 2 * len(middle)) << 3
+    positions = [[generator.words[i] for i in pos] for pos in generator.positions]
+    assert positions == [eff1, middle, eff1]
+    for passphrase in generator.generate_many(300):
+        first, second, third = passphrase.split("_")
+        assert first.lower() in eff1 and third.lower() in eff1
+        assert second in middle or second.lower() in middle
+    for _ in range(100):
+        indices, case_bits = generator.sample()
+        key = generator.pack(indices, case_bits)
+        assert 0 <= key < generator.num_possible()
+        assert generator.unpack(key) == (indices, case_bits)
+        assert generator.encode(generator.decode(key)) == key
+    key = generator.num_possible() - 1
+    assert generator.encode(generator.decode(key)) == key
+
+
+def test_passphrase_generator_schema_unique():
+    generator = api.PassphraseGenerator(schema=["eff1", "eff1"], random_case=False)
+    passphrases = list(generator.iterate(600, unique=True))
+    assert len(set(passphrases)) == 600
+
+
+@pytest.mark.parametrize(
+    "params,msg",
+    [
+        (dict(schema="eff1"), "'schema' must be a non-empty list"),
+        (dict(schema=[]), "'schema' must be a non-empty list"),
+        (
+            dict(schema=["eff1"], word_list="eff1"),
+            "'schema' can't be combined with 'word_list' or 'word_file'",
+        ),
+        (
+            dict(schema=["eff1"], num_words=2),
+            "'num_words' must be the length of 'schema'",
+        ),
+        (
+            dict(schema=["eff1", "eff1"], entropy=40),
+            "entropy bits (22) for 2 words is less than 40",
+        ),
+    ],
+)
+def test_passphrase_generator_schema_invalid(params, msg):
+    with pytest.raises(ValueError) as err:
+        api.PassphraseGenerator(**params)
+    assert msg == str(err.value)
+
+
+def test_iter_passphrases_count(word_file):
+    passphrases, entropy = api.iter_passphrases(word_file=word_file, count=3)
+    assert entropy > 0
+    assert not isinstance(passphrases, list)
+    passphrases = list(passphrases)
+    assert len(passphrases) == 3
+    assert all(isinstance(p, six.text_type) for p in passphrases)
+
+
+def test_iter_passphrases_endless(word_file):
+    passphrases, _ = api.iter_passphrases(word_file=word_file, num_words=2)
+    for _, passphrase in zip(range(100), passphrases):
+        assert len(passphrase.split(internal.DELIMITER)) == 2
+
+
+@pytest.mark.parametrize("count", [0, 1.0, "2"])
+def test_iter_passphrases_invalid_count(word_file, count):
+    with pytest.raises(ValueError) as err:
+        api.iter_passphrases(word_file=word_file, count=count)
+    assert "'count' must be a positive integer if provided" == str(err.value)
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_mkpassphrase_workers(word_file, ordered, monkeypatch):
+    monkeypatch.setattr(api, "WORKER_CHUNK_SIZE", 4)
+    passphrases, entropy = api.mkpassphrase(
+        word_file=word_file, num_words=3, count=25, workers=2, ordered=ordered
+    )
+    assert entropy == internal.calculate_entropy(
+        len(internal.WORDS_CACHE.get_file(word_file)), 3
+    )
+    assert len(passphrases) == 25
+    for passphrase in passphrases:
+        assert len(passphrase.split(internal.DELIMITER)) == 3
+
+
+@pytest.mark.parametrize("workers", [0, 1.0, "2"])
+def test_iter_passphrases_invalid_workers(word_file, workers):
+    with pytest.raises(ValueError) as err:
+        api.iter_passphrases(word_file=word_file, count=2, workers=workers)
+    assert "'workers' must be a positive integer if provided" == str(err.value)
+
+
+def test_iter_passphrases_workers_requires_count(word_file):
+    with pytest.raises(ValueError) as err:
+        api.iter_passphrases(word_file=word_file, workers=2)
+    assert "'count' is required if 'workers' is provided" == str(err.value)
+
+
+def test_mkpassphrase_word_filter(word_file):
+    passphrases, entropy = api.mkpassphrase(
+        word_file=word_file,
+        num_words=2,
+        random_case=False,
+        min_len=4,
+        max_len=5,
+        charset="abcdefghijklmnopqrstuvwxyz",
+        exclude=["BLUE"],
+        count=20,
+    )
+    allowed = set(["anise", "green", "mauve", "quux", "quuux"])
+    assert entropy == internal.calculate_entropy(len(allowed), 2, False)
+    for passphrase in passphrases:
+        assert set(passphrase.split(internal.DELIMITER)) <= allowed
+
+
+def test_passphrase_generator_unique_prefix(word_file):
+    generator = api.PassphraseGenerator(
+        word_file=word_file, num_words=2, unique_prefix=2
+    )
+    prefixes = [word[:2] for word in generator.words]
+    assert len(prefixes) == len(set(prefixes))
+    assert generator.word_filter == internal.WordFilter(unique_prefix=2)
+
+
+def test_mkpassphrase_word_filter_no_words(word_file):
+    with pytest.raises(ValueError) as err:
+        api.mkpassphrase(word_file=word_file, min_len=20)
+    assert "no words match the word filter" == str(err.value)
+
+
+def test_stats_counters_and_timings():
+    stats = api.Stats()
+    stats.incr("passphrases")
+    stats.incr("passphrases", 2)
+    stats.add_time("sample", 0.5)
+    with stats.timer("sample"):
+        pass
+    stats.set_gauge("pooled", 3)
+    data = stats.as_dict()
+    assert data["counters"] == {"passphrases": 3}
+    assert data["gauges"] == {"pooled": 3}
+    assert data["timings"]["sample"]["calls"] == 2
+    assert data["timings"]["sample"]["seconds"] >= 0.5
+    assert json.loads(stats.to_json()) == data
+
+    merged = api.Stats()
+    merged.merge(data)
+    merged.merge(data)
+    assert merged.counters == {"passphrases": 6}
+    assert merged.timings["sample"][0] == 4
+
+    stats.clear()
+    assert stats.as_dict() == {"counters": {}, "timings": {}, "gauges": {}}
+
+
+def test_stats_to_prometheus():
+    stats = api.Stats()
+    stats.incr("loads")
+    stats.add_time("load", 0.25)
+    stats.set_gauge("pooled", 2)
+    assert stats.to_prometheus().splitlines() == [
+        "# TYPE mkpassphrase_loads_total counter",
+        "mkpassphrase_loads_total 1",
+        "# TYPE mkpassphrase_pooled gauge",
+        "mkpassphrase_pooled 2",
+        "# TYPE mkpassphrase_stage_calls_total counter",
+        'mkpassphrase_stage_calls_total{stage="load"} 1',
+        "# TYPE mkpassphrase_stage_seconds_total counter",
+        'mkpassphrase_stage_seconds_total{stage="load"} 0.25',
+    ]
+
+
+def test_passphrase_generator_stats(word_file):
+    internal.WORDS_CACHE.invalidate(path=word_file)
+    stats = api.Stats()
+    generator = api.PassphraseGenerator(word_file=word_file, stats=stats)
+    generator.generate_many(5)
+    api.PassphraseGenerator(word_file=word_file, stats=stats)
+    assert stats.counters == {
+        "loads": 1,
+        "cache_hits": 1,
+        "cache_misses": 1,
+        "passphrases": 5,
+        "urandom_bytes": internal.BUFFER_SIZE_DEFAULT,
+    }
+    assert stats.timings["load"][0] == 2
+    assert stats.timings["calculate"][0] == 2
+    assert stats.timings["sample"][0] == 5
+
+
+def test_mkpassphrase_workers_stats(word_file):
+    stats = api.Stats()
+    passphrases, _ = api.mkpassphrase(
+        word_file=word_file, num_words=3, count=25, workers=2, stats=stats
+    )
+    assert len(passphrases) == 25
+    assert stats.counters["passphrases"] == 25
+    assert stats.timings["sample"][0] == 25
+
+
+@pytest.mark.parametrize("random_case", [True, False])
+def test_mkpassphrase_unique(random_case):
+    possible = 1296 * 2 if random_case else 1296
+    count = int(possible * api.UNIQUE_MAX_FRACTION)
+    stats = api.Stats()
+    passphrases, _ = api.mkpassphrase(
+        word_list="eff1",
+        num_words=1,
+        random_case=random_case,
+        count=count,
+        unique=True,
+        stats=stats,
+    )
+    assert len(set(passphrases)) == len(passphrases) == count
+    assert stats.counters["passphrases"] == count
+    assert stats.counters["duplicates"] > 0
+
+
+@pytest.fixture
+def caseless_file(tmpdir):
+    path = tmpdir.join("numbers.txt")
+    path.write("\n".join(str(i) for i in range(100, 200)) + "\nab\ncd\n")
+    return str(path)
+
+
+def test_mkpassphrase_unique_caseless(caseless_file):
+    # 100 numbers and 2 words that may be title-cased
+    generator = api.PassphraseGenerator(word_file=caseless_file, num_words=1)
+    assert generator.num_possible() == 104
+    passphrases, _ = api.mkpassphrase(
+        word_file=caseless_file, num_words=1, count=52, unique=True
+    )
+    assert len(set(passphrases)) == 52
+    with pytest.raises(ValueError) as err:
+        api.mkpassphrase(word_file=caseless_file, num_words=1, count=53, unique=True)
+    assert "'count' (53) must be at most 0.5 of the 104 possible" in str(err.value)
+    assert generator.pack((0,), 1) == generator.pack((0,), 0)
+    assert generator.pack((100,), 1) != generator.pack((100,), 0)
+
+
+def test_passphrase_generator_num_possible_caseless(caseless_file):
+    words = ["%d" % i for i in range(100, 200)] + ["ab", "cd"]
+    generator = api.PassphraseGenerator(word_file=caseless_file, num_words=2)
+    rendered = set()
+    for a, b in itertools.permutations(words, 2):
+        for x in (a, a.title()):
+            for y in (b, b.title()):
+                rendered.add(x + " " + y)
+    assert generator.num_possible() == len(rendered)
+    generator = api.PassphraseGenerator(
+        word_file=caseless_file, num_words=2, max_length=6
+    )
+    assert generator.num_possible() == len([p for p in rendered if len(p) <= 6])
+    generator = api.PassphraseGenerator(schema=[caseless_file, "eff1"])
+    assert generator.num_possible() == 104 * 1296 * 2
+
+
+def test_passphrase_generator_num_possible():
+    generator = api.PassphraseGenerator(word_list="eff1", num_words=3)
+    assert generator.num_possible() == 1296 * 1295 * 1294 * 2**3
+    generator = api.PassphraseGenerator(
+        word_list="eff1", num_words=3, random_case=False
+    )
+    assert generator.num_possible() == 1296 * 1295 * 1294
+
+
+def test_passphrase_generator_unique_huge_possible():
+    generator = api.PassphraseGenerator(word_list="eff1", entropy=1200)
+    passphrases = generator.generate_many(3, unique=True)
+    assert len(set(passphrases)) == 3
+
+
+@pytest.mark.parametrize(
+    "params,msg",
+    [
+        (
+            dict(count=1000, num_words=1, random_case=False),
+            "'count' (1000) must be at most 0.5 of the 1296 possible passphrases",
+        ),
+        (dict(count=None), "'count' is required if 'unique' is true"),
+        (dict(count=10, workers=2), "'unique' can't be combined with 'workers'"),
+    ],
+)
+def test_iter_passphrases_unique_invalid(params, msg):
+    with pytest.raises(ValueError) as err:
+        api.iter_passphrases(word_list="eff1", unique=True, **params)
+    assert msg == str(err.value)
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        dict(word_list="eff-large"),
+        dict(word_list="eff1", num_words=3, random_case=False),
+        dict(word_list="eff2", pad="<>", delimiter="_"),
+    ],
+)
+def test_passphrase_generator_keys(params):
+    generator = api.PassphraseGenerator(**params)
+    for _ in range(100):
+        indices, case_bits = generator.sample()
+        assert len(set(indices)) == len(indices) == generator.num_words
+        key = generator.pack(indices, case_bits)
+        assert 0 <= key < generator.num_possible()
+        assert generator.unpack(key) == (indices, case_bits)
+        passphrase = generator.decode(key)
+        assert passphrase == generator.render(indices, case_bits)
+        assert generator.encode(passphrase) == key
+    passphrase = generator.generate()
+    assert generator.decode(generator.encode(passphrase)) == passphrase
+
+
+@pytest.mark.parametrize(
+    "passphrase,msg",
+    [
+        ("|apple banana|", "passphrase must have 3 words"),
+        ("apple banana cherry|", "passphrase is not padded with '|'"),
+        ("|apple banana zzz|", "not a word of the wordlist: 'zzz'"),
+        ("|apple APPLE banana|", "not a word of the wordlist: 'APPLE'"),
+        ("|apple Apple banana|", "passphrase has repeated words"),
+    ],
+)
+def test_passphrase_generator_encode_invalid(tmpdir, passphrase, msg):
+    path = tmpdir.join("words")
+    path.write("apple\nbanana\ncherry\ndate\n")
+    generator = api.PassphraseGenerator(word_file=str(path), num_words=3, pad="|")
+    with pytest.raises(ValueError) as err:
+        generator.encode(passphrase)
+    assert msg == str(err.value)
+
+
+def test_mkpassphrase_seed():
+    passphrases, _ = api.mkpassphrase(word_list="eff1", count=20, seed="test")
+    again, _ = api.mkpassphrase(word_list="eff1", count=20, seed=b"test")
+    assert passphrases == again
+    other, _ = api.mkpassphrase(word_list="eff1", count=20, seed="other")
+    assert set(passphrases).isdisjoint(other)
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_mkpassphrase_seed_workers(word_file, ordered, monkeypatch):
+    monkeypatch.setattr(api, "WORKER_CHUNK_SIZE", 4)
+    params = dict(word_file=word_file, num_words=3, count=25, workers=2, seed=7)
+    passphrases, _ = api.mkpassphrase(**params)
+    again, _ = api.mkpassphrase(ordered=ordered, **params)
+    if ordered:
+        assert again == passphrases
+    assert sorted(again) == sorted(passphrases)
+
+
+def test_passphrase_generator_random_source():
+    generator = api.PassphraseGenerator(
+        word_list="eff1", random_source=internal.SeededSource(3)
+    )
+    assert (
+        generator.generate()
+        == api.PassphraseGenerator(word_list="eff1", seed=3).generate()
+    )
+    with pytest.raises(ValueError) as err:
+        api.PassphraseGenerator(
+            word_list="eff1", seed=3, random_source=internal.SeededSource(3)
+        )
+    assert "only one of 'seed' or 'random_source' is allowed" == str(err.value)
+
+
+def test_mkpassphrase_seed_known_answer():
+    # seeded passphrases must not change between machines or versions
+    passphrases, _ = api.mkpassphrase(word_list="eff1", num_words=4, seed=1, count=2)
+    assert passphrases == ["aim Cake Oasis rinse", "civil Colt clad cake"]
+
+
+def test_passphrase_generator_without_numpy(monkeypatch):
+    monkeypatch.setattr(vectorized, "_numpy", False)
+    generator = api.PassphraseGenerator(word_list="eff-large")
+    passphrases = generator.generate_many(api.VECTORIZE_MIN_COUNT)
+    assert len(passphrases) == api.VECTORIZE_MIN_COUNT
+    assert not generator._vectorized()
+    with pytest.raises(ValueError) as err:
+        api.PassphraseGenerator(word_list="eff-large", vectorize=True)
+    assert "'vectorize' requires numpy to be installed" == str(err.value)
+
+
+def test_optimize_length():
+    params, expected_length = api.optimize_length()
+    assert params["word_list"] in internal.WORD_LISTS
+    generator = api.PassphraseGenerator(**params)
+    assert generator.entropy >= internal.ENTROPY_DEFAULT
+    assert generator.num_words == params["num_words"]
+    # no other builtin wordlist or word lengths give shorter passphrases
+    for name in internal.WORD_LISTS:
+        words = internal.load_words_from_list(name)
+        for min_len in range(1, 10):
+            for max_len in range(min_len, 10):
+                sizes = [len(w) for w in words if min_len <= len(w) <= max_len]
+                if len(sizes) < 2:
+                    continue
+                try:
+                    k, _ = internal.calculate_num_words(len(sizes))
+                except ValueError:
+                    continue
+                assert k * sum(sizes) / len(sizes) + k - 1 >= expected_length
+
+
+def test_optimize_length_params(word_file):
+    params, expected_length = api.optimize_length(
+        32, word_file=word_file, random_case=[False], delimiter=["--", "_"], pad="|"
+    )
+    assert params["word_file"] == word_file
+    assert (params["random_case"], params["delimiter"]) == (False, "_")
+    passphrase = api.PassphraseGenerator(**params).generate()
+    assert passphrase.startswith("|") and passphrase.endswith("|")
+    assert len(passphrase.split("_")) == params["num_words"]
+    assert expected_length > 2
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        dict(word_list="eff1", max_length=32, entropy=60),
+        dict(word_list="eff-large", exact_length=40, delimiter="-", pad="*"),
+        dict(word_list="eff2", max_length=48, num_words=5, random_case=False),
+    ],
+)
+def test_passphrase_generator_length(params):
+    generator = api.PassphraseGenerator(**params)
+    table = generator.length_table
+    possible = table.num_possible() << (generator.num_words * generator.random_case)
+    assert generator.num_possible() == possible
+    assert generator.entropy == pytest.approx(math.log(possible, 2))
+    passphrases = generator.generate_many(500)
+    if "max_length" in params:
+        assert max(len(p) for p in passphrases) <= params["max_length"]
+    else:
+        assert set(len(p) for p in passphrases) == {params["exact_length"]}
+    for passphrase in passphrases[:50]:
+        assert generator.decode(generator.encode(passphrase)) == passphrase
+    unique = list(generator.iterate(500, unique=True))
+    assert len(set(unique)) == 500
+    assert api.PassphraseGenerator(**params).length_table is table
+
+
+@pytest.mark.parametrize(
+    "params,msg",
+    [
+        (dict(max_length=0), "'max_length' must be a positive integer if provided"),
+        (
+            dict(exact_length="9"),
+            "'exact_length' must be a positive integer if provided",
+        ),
+        (
+            dict(max_length=40, exact_length=40),
+            "only one of 'max_length' or 'exact_length' is allowed",
+        ),
+        (
+            dict(max_length=20),
+            "entropy bits (44) for 4 words of at most 20 characters is less than 80",
+        ),
+        (
+            dict(max_length=20, num_words=6),
+            "no passphrases of 6 words fit in 20 characters",
+        ),
+    ],
+)
+def test_passphrase_generator_length_invalid(params, msg):
+    with pytest.raises(ValueError) as err:
+        api.PassphraseGenerator(word_list="eff-large", **params)
+    assert msg == str(err.value)
+
+
+@pytest.mark.parametrize("random_case", [False, True])
+def test_passphrase_generator_encode_delimiter_in_words(random_case):
+    generator = api.PassphraseGenerator(
+        word_list="eff-large", num_words=3, delimiter="-", random_case=random_case
+    )
+    for words in (
+        ["t-shirt", "yo-yo", "felt-tip"],
+        ["drop-down", "aim", "t-shirt"],
+        ["aim", "drop-down", "civil"],
+    ):
+        passphrase = "-".join(words)
+        assert generator.decode(generator.encode(passphrase)) == passphrase
+    if random_case:
+        passphrase = "T-Shirt-aim-Yo-Yo"
+        assert generator.decode(generator.encode(passphrase)) == passphrase
+    with pytest.raises(ValueError) as err:
+        generator.encode("t-shirt-aim-civil-art")
+    assert "passphrase must have 3 words" == str(err.value)
+
+
+def test_passphrase_generator_length_encode():
+    generator = api.PassphraseGenerator(word_list="eff1", num_words=3, max_length=13)
+    with pytest.raises(ValueError) as err:
+        generator.encode("rinse civil aim")
+    assert "passphrase is longer than 13 characters" == str(err.value)
+    assert generator.encode("aim civil art") < generator.num_keys()
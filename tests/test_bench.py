@@ -0,0 +1,62 @@
+# coding=utf-8
+
+import json
+
+import pytest
+
+from mkpassphrase import bench
+
+
+def test_summarize():
+    result = bench.summarize([3.0, 1.0, 2.0])
+    assert result == {"min": 1.0, "median": 2.0, "max": 3.0, "repeat": 3}
+
+
+def test_bench_startup():
+    result = bench.bench_startup(repeat=1)
+    assert sorted(result) == ["mkpassphrase", "python"]
+    for summary in result.values():
+        assert summary["repeat"] == 1
+        assert summary["min"] > 0
+
+
+def test_iter_benchmarks_names():
+    names = [name for name, _, _ in bench.iter_benchmarks()]
+    assert "load_words_from_list[eff-large]" in names
+    assert "calculate_num_words[80]" in names
+    assert "sample_words[4]" in names
+    assert "mkpassphrase[1000000]" in names
+    assert len(set(names)) == len(names)
+
+
+def test_run_select():
+    results = bench.run(select="calculate_num_words[80]", repeat=2)
+    assert list(results) == ["calculate_num_words[80]"]
+    assert results["calculate_num_words[80]"]["repeat"] == 2
+
+
+def test_compare():
+    baseline = {"a": {"median": 1.0}, "b": {"median": 1.0}, "c": {"median": 0}}
+    results = {
+        "a": {"median": 1.2},
+        "b": {"median": 1.5},
+        "c": {"median": 1.0},
+        "d": {"median": 1.0},
+    }
+    assert bench.compare(results, baseline, threshold=0.25) == [("b", 1.5)]
+
+
+def test_main_json_and_compare(tmpdir, capsys):
+    path = str(tmpdir.join("bench.json"))
+    bench.main(["-k", "calculate_num_words[40]", "-r", "1", "--json", path])
+    with open(path) as f:
+        data = json.load(f)
+    assert list(data["results"]) == ["calculate_num_words[40]"]
+    data["results"]["calculate_num_words[40]"]["median"] /= 1000.0
+    with open(path, "w") as f:
+        json.dump(data, f)
+    with pytest.raises(SystemExit) as err:
+        bench.main(["-k", "calculate_num_words[40]", "-r", "1", "--compare", path])
+    assert err.value.code == 1
+    out, _ = capsys.readouterr()
+    assert "regression: calculate_num_words[40]" in out
@@ -0,0 +1,98 @@
+# coding=utf-8
+
+import json
+import os
+import stat
+
+import pytest
+
+from mkpassphrase import api, export
+
+PASSPHRASES = ["one two", 'th"ree, four', "fünf sechs"]
+
+
+def read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 1000])
+def test_iter_chunks_text(block_size):
+    chunks = list(export.iter_chunks(PASSPHRASES, block_size=block_size))
+    assert len(chunks) == -(-len(PASSPHRASES) // block_size)
+    assert b"".join(chunks).decode("utf-8") == "\n".join(PASSPHRASES) + "\n"
+
+
+def test_iter_chunks_nul():
+    data = b"".join(export.iter_chunks(PASSPHRASES, "nul", block_size=2))
+    assert data.decode("utf-8").split("\0") == PASSPHRASES + [""]
+
+
+def test_iter_chunks_csv():
+    data = b"".join(export.iter_chunks(PASSPHRASES, "csv", 50.5, 2, block_size=2))
+    assert data.decode("utf-8").split("\r\n") == [
+        export.CSV_HEADER,
+        "one two,50.5,2",
+        '"th""ree, four",50.5,2',
+        "fünf sechs,50.5,2",
+        "",
+    ]
+
+
+def test_iter_chunks_jsonl():
+    data = b"".join(export.iter_chunks(PASSPHRASES, "jsonl", 50.5, 2, block_size=2))
+    records = [json.loads(line) for line in data.decode("utf-8").splitlines()]
+    assert records == [
+        {"passphrase": p, "entropy": 50.5, "num_words": 2} for p in PASSPHRASES
+    ]
+
+
+def test_iter_chunks_empty():
+    assert list(export.iter_chunks([], "csv", 50.5, 2)) == []
+
+
+@pytest.mark.parametrize("format", ["csv", "jsonl"])
+def test_iter_chunks_requires_entropy(format):
+    with pytest.raises(ValueError) as err:
+        list(export.iter_chunks(PASSPHRASES, format))
+    assert "'entropy' and 'num_words' are required" in str(err.value)
+
+
+@pytest.mark.parametrize(
+    "format,block_size,msg",
+    [
+        ("xml", 1, "'format' must be one of: text, nul, csv, jsonl"),
+        ("text", 0, "'block_size' must be a positive integer"),
+    ],
+)
+def test_iter_chunks_invalid(format, block_size, msg):
+    with pytest.raises(ValueError) as err:
+        list(export.iter_chunks(PASSPHRASES, format, block_size=block_size))
+    assert msg == str(err.value)
+
+
+@pytest.mark.parametrize("fsync", [False, True])
+def test_export(tmpdir, fsync):
+    path = str(tmpdir.join("out.txt"))
+    stats = api.Stats()
+    written = export.export(path, iter(PASSPHRASES), fsync=fsync, stats=stats)
+    data = read_bytes(path)
+    assert written == len(data)
+    assert data.decode("utf-8") == "\n".join(PASSPHRASES) + "\n"
+    assert stat.S_IMODE(os.stat(path).st_mode) == export.FILE_MODE
+    assert stats.timings["output"][0] == 1
+    assert os.listdir(str(tmpdir)) == ["out.txt"]
+
+
+def test_export_failure_keeps_existing_file(tmpdir):
+    path = tmpdir.join("out.txt")
+    path.write("old\n")
+
+    def passphrases():
+        yield "new"
+        raise RuntimeError("oops")
+
+    with pytest.raises(RuntimeError):
+        export.export(str(path), passphrases(), block_size=1)
+    assert path.read() == "old\n"
+    assert os.listdir(str(tmpdir)) == ["out.txt"]
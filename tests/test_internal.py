@@ -3,16 +3,25 @@
 from __future__ import absolute_import, division, print_function
 
 import codecs
+import errno
+import itertools
+import math
 import os
 import sys
+import threading
 import re
 import random as _random
 
+try:
+    import resource
+except ImportError:  # not on windows
+    resource = None
+
 import six
 
 import pytest
 
-from mkpassphrase import internal
+from mkpassphrase import api, internal
 
 import tests
 
@@ -57,6 +66,19 @@ def test_num_possible_success(n, k, expected):
     assert internal.num_possible(n, k) == expected
 
 
+@pytest.mark.parametrize("num_cased,num_caseless", [(3, 0), (0, 3), (2, 3), (4, 1)])
+@pytest.mark.parametrize("k", [1, 2, 3])
+def test_num_possible_cased(num_cased, num_caseless, k):
+    words = ["w%d" % i for i in range(num_cased)]
+    words += ["%d" % i for i in range(num_caseless)]
+    rendered = set()
+    for p in itertools.permutations(words, k):
+        for case_bits in range(1 << k):
+            rendered.add(internal.render_words(p, range(k), case_bits))
+    assert internal.num_possible_cased(num_cased, num_caseless, k) == len(rendered)
+    assert internal.caseless_indices(words) == frozenset(range(num_cased, len(words)))
+
+
 @pytest.mark.parametrize(
     "dict_size,entropy,expected",
     [(2, 1, (1, 1.0)), (10, 4, (2, (6, 7))), (16, 8, (3, (11, 12)))],
@@ -222,3 +244,719 @@ def test_load_words_from_list_invalid_wordlist():
     with pytest.raises(ValueError) as err:
         internal.load_words_from_list("nonexistent")
     assert "Invalid wordlist: nonexistent" == str(err.value)
+
+
+def test_word_cache_list_hit_and_miss():
+    cache = internal.WordCache()
+    words = cache.get_list("eff1")
+    assert isinstance(words, tuple)
+    assert list(words) == internal.load_words_from_list("eff1")
+    assert cache.get_list("eff1") is words
+    assert cache.info() == {"hits": 1, "misses": 1, "size": 1, "maxsize": 32}
+
+
+def test_word_cache_file_reloads_when_changed(word_file):
+    cache = internal.WordCache()
+    words = cache.get_file(word_file)
+    assert cache.get_file(word_file) is words
+    with codecs.open(word_file, "a", "utf-8") as f:
+        six.print_("zebra", file=f)
+    reloaded = cache.get_file(word_file)
+    assert "zebra" in reloaded
+    assert "zebra" not in words
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_word_cache_lru_eviction():
+    cache = internal.WordCache(maxsize=2)
+    eff1 = cache.get_list("eff1")
+    cache.get_list("eff2")
+    cache.get_list("eff1")
+    cache.get_list("eff-large")
+    assert len(cache) == 2
+    assert cache.get_list("eff1") is eff1
+    cache.get_list("eff2")
+    assert cache.misses == 4
+
+
+def test_word_cache_invalidate(word_file):
+    cache = internal.WordCache()
+    cache.get_list("eff1")
+    cache.get_list("eff2")
+    cache.get_file(word_file)
+    cache.invalidate(path=word_file)
+    assert len(cache) == 2
+    cache.invalidate(name="eff1")
+    assert len(cache) == 1
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+@pytest.mark.parametrize("maxsize", [0, "1"])
+def test_word_cache_invalid_maxsize(maxsize):
+    with pytest.raises(ValueError) as err:
+        internal.WordCache(maxsize=maxsize)
+    assert "maxsize must be a positive integer" == str(err.value)
+
+
+def test_word_cache_load_does_not_block_hits():
+    cache = internal.WordCache()
+    eff1 = cache.get_list("eff1")
+    started, release = threading.Event(), threading.Event()
+
+    def slow_load():
+        started.set()
+        release.wait(5)
+        return ["slow"]
+
+    thread = threading.Thread(target=cache._get, args=(("list", "slow"), slow_load))
+    thread.start()
+    try:
+        assert started.wait(5)
+        assert cache.get_list("eff1") is eff1
+    finally:
+        release.set()
+        thread.join()
+    assert list(cache._get(("list", "slow"), slow_load)) == ["slow"]
+
+
+def test_word_cache_concurrent_misses_load_once():
+    cache = internal.WordCache()
+    release = threading.Event()
+    loads = []
+
+    def load():
+        loads.append(1)
+        release.wait(5)
+        return ["a", "b"]
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache._get(("list", "x"), load)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+    assert len(results) == 4 and all(words is results[0] for words in results)
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_word_cache_failed_load():
+    cache = internal.WordCache()
+    with pytest.raises(ValueError):
+        cache.get_list("nonexistent")
+    assert not cache._pending and len(cache) == 0
+
+
+def test_random_buffer_read():
+    rand = internal.RandomBuffer(size=16)
+    data = rand.read(10) + rand.read(10) + rand.read(40)
+    assert isinstance(data, bytes)
+    assert len(data) == 60
+
+
+def test_random_buffer_discards_bytes_after_fork():
+    rand = internal.RandomBuffer(size=64)
+    rand.read(1)
+    buffered = rand._buf
+    rand._pid = -1  # as if the buffer was filled by a parent process
+    rand.read(1)
+    assert rand._buf != buffered
+    assert rand._pid == os.getpid()
+
+
+@pytest.mark.parametrize("size", [0, 1.5])
+def test_random_buffer_invalid_size(size):
+    with pytest.raises(ValueError) as err:
+        internal.RandomBuffer(size=size)
+    assert "size must be a positive integer" == str(err.value)
+
+
+@pytest.mark.parametrize("k", [0, 1, 7, 8, 13, 64, 100])
+def test_random_buffer_randbits(k):
+    rand = internal.RandomBuffer()
+    for _ in range(50):
+        assert 0 <= rand.randbits(k) < 2**k
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 6, 7776])
+def test_random_buffer_randbelow(n):
+    rand = internal.RandomBuffer()
+    values = [rand.randbelow(n) for _ in range(200)]
+    assert all(0 <= v < n for v in values)
+    if n <= 6:
+        assert set(values) == set(range(n))
+
+
+def test_random_buffer_randbelow_invalid():
+    with pytest.raises(ValueError) as err:
+        internal.RandomBuffer().randbelow(0)
+    assert "n must be positive" == str(err.value)
+
+
+@pytest.mark.parametrize("n,k", [(1, 1), (10, 2), (10, 10), (7776, 6)])
+def test_sample_indices(n, k):
+    for _ in range(20):
+        indices = internal.sample_indices(n, k)
+        assert len(indices) == k
+        assert len(set(indices)) == k
+        assert all(0 <= i < n for i in indices)
+
+
+def test_sample_indices_k_too_large():
+    with pytest.raises(ValueError) as err:
+        internal.sample_indices(2, 3)
+    assert "can't sample 3 of 2 words" == str(err.value)
+
+
+def test_render_words():
+    words = ["alpha", "beta", "gamma"]
+    assert internal.render_words(words, [2, 0]) == "gamma alpha"
+    assert internal.render_words(words, [2, 0], 0b10, "-") == "gamma-Alpha"
+
+
+@pytest.mark.parametrize("n", [1, 2, 10, 1296, 7776])
+def test_log2_num_possible(n):
+    for k in range(1, min(n, 20) + 1):
+        expected = math.log(internal.num_possible(n, k), 2)
+        assert abs(internal.log2_num_possible(n, k) - expected) < 1e-9
+
+
+def test_log2_num_possible_too_many_words():
+    assert internal.log2_num_possible(3, 4) == float("-inf")
+
+
+@pytest.mark.parametrize("n,k", [(0, 1), (1, 0)])
+def test_log2_num_possible_invalid(n, k):
+    with pytest.raises(ValueError):
+        internal.log2_num_possible(n, k)
+
+
+@pytest.mark.parametrize("random_case", [True, False])
+@pytest.mark.parametrize("dict_size", [1, 2, 3, 7, 16, 1296, 7776])
+@pytest.mark.parametrize("entropy", [0, 1, 2.5, 13, 80, 128, 512])
+def test_calculate_num_words_minimal(dict_size, entropy, random_case):
+    try:
+        n, actual = internal.calculate_num_words(dict_size, entropy, random_case)
+    except ValueError as err:
+        assert internal.calculate_entropy(dict_size, dict_size, random_case) < entropy
+        assert "is less than" in str(err)
+        return
+    assert n <= dict_size
+    assert actual == internal.calculate_entropy(dict_size, n, random_case)
+    assert actual >= entropy
+    if n > 1:
+        assert internal.calculate_entropy(dict_size, n - 1, random_case) < entropy
+
+
+def test_calculate_num_words_unreachable():
+    with pytest.raises(ValueError) as err:
+        internal.calculate_num_words(3, entropy=3, random_case=False)
+    assert "entropy bits (2) for 3 words is less than 3" == str(err.value)
+    # words can't repeat, so random case doesn't allow more than 5 of 5 words
+    with pytest.raises(ValueError) as err:
+        internal.calculate_num_words(5, entropy=16)
+    assert "entropy bits (14) for 5 words is less than 16" == str(err.value)
+
+
+@pytest.mark.parametrize("random_case", [True, False])
+def test_entropy_table(random_case):
+    table = internal.entropy_table(10, 12, random_case)
+    assert len(table) == 10
+    for i, bits in enumerate(table):
+        expected = internal.calculate_entropy(10, i + 1, random_case)
+        assert abs(bits - expected) < 1e-9
+
+
+def test_entropy_table_invalid_dict_size():
+    with pytest.raises(ValueError) as err:
+        internal.entropy_table(0, 1)
+    assert "dict_size must be positive" == str(err.value)
+
+
+def test_sample_words_only_indexes_sampled_words():
+    class Words(internal.Sequence):
+        def __init__(self, n):
+            self.n = n
+            self.accessed = []
+
+        def __len__(self):
+            return self.n
+
+        def __getitem__(self, i):
+            self.accessed.append(i)
+            return "w%d" % i
+
+        def __iter__(self):
+            raise AssertionError("words should not be iterated")
+
+    words = Words(10**6)
+    result = internal.sample_words(words, 6, random_case=False)
+    assert len(words.accessed) == 6
+    assert result.split(internal.DELIMITER) == ["w%d" % i for i in words.accessed]
+
+
+def test_sample_words_not_sequence():
+    result = internal.sample_words(set(["a", "b"]), 2, random_case=False)
+    assert result in ["a b", "b a"]
+
+
+@pytest.mark.parametrize("memory_limit", [None, 1, 200, 10**6])
+def test_iter_sorted_words(word_file, memory_limit):
+    with codecs.open(word_file, "r", "utf-8") as f:
+        expected = internal.load_from_stream(f)
+    with codecs.open(word_file, "r", "utf-8") as f:
+        result = list(internal.iter_sorted_words(f, memory_limit=memory_limit))
+    assert result == expected
+
+
+@pytest.mark.skipif(resource is None, reason="requires the resource module")
+def test_iter_sorted_words_bounded_open_files():
+    # about 4000 temporary files, far more than the open files limit
+    lines = ["w%06d" % ((i * 7919) % 200000) for i in range(200000)]
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (128, hard))
+    try:
+        result = list(internal.iter_sorted_words(lines, memory_limit=4000))
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+    assert result == sorted(set(lines))
+
+
+def test_iter_sorted_words_test_and_progress(monkeypatch):
+    monkeypatch.setattr(internal, "PROGRESS_INTERVAL", 3)
+    calls = []
+    lines = ["b", "A", "", "a", "ccc", "b", "dd"]
+    result = internal.iter_sorted_words(
+        lines,
+        test=lambda w: len(w) < 3,
+        memory_limit=1,
+        progress=lambda *args: calls.append(args),
+    )
+    assert list(result) == ["", "a", "b", "dd"]
+    assert calls == [(3, 3), (6, 5), (7, 6)]
+
+
+def test_load_from_stream_memory_limit(word_file):
+    with codecs.open(word_file, "r", "utf-8") as f:
+        expected = internal.load_from_stream(f)
+    with codecs.open(word_file, "r", "utf-8") as f:
+        assert internal.load_from_stream(f, memory_limit=100) == expected
+    with pytest.raises(RuntimeError) as err:
+        internal.load_from_stream([], memory_limit=100)
+    assert "no words loaded" == str(err.value)
+
+
+def test_compile_words_memory_limit(word_file, tmpdir):
+    output = str(tmpdir.join("words.mkpw"))
+    count = internal.compile_words(word_file, output, memory_limit=100)
+    expected = internal.load_words_from_file(word_file)
+    assert count == len(expected)
+    assert list(internal.load_words_from_file(output)) == expected
+    assert sorted(tmpdir.listdir()) == [tmpdir.join("words"), tmpdir.join("words.mkpw")]
+
+
+def test_compile_words_no_words(tmpdir):
+    path = tmpdir.join("empty.txt")
+    path.write("")
+    with pytest.raises(RuntimeError) as err:
+        internal.compile_words(str(path), str(tmpdir.join("empty.mkpw")))
+    assert "no words loaded" == str(err.value)
+    assert tmpdir.listdir() == [path]
+
+
+def test_compile_words_output_dir_missing(word_file, tmpdir):
+    with pytest.raises((IOError, OSError)) as err:
+        internal.compile_words(word_file, str(tmpdir.join("missing", "words.mkpw")))
+    assert err.value.errno == errno.ENOENT
+    # the error is that of opening the temporary file, not of removing it
+    assert getattr(err.value, "__context__", None) is None
+
+
+@pytest.mark.parametrize(
+    "params,expected",
+    [
+        ({}, ("a", "ab", "abc", "abd", "bcd", "quúux")),
+        ({"min_len": 3}, ("abc", "abd", "bcd", "quúux")),
+        ({"max_len": 2}, ("a", "ab")),
+        ({"min_len": 2, "max_len": 3}, ("ab", "abc", "abd", "bcd")),
+        ({"charset": "abc"}, ("a", "ab", "abc")),
+        ({"exclude": ["AB ", "bcd"]}, ("a", "abc", "abd", "quúux")),
+        ({"unique_prefix": 2}, ("a", "ab", "bcd", "quúux")),
+        ({"unique_prefix": 1}, ("a", "bcd", "quúux")),
+        ({"min_len": 2, "unique_prefix": 1}, ("ab", "bcd", "quúux")),
+    ],
+)
+def test_word_filter_apply(params, expected):
+    words = tuple(map(six.u, ("a", "ab", "abc", "abd", "bcd", "quúux")))
+    assert internal.WordFilter(**params).apply(words) == expected
+
+
+def test_word_filter_compile():
+    assert internal.WordFilter().compile() is None
+    assert internal.WordFilter(unique_prefix=3).compile() is None
+    test = internal.WordFilter(min_len=2, charset="ab").compile()
+    assert test("ab")
+    assert not test("a")
+    assert not test("abc")
+
+
+def test_word_filter_no_words():
+    with pytest.raises(ValueError) as err:
+        internal.WordFilter(min_len=10).apply(("a", "b"))
+    assert "no words match the word filter" == str(err.value)
+
+
+@pytest.mark.parametrize(
+    "params,msg",
+    [
+        ({"min_len": 0}, "'min_len' must be a positive integer if provided"),
+        ({"max_len": "2"}, "'max_len' must be a positive integer if provided"),
+        (
+            {"unique_prefix": 0},
+            "'unique_prefix' must be a positive integer if provided",
+        ),
+        ({"min_len": 3, "max_len": 2}, "'min_len' must not be greater than 'max_len'"),
+    ],
+)
+def test_word_filter_invalid(params, msg):
+    with pytest.raises(ValueError) as err:
+        internal.WordFilter(**params)
+    assert msg == str(err.value)
+
+
+def test_word_filter_hashable():
+    assert internal.WordFilter(charset="ba", exclude=["x"]) == internal.WordFilter(
+        charset="ab", exclude=["X"]
+    )
+    assert len(set([internal.WordFilter(), internal.WordFilter()])) == 1
+
+
+def test_word_cache_filtered(word_file):
+    cache = internal.WordCache()
+    word_filter = internal.WordFilter(max_len=4)
+    words = cache.get_file(word_file, word_filter)
+    assert words == word_filter.apply(cache.get_file(word_file))
+    assert cache.get_file(word_file, internal.WordFilter(max_len=4)) is words
+    assert cache.get_file(word_file, internal.WordFilter()) is cache.get_file(word_file)
+    assert len(cache) == 2
+    cache.invalidate(path=word_file)
+    assert len(cache) == 0
+
+
+def test_random_buffer_stats():
+    stats = api.Stats()
+    rand = internal.RandomBuffer(size=16, stats=stats)
+    rand.read(10)
+    rand.read(10)
+    rand.read(40)
+    assert stats.counters == {"urandom_bytes": 16 + 16 + 28}
+
+
+def test_words_cache_stats(word_file):
+    stats = api.Stats()
+    cache = internal.WordCache()
+    word_filter = internal.WordFilter(min_len=4)
+    cache.get_file(word_file, word_filter, stats)
+    cache.get_file(word_file, word_filter, stats)
+    cache.get_file(word_file, stats=stats)
+    assert stats.counters == {"loads": 1, "cache_hits": 2, "cache_misses": 2}
+
+
+def test_pack_indices():
+    assert internal.pack_indices([], 10) == 0
+    assert internal.pack_indices([1, 2, 3], 10) == (1 * 9 + 1) * 8 + 1
+    assert internal.pack_indices([3, 2, 1], 10, 0b101, 3) == 233 << 3 | 0b101
+    draws = [
+        (list(indices), case_bits)
+        for indices in itertools.permutations(range(5), 3)
+        for case_bits in range(8)
+    ]
+    keys = [internal.pack_indices(indices, 5, c, 3) for indices, c in draws]
+    assert sorted(keys) == list(range(internal.num_possible(5, 3) << 3))
+    assert [internal.unpack_indices(key, 5, 3, 3) for key in keys] == draws
+
+
+@pytest.mark.parametrize("key", [-1, 5 * 4 * 3])
+def test_unpack_indices_out_of_range(key):
+    with pytest.raises(ValueError) as err:
+        internal.unpack_indices(key, 5, 3)
+    assert "key out of range" == str(err.value)
+
+
+@pytest.mark.parametrize("keyspace", [1000, 7776**6 << 6])
+def test_seen_set(keyspace):
+    rand = _random.Random(1)
+    keys = set(rand.randrange(keyspace) for _ in range(200))
+    seen = internal.SeenSet(keyspace, len(keys))
+    assert (seen._bits is None) == (keyspace > 1000)
+    assert all(seen.add(key) for key in keys)
+    assert not any(seen.add(key) for key in keys)
+    assert len(seen) == len(keys)
+    with pytest.raises(ValueError) as err:
+        seen.add(keyspace)
+    assert "key out of range" == str(err.value)
+
+
+def test_seen_set_full():
+    seen = internal.SeenSet(1 << 200, 2)
+    assert seen.add(0) and seen.add(1 << 199)
+    assert not seen.add(0)
+    with pytest.raises(ValueError) as err:
+        seen.add(1)
+    assert "seen set is full" == str(err.value)
+
+
+def test_seeded_source():
+    import hashlib
+    import hmac
+
+    source = internal.SeededSource("seed")
+    data = source(100)
+    expected = b"".join(
+        hmac.new(
+            b"seed", bytes(bytearray(15)) + bytes(bytearray([i])), hashlib.sha512
+        ).digest()
+        for i in range(2)
+    )
+    assert data == expected[:100]
+    assert (
+        source(10)
+        == hmac.new(b"seed", bytes(bytearray(15)) + b"\x02", hashlib.sha512).digest()[
+            :10
+        ]
+    )
+    assert internal.SeededSource(b"seed")(100) == data
+    assert internal.SeededSource(six.text_type("seed"))(100) == data
+    assert internal.SeededSource("seed", stream=1)(100) != data
+    assert internal.SeededSource(42)(64) == internal.SeededSource("42")(64)
+    with pytest.raises(TypeError):
+        internal.SeededSource(4.2)
+
+
+def test_random_buffer_source():
+    stats = api.Stats()
+    rand = internal.RandomBuffer(size=16, stats=stats, source=internal.SeededSource(1))
+    data = rand.read(40)
+    assert data == internal.SeededSource(1)(64)[:40]
+    assert stats.counters == {"source_bytes": 40}
+
+
+def test_word_table():
+    table = internal.WordTable(["apple", "banana", "o'neil"])
+    assert table == ("apple", "banana", "o'neil")
+    assert table.cased == table + ("Apple", "Banana", "O'Neil")
+    assert table.cased is table.cased
+    assert table.rendered("-") == tuple(word + "-" for word in table.cased)
+    assert table.rendered("-") is table.rendered("-")
+    rendered = [table.rendered(str(i)) for i in range(internal.RENDERED_TABLES_MAX)]
+    assert table.rendered("0") is rendered[0]
+    table.rendered("new")
+    assert table.rendered("0") is not rendered[0]
+
+
+@pytest.mark.parametrize("delimiter", ["", " ", "--"])
+def test_render_words_word_table(delimiter):
+    words = ("apple", "banana", "cherry", "date")
+    table = internal.WordTable(words)
+    for indices in itertools.permutations(range(4), 3):
+        for case_bits in range(8):
+            expected = internal.render_words(words, indices, case_bits, delimiter)
+            actual = internal.render_words(table, indices, case_bits, delimiter)
+            assert actual == expected
+
+
+def test_words_cache_word_table(word_file):
+    cache = internal.WordCache()
+    assert isinstance(cache.get_list("eff1"), internal.WordTable)
+    words = cache.get_file(word_file, internal.WordFilter(min_len=4))
+    assert isinstance(words, internal.WordTable)
+
+
+def test_merge_words():
+    assert internal.merge_words([("a", "c"), ("b", "c", "d"), ()]) == list("abcd")
+
+
+def test_calculate_schema_entropy():
+    assert internal.calculate_schema_entropy([2, 4], random_case=False) == 3
+    assert internal.calculate_schema_entropy([2, 4]) == 5
+
+
+def test_word_sources():
+    assert internal.word_sources("eff1") == [("list", "eff1")]
+    assert internal.word_sources(six.text_type("eff1")) == [("list", "eff1")]
+    assert internal.word_sources(["eff2", "words.txt"]) == [
+        ("list", "eff2"),
+        ("file", "words.txt"),
+    ]
+
+
+def test_word_cache_merged(word_file):
+    words = internal.load_words_from_file(word_file)
+    cache = internal.WordCache()
+    merged = cache.get_merged([("file", word_file), ("list", "eff1")])
+    assert isinstance(merged, internal.WordTable)
+    assert list(merged) == sorted(set(words) | set(cache.get_list("eff1")))
+    assert cache.get_merged([("list", "eff1"), ("file", word_file)]) is merged
+    assert cache.get_merged([("list", "eff1")]) is cache.get_list("eff1")
+    assert len(cache) == 3
+    cache.invalidate(path=word_file)
+    assert len(cache) == 1
+    with pytest.raises(ValueError) as err:
+        cache.get_merged([("url", "x"), ("list", "eff1")])
+    assert "unknown kind of word source: 'url'" == str(err.value)
+
+
+def test_word_cache_schema(word_file):
+    cache = internal.WordCache()
+    schema = [[("list", "eff1")], [("file", word_file), ("list", "eff2")]]
+    words, positions = cache.get_schema(schema)
+    assert isinstance(words, internal.WordTable)
+    eff1, middle = cache.get_list("eff1"), cache.get_merged(schema[1])
+    assert [words[i] for i in positions[0]] == list(eff1)
+    assert [words[i] for i in positions[1]] == list(middle)
+    again = cache.get_schema([schema[0], schema[1][::-1]])
+    assert again[0] is words and again[1] is positions
+    word_filter = internal.WordFilter(max_len=4)
+    filtered, _ = cache.get_schema(schema, word_filter)
+    assert filtered is not words
+    assert cache.get_schema(schema, word_filter)[0] is filtered
+    cache.invalidate(path=word_file)
+    assert cache.get_schema(schema)[0] is not words
+
+
+def test_length_histogram():
+    assert internal.length_histogram(["a", "bb", "cc", "dddd"]) == (0, 1, 2, 0, 1)
+    table = internal.WordTable(["a", "bb", "cc"])
+    assert internal.length_histogram(table) == (0, 1, 2)
+    assert internal.length_histogram(table) is table.lengths
+
+
+def test_shortest_config():
+    long_words = ("long", (0, 0, 0, 0, 0, 0, 0, 0, 256))
+    short_words = ("short", (0, 0, 0, 16, 240))
+    config = internal.shortest_config([long_words, short_words], 32, delimiters="-")
+    assert config == {
+        "source": "short",
+        "min_len": None,
+        "max_len": None,
+        "random_case": True,
+        "delimiter": "-",
+        "num_words": 4,
+        "entropy": internal.calculate_entropy(256, 4),
+        "expected_length": 4 * (16 * 3 + 240 * 4) / 256 + 3,
+    }
+    config = internal.shortest_config([short_words], 24, random_cases=[False])
+    assert (config["min_len"], config["max_len"], config["num_words"]) == (
+        None,
+        None,
+        4,
+    )
+    config = internal.shortest_config([short_words], 8, max_lens=[3])
+    assert (config["max_len"], config["num_words"]) == (3, 2)
+
+
+def test_shortest_config_unreachable():
+    with pytest.raises(ValueError) as err:
+        internal.shortest_config([("tiny", (0, 2))], 80)
+    assert "no configuration reaches 80 entropy bits" == str(err.value)
+    # 5 words in random case have less than 16 bits without repeating
+    with pytest.raises(ValueError) as err:
+        internal.shortest_config([("five", (0, 5))], 16)
+    assert "no configuration reaches 16 entropy bits" == str(err.value)
+
+
+def test_length_buckets():
+    words = ["a", "bb", "c", "dddd"]
+    assert internal.length_buckets(words) == ((1, (0, 2)), (2, (1,)), (4, (3,)))
+    table = internal.WordTable(words)
+    assert internal.length_buckets(table) is table.buckets
+
+
+@pytest.mark.parametrize("exact", [False, True])
+@pytest.mark.parametrize(
+    "num_words,chars", [(1, 1), (2, 4), (3, 6), (3, 9), (4, 8), (2, 8), (2, 100)]
+)
+def test_length_table_counts(exact, num_words, chars):
+    words = ["a", "bb", "cc", "ddd", "eeee", "ffff", "g"]
+    table = internal.LengthTable(
+        internal.length_buckets(words), num_words, chars, exact
+    )
+    fits = [
+        p
+        for p in itertools.permutations(range(len(words)), num_words)
+        if (sum(len(words[i]) for i in p) == chars)
+        or (not exact and sum(len(words[i]) for i in p) < chars)
+    ]
+    assert table.num_possible() == len(fits)
+    rand = internal.RandomBuffer(source=internal.SeededSource(1))
+    drawn = set(tuple(table.sample(rand)) for _ in range(40 * len(fits)))
+    assert drawn == set(fits)
+
+
+@pytest.mark.parametrize("exact", [False, True])
+def test_length_table_clamps_chars(exact):
+    buckets = internal.length_buckets(internal.WORDS_CACHE.get_list("eff-large"))
+    table = internal.LengthTable(buckets, 3, 20000, exact)
+    assert table.chars == 20000
+    # the 3 longest words have 9 characters each
+    assert all(len(row) <= 28 for counts in table.counts for row in counts)
+    if exact:
+        assert table.num_possible() == 0
+    else:
+        assert table.num_possible() == internal.num_possible(7776, 3)
+        assert len(set(table.sample())) == 3
+
+
+def test_length_table_uniform():
+    words = ["a", "bb", "cc", "ddd", "eeee", "ffff", "g"]
+    table = internal.LengthTable(internal.length_buckets(words), 3, 6, exact=True)
+    rand = internal.RandomBuffer(source=internal.SeededSource(2))
+    counts = {}
+    for _ in range(36000):
+        key = tuple(table.sample(rand))
+        counts[key] = counts.get(key, 0) + 1
+    assert len(counts) == table.num_possible() == 36
+    assert 850 < min(counts.values()) <= max(counts.values()) < 1150
+
+
+def test_calculate_length_table():
+    buckets = internal.length_buckets(internal.WORDS_CACHE.get_list("eff-large"))
+    table, bits = internal.calculate_length_table(buckets, 64)
+    assert table.num_words == 6
+    assert bits == math.log(table.num_possible(), 2) + 6
+    assert table.chars == 64 - 5
+    smaller, _ = internal.calculate_length_table(buckets, 64, num_words=5)
+    assert math.log(smaller.num_possible(), 2) + 5 < internal.ENTROPY_DEFAULT
+    with pytest.raises(ValueError) as err:
+        internal.calculate_length_table(buckets, 32)
+    msg = "entropy bits (70) for 7 words of at most 32 characters is less than 80"
+    assert msg == str(err.value)
+    with pytest.raises(ValueError) as err:
+        internal.calculate_length_table(buckets, 10, num_words=3)
+    assert "no passphrases of 3 words fit in 10 characters" == str(err.value)
+    table, bits = internal.calculate_length_table(buckets, 20000)
+    assert table.num_words == 6
+    assert bits == math.log(internal.num_possible(7776, 6), 2) + 6
+    with pytest.raises(ValueError) as err:
+        internal.calculate_length_table(buckets, 20000, num_words=3, exact=True)
+    assert "no passphrases fit in 20000 characters" == str(err.value)
+
+
+def test_calculate_length_table_cached():
+    words = internal.WordTable(["aim", "art", "civil", "rinse", "t-shirt"])
+    table, bits = internal.calculate_length_table(words, 20, num_words=3)
+    assert table.buckets == words.buckets
+    again, _ = internal.calculate_length_table(words, 20, num_words=3)
+    assert again is table
+    assert words.length_table(3, table.chars) is table
+    other, _ = internal.calculate_length_table(words.buckets, 20, num_words=3)
+    assert other is not table
+    assert other.num_possible() == table.num_possible()
+    for chars in range(internal.LENGTH_TABLES_MAX + 1):
+        words.length_table(1, chars)
+    assert words.length_table(3, table.chars) is not table
@@ -1,3 +1,4 @@
+import json
 from subprocess import Popen, PIPE
 import sys
 
@@ -44,12 +45,42 @@ def test_main_invalid_times(param, arg):
 
 
 @pytest.mark.parametrize("param", ["-f", "--word-file"])
-def test_main_not_both_word_list_and_word_file(param, word_file):
-    rc, out, err = run(param, word_file, "--word-list", internal.WORD_LIST_DEFAULT)
-    assert not out
+def test_main_word_list_and_word_file(param, word_file):
+    rc, out, err = run(param, word_file, "-w", "eff1", "-w", "eff2", "-n", "3", "-q")
+    assert rc == 0
+    assert len(out.decode("utf-8").split()) == 3
+
+
+def test_main_schema(word_file):
+    rc, out, err = run("--schema", "eff1,eff2+%s" % word_file, "-t", "5", "-q")
+    assert rc == 0
+    lines = out.decode("utf-8").splitlines()
+    assert len(lines) == 5
+    assert all(len(line.split()) == 2 for line in lines)
+
+
+@pytest.mark.parametrize(
+    "args,msg",
+    [
+        (
+            ["--schema", "eff1,eff2", "-w", "eff1"],
+            "--schema is not allowed with --word-list or --word-file",
+        ),
+        (
+            ["--schema", "eff1,eff2", "-n", "2"],
+            "--num-words is not allowed with --schema",
+        ),
+        (
+            ["--schema", "eff1,missing-words"],
+            "word file does not exist or is not readable: missing-words",
+        ),
+    ],
+)
+def test_main_schema_invalid(args, msg):
+    rc, out, err = run(*args)
     assert rc == 1
-    msg = err.decode("utf-8").strip()
-    assert msg == "only one of --word-list and --word-file is allowed"
+    assert not out
+    assert err.decode("utf-8").strip() == msg
 
 
 @pytest.mark.parametrize("param", ["-f", "--word-file"])
@@ -111,3 +142,328 @@ def test_main_not_run(capsys):
     out, err = capsys.readouterr()
     assert not out
     assert not err
+
+
+@pytest.mark.parametrize("num_lines", [0, 1, 2, 3, 7])
+def test_write_lines(num_lines):
+    from mkpassphrase import main
+
+    class Stream(object):
+        def __init__(self):
+            self.writes = []
+
+        def write(self, s):
+            self.writes.append(s)
+
+        def flush(self):
+            pass
+
+    stream = Stream()
+    lines = ("line%d" % i for i in range(num_lines))
+    main.write_lines(stream, lines, block_size=3)
+    assert len(stream.writes) == (num_lines + 2) // 3
+    assert "".join(stream.writes) == "".join("line%d\n" % i for i in range(num_lines))
+
+
+@pytest.mark.parametrize("param", ["-j", "--jobs"])
+def test_main_invalid_jobs(param):
+    rc, out, err = run(param, "0")
+    assert rc == 1
+    assert not out
+    msg = err.decode("utf-8").strip()
+    assert msg == "--jobs must be positive if provided"
+
+
+def test_main_run_success_jobs():
+    times = 5
+    rc, out, err = run("--times", str(times), "--jobs", "2", "--unordered", "-q")
+    assert rc == 0
+    assert not err
+    lines = [l.strip() for l in out.decode("utf-8").strip().split("\n") if l.strip()]
+    assert len(lines) == times
+
+
+def test_main_compile(word_file):
+    from mkpassphrase import packed
+
+    output = word_file + packed.SUFFIX
+    rc, out, err = run("compile", word_file, "-o", output)
+    assert rc == 0
+    assert not err
+    count = len(internal.load_words_from_file(word_file))
+    assert out.decode("utf-8").strip() == "compiled {} words to {}".format(
+        count, output
+    )
+    assert packed.is_packed(output)
+
+    rc, out, err = run("-f", output, "-n", "3", "-q")
+    assert rc == 0
+    assert not err
+    assert len(out.decode("utf-8").strip().split(internal.DELIMITER)) == 3
+
+
+def test_main_compile_word_file_not_accessible(word_file):
+    path = word_file + ".xxx"
+    rc, out, err = run("compile", path)
+    assert rc == 1
+    assert not out
+    msg = err.decode("utf-8").strip()
+    assert msg == "word file does not exist or is not readable: {}".format(path)
+
+
+@pytest.mark.parametrize("option", [["--unique"], ["--seed", "1"]])
+def test_main_compile_generation_options(word_file, option):
+    rc, out, err = run("compile", word_file, *option)
+    assert rc == 2
+    assert not out
+    assert "unrecognized arguments" in err.decode("utf-8")
+
+
+def test_main_compile_output_not_writable(word_file, tmpdir):
+    output = str(tmpdir.join("missing", "words.mkpw"))
+    rc, out, err = run("compile", word_file, "-o", output)
+    assert rc == 1
+    assert not out
+    msg = err.decode("utf-8").strip()
+    assert msg == "can't write {}: No such file or directory".format(output)
+
+
+def test_main_does_not_import_pkg_resources():
+    code = (
+        "import sys; from mkpassphrase import main; main.main(['-q']); "
+        "print('pkg_resources' in sys.modules)"
+    )
+    proc = Popen([sys.executable, "-c", code], stdout=PIPE, stderr=PIPE)
+    out, err = proc.communicate()
+    assert proc.returncode == 0
+    assert not err
+    assert out.decode("utf-8").split()[-1] == "False"
+
+
+def test_main_serve_invalid_pool_size():
+    rc, out, err = run("serve", "--pool-size", "0")
+    assert rc == 1
+    assert not out
+    assert err.decode("utf-8").strip() == "--pool-size must be positive"
+
+
+def test_main_compile_max_memory(word_file):
+    from mkpassphrase import packed
+
+    output = word_file + packed.SUFFIX
+    rc, out, err = run("compile", word_file, "-o", output, "-m", "1", "--progress")
+    assert rc == 0
+    assert err.decode("utf-8").startswith("read 20 lines, 0 temporary files")
+    assert list(internal.load_words_from_file(output)) == (
+        internal.load_words_from_file(word_file)
+    )
+
+
+@pytest.mark.parametrize("param", ["--min-len", "--max-len", "--unique-prefix"])
+def test_main_invalid_word_filter(param):
+    rc, out, err = run(param, "0")
+    assert rc == 1
+    assert not out
+    msg = err.decode("utf-8").strip()
+    assert msg == "{} must be positive if provided".format(param)
+
+
+@pytest.mark.parametrize(
+    "args,msg",
+    [
+        (["--min-len", "50"], "no words match the word filter"),
+        (["--charset", "xyz"], "no words match the word filter"),
+        (["-s", "100000", "-w", "eff1"], "is less than 100000"),
+    ],
+)
+def test_main_generation_errors(args, msg):
+    rc, out, err = run(*args)
+    assert rc == 1
+    assert not out
+    err = err.decode("utf-8").strip()
+    assert msg in err
+    assert "Traceback" not in err
+
+
+def test_main_word_filter(word_file, tmpdir):
+    exclude_file = tmpdir.join("exclude.txt")
+    exclude_file.write("green\nmauve\n")
+    rc, out, err = run(
+        "-f",
+        word_file,
+        "--min-len",
+        "4",
+        "--max-len",
+        "5",
+        "--charset",
+        "abcdefghijklmnopqrstuvwxyz",
+        "--exclude-file",
+        str(exclude_file),
+        "-n",
+        "2",
+        "-l",
+        "-q",
+        "-t",
+        "10",
+    )
+    assert rc == 0
+    assert not err
+    for line in out.decode("utf-8").strip().split("\n"):
+        words = set(line.split(internal.DELIMITER))
+        assert words <= set(["anise", "blue", "quux", "quuux"])
+
+
+def test_main_stats(word_file):
+    rc, out, err = run("-q", "-t", "3", "-f", word_file, "--stats", "json")
+    assert rc == 0
+    assert len(out.splitlines()) == 3
+    stats = json.loads(err.decode("utf-8"))
+    assert stats["counters"]["passphrases"] == 3
+    assert stats["counters"]["loads"] == 1
+    assert set(stats["timings"]) == set(["load", "calculate", "sample", "output"])
+
+
+def test_main_stats_text():
+    rc, out, err = run("-q", "--stats")
+    assert rc == 0
+    assert "passphrases                1" in err.decode("utf-8").splitlines()
+
+
+@pytest.mark.parametrize("format", ["text", "nul", "csv", "jsonl"])
+def test_main_output(format, tmpdir):
+    path = str(tmpdir.join("out"))
+    rc, out, err = run("-t", "5", "-n", "4", "-o", path, "--format", format)
+    assert rc == 0
+    assert not out
+    assert err.decode("utf-8").strip().endswith("-bit security level")
+    with open(path, "rb") as f:
+        data = f.read().decode("utf-8")
+    if format == "nul":
+        lines = data.split("\0")[:-1]
+    else:
+        lines = data.splitlines()
+    if format == "csv":
+        assert lines.pop(0) == "passphrase,entropy,num_words"
+        assert all(line.endswith(",4") for line in lines)
+    elif format == "jsonl":
+        assert all(json.loads(line)["num_words"] == 4 for line in lines)
+    assert len(lines) == 5
+
+
+def test_main_format_stdout():
+    rc, out, err = run("-q", "-t", "3", "--format", "jsonl", "--fsync")
+    assert rc == 1
+    assert err.decode("utf-8").strip() == "--fsync requires --output"
+    rc, out, err = run("-q", "-t", "3", "--format", "jsonl")
+    assert rc == 0
+    records = [json.loads(line) for line in out.decode("utf-8").splitlines()]
+    assert len(records) == 3
+    assert len(records[0]["passphrase"].split()) == records[0]["num_words"]
+
+
+def test_main_unique():
+    rc, out, err = run("-q", "-w", "eff1", "-n", "1", "-t", "600", "--unique")
+    assert rc == 0
+    lines = out.decode("utf-8").splitlines()
+    assert len(set(lines)) == len(lines) == 600
+    rc, out, err = run("-w", "eff1", "-n", "1", "-l", "-t", "700", "--unique")
+    assert rc == 1
+    msg = "'count' (700) must be at most 0.5 of the 1296 possible passphrases"
+    assert err.decode("utf-8").strip() == msg
+    rc, out, err = run("-q", "-s", "2000", "-w", "eff1", "-t", "2", "--unique")
+    assert rc == 0
+    assert len(set(out.decode("utf-8").splitlines())) == 2
+    rc, out, err = run("-t", "5", "--unique", "-j", "2")
+    assert rc == 1
+    assert err.decode("utf-8").strip() == "--unique is not allowed with --jobs"
+
+
+def test_main_seed():
+    rc, out, err = run("-t", "3", "--seed", "abc")
+    assert rc == 0
+    lines = out.decode("utf-8").splitlines()
+    assert lines[-1].endswith("(NOT SECURE: generated from --seed for testing only)")
+    assert run("-t", "3", "--seed", "abc")[1] == out
+    assert run("-t", "3", "--seed", "abd")[1] != out
+
+
+def test_main_optimize_length():
+    rc, out, err = run("--optimize", "length", "-t", "3")
+    assert rc == 0
+    lines = out.decode("utf-8").splitlines()
+    assert lines[-1].startswith("optimized for length: --word-list ")
+    assert lines[-2].endswith("-bit security level")
+    num_words = int(lines[-1].split("--num-words ")[1].split()[0])
+    assert all(len(line.split()) == num_words for line in lines[:3])
+
+
+@pytest.mark.parametrize(
+    "args,msg",
+    [
+        (["-n", "3"], "--num-words is not allowed with --optimize"),
+        (
+            ["--unique-prefix", "3"],
+            "--schema and --unique-prefix are not allowed with --optimize",
+        ),
+    ],
+)
+def test_main_optimize_invalid(args, msg):
+    rc, out, err = run("--optimize", "length", *args)
+    assert rc == 1
+    assert not out
+    assert err.decode("utf-8").strip() == msg
+
+
+@pytest.mark.parametrize(
+    "args,msg",
+    [
+        (["--charset", "q"], "no words match the word filter"),
+        (["-s", "1000000"], "no configuration reaches 1000000 entropy bits"),
+    ],
+)
+def test_main_optimize_errors(args, msg):
+    rc, out, err = run("--optimize", "length", *args)
+    assert rc == 1
+    assert not out
+    assert err.decode("utf-8").strip() == msg
+
+
+@pytest.mark.parametrize(
+    "args,check",
+    [
+        (["--max-length", "40"], lambda size: size <= 40),
+        (["--exact-length", "36", "-s", "60"], lambda size: size == 36),
+    ],
+)
+def test_main_length(args, check):
+    rc, out, err = run("-t", "20", "-q", *args)
+    assert rc == 0
+    lines = out.decode("utf-8").splitlines()
+    assert len(lines) == 20
+    assert all(check(len(line)) for line in lines)
+
+
+@pytest.mark.parametrize(
+    "args,msg",
+    [
+        (
+            ["--max-length", "30", "--exact-length", "30"],
+            "only one of --max-length and --exact-length is allowed",
+        ),
+        (
+            ["--max-length", "30", "--optimize", "length"],
+            "--schema and --optimize are not allowed with --max-length or "
+            "--exact-length",
+        ),
+        (["--exact-length", "0"], "--exact-length must be positive if provided"),
+        (
+            ["--max-length", "20"],
+            "entropy bits (44) for 4 words of at most 20 characters is less than 80",
+        ),
+    ],
+)
+def test_main_length_invalid(args, msg):
+    rc, out, err = run(*args)
+    assert rc == 1
+    assert not out
+    assert err.decode("utf-8").strip() == msg
@@ -0,0 +1,162 @@
+# coding=utf-8
+
+from __future__ import absolute_import, division, print_function
+
+import io
+import subprocess
+import sys
+
+import six
+
+import pytest
+
+from mkpassphrase import internal, packed
+
+
+def pack(words):
+    stream = io.BytesIO()
+    count = packed.write_packed(stream, words)
+    assert count == len(words)
+    return stream.getvalue()
+
+
+@pytest.mark.parametrize("words", [[], ["a"], ["a", "bb", "ccc"]])
+def test_packed_words_roundtrip(words):
+    result = packed.PackedWords(pack(words))
+    assert len(result) == len(words)
+    assert list(result) == words
+    assert result[:] == words
+
+
+def test_packed_words_unicode(words):
+    words = sorted(set(w.lower() for w in words))
+    assert list(packed.PackedWords(pack(words))) == words
+
+
+def test_packed_words_index():
+    result = packed.PackedWords(pack(["a", "b", "c"]))
+    assert result[-1] == "c"
+    assert result[0:3:2] == ["a", "c"]
+    assert isinstance(result[0], six.text_type)
+    with pytest.raises(IndexError):
+        result[3]
+
+
+@pytest.mark.parametrize(
+    "data,msg",
+    [
+        (b"", "packed wordlist too short"),
+        (b"x" * packed.HEADER.size, "not a packed wordlist"),
+        (
+            packed.HEADER.pack(packed.MAGIC, 2, 0, 0, 0, 0),
+            "unsupported packed wordlist version: 2",
+        ),
+        (
+            packed.HEADER.pack(packed.MAGIC, packed.VERSION, 0, 0, 1, 0),
+            "packed wordlist corrupt or truncated",
+        ),
+        (
+            packed.HEADER.pack(packed.MAGIC, packed.VERSION, 0, 0, 1, 40),
+            "packed wordlist corrupt or truncated",
+        ),
+    ],
+)
+def test_packed_words_invalid(data, msg):
+    with pytest.raises(packed.FormatError) as err:
+        packed.PackedWords(data)
+    assert msg == str(err.value)
+
+
+def test_open_packed(word_file, tmpdir):
+    output = str(tmpdir.join("words" + packed.SUFFIX))
+    count = internal.compile_words(word_file, output)
+    expected = internal.load_words_from_file(word_file)
+    assert count == len(expected)
+    assert packed.is_packed(output)
+    assert not packed.is_packed(word_file)
+    result = packed.open_packed(output)
+    try:
+        assert list(result) == expected
+    finally:
+        result.close()
+
+
+def test_load_words_from_file_packed(word_file, tmpdir):
+    output = str(tmpdir.join("words" + packed.SUFFIX))
+    internal.compile_words(word_file, output)
+    result = internal.load_words_from_file(output)
+    assert isinstance(result, packed.PackedWords)
+    assert list(result) == internal.load_words_from_file(word_file)
+    assert internal.WORDS_CACHE.get_file(output)[0] == result[0]
+
+
+@pytest.fixture
+def shared_memory():
+    return pytest.importorskip("multiprocessing.shared_memory")
+
+
+def test_share_and_attach_words(shared_memory):
+    words = ["a", "bb", "café"]
+    shared = packed.share_words(words)
+    try:
+        assert isinstance(shared, packed.PackedWords)
+        assert list(shared) == words
+        attached = packed.attach_words(shared.name)
+        assert attached.name == shared.name
+        assert list(attached) == words
+        attached.close()
+        assert list(shared) == words
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+def test_attach_words_invalid(shared_memory):
+    shm = shared_memory.SharedMemory(create=True, size=packed.HEADER.size)
+    try:
+        with pytest.raises(packed.FormatError) as err:
+            packed.attach_words(shm.name)
+        assert "not a packed wordlist" == str(err.value)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def test_attach_words_outlives_process(shared_memory):
+    shared = packed.share_words(["a", "b"])
+    try:
+        code = "from mkpassphrase import packed; print(len(packed.attach_words(%r)))"
+        output = subprocess.check_output([sys.executable, "-c", code % shared.name])
+        assert output.strip() == b"2"
+        attached = packed.attach_words(shared.name)
+        assert list(attached) == ["a", "b"]
+        attached.close()
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+def test_word_cache_share_list(shared_memory):
+    cache, other = internal.WordCache(), internal.WordCache()
+    words = cache.get_list("eff1")
+    cache.get_list("eff1", internal.WordFilter(max_len=4))
+    shared = cache.share_list("eff1")
+    try:
+        assert isinstance(shared, packed.SharedWords)
+        assert len(cache) == 1
+        assert cache.get_list("eff1") is shared
+        attached = other.share_list("eff1", shared.name)
+        assert other.get_list("eff1") is attached
+        assert list(attached) == list(words)
+        assert other.get_list("eff1", internal.WordFilter(max_len=4)) == tuple(
+            word for word in words if len(word) <= 4
+        )
+        other.invalidate()
+        attached.close()
+        with pytest.raises(ValueError) as err:
+            other.share_list("nonexistent", shared.name)
+        assert "Invalid wordlist: nonexistent" == str(err.value)
+    finally:
+        cache.invalidate()
+        shared.close()
+        shared.unlink()
@@ -0,0 +1,191 @@
+# coding=utf-8
+
+import asyncio
+import json
+
+import pytest
+
+from mkpassphrase import internal, server
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+        asyncio.set_event_loop(None)
+
+
+async def request(reader, writer, obj):
+    writer.write(json.dumps(obj).encode("utf-8") + b"\n")
+    await writer.drain()
+    return json.loads((await reader.readline()).decode("utf-8"))
+
+
+def test_server_tcp(word_file):
+    async def check():
+        srv = server.PassphraseServer(
+            pool_size=8, max_served=1000, word_files=[word_file]
+        )
+        listener = await srv.start("127.0.0.1", 0)
+        host, port = listener.sockets[0].getsockname()[:2]
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            policy = {"word_file": word_file, "num_words": 3}
+            response = await request(reader, writer, {"policy": policy, "count": 5})
+            assert response["num_words"] == 3
+            assert response["entropy"] > 0
+            passphrases = response["passphrases"]
+            assert len(passphrases) == 5
+            for passphrase in passphrases:
+                assert len(passphrase.split(internal.DELIMITER)) == 3
+
+            # let the pool refill
+            await asyncio.sleep(0.05)
+            response = await request(reader, writer, {"stats": True})
+            stats = response["stats"]
+            assert stats["requests"] == 2
+            assert stats["errors"] == 0
+            assert stats["latency"]["samples"] == 1
+            (pool,) = stats["pools"]
+            assert pool["policy"] == policy
+            assert pool["depth"] == pool["size"] == 8
+            assert pool["served"] == 5
+            generation = stats["generation"]
+            generated = pool["generated"] + pool["misses"]
+            assert generation["counters"]["passphrases"] == generated
+
+            response = await request(
+                reader, writer, {"stats": True, "format": "prometheus"}
+            )
+            metrics = response["stats"].splitlines()
+            assert "mkpassphrase_requests_total 3" in metrics
+            assert "mkpassphrase_pooled 8" in metrics
+
+            response = await request(reader, writer, {"count": 0})
+            assert response == {"error": "'count' must be a positive integer"}
+        finally:
+            writer.close()
+            await srv.close()
+
+    run(check())
+
+
+def test_server_unix_default_policy(tmpdir):
+    async def check():
+        srv = server.PassphraseServer(pool_size=4)
+        path = str(tmpdir.join("sock"))
+        await srv.start(path=path)
+        reader, writer = await asyncio.open_unix_connection(path)
+        try:
+            response = await request(reader, writer, {})
+            assert len(response["passphrases"]) == 1
+            assert response["entropy"] >= internal.ENTROPY_DEFAULT
+        finally:
+            writer.close()
+            await srv.close()
+
+    run(check())
+
+
+@pytest.mark.parametrize(
+    "line,error",
+    [
+        (b"nope\n", "request must be a JSON object"),
+        (b"[]\n", "request must be an object"),
+        (b'{"count": 1.5}\n', "'count' must be a positive integer"),
+        (b'{"count": 100000}\n', "'count' must be at most 1024"),
+        (
+            b'{"stats": true, "format": "xml"}\n',
+            "'format' must be one of: json, prometheus",
+        ),
+        (b'{"policy": []}\n', "'policy' must be an object"),
+        (b'{"policy": {"x": 1}}\n', "unknown policy keys: x"),
+        (
+            b'{"policy": {"schema": "eff1"}}\n',
+            "'schema' must be a non-empty list",
+        ),
+        (b'{"policy": {"word_file": "/dev/zero"}}\n', "unknown policy keys: word_file"),
+        (
+            b'{"policy": {"schema": ["eff1", "/dev/zero"]}}\n',
+            "'schema' items must be word lists or the server's files",
+        ),
+        (
+            b'{"policy": {"max_length": 20000}}\n',
+            "'max_length' must be an integer from 1 to 256",
+        ),
+        (
+            b'{"policy": {"entropy": 1e9}}\n',
+            "'entropy' must be a number from 1 to 256",
+        ),
+        (
+            b'{"policy": {"num_words": true}}\n',
+            "'num_words' must be an integer from 1 to 32",
+        ),
+        (
+            b'{"policy": {"delimiter": 1}}\n',
+            "'delimiter' must be a string of at most 256 characters",
+        ),
+        (
+            b'{"policy": {"word_list": "eff1", "num_words": 1}}\n',
+            "policy has too few possible passphrases to serve 262144",
+        ),
+    ],
+)
+def test_server_handle_line_errors(line, error):
+    async def check():
+        srv = server.PassphraseServer()
+        response = json.loads((await srv.handle_line(line)).decode("utf-8"))
+        assert response == {"error": error}
+        assert srv.errors == 1
+
+    run(check())
+
+
+@pytest.mark.parametrize(
+    "words,random_case",
+    [
+        ("abcdefghijklmnopqrstuvwxyz", False),
+        # caseless words render the same in title case
+        ([str(i) for i in range(100, 126)], True),
+    ],
+)
+def test_pool_never_repeats(tmpdir, words, random_case):
+    word_file = tmpdir.join("words.txt")
+    word_file.write("\n".join(words))
+    path = str(word_file)
+    policy = {"word_file": path, "num_words": 1, "random_case": random_case}
+
+    async def check():
+        # 26 possible passphrases are enough to serve 12 with a pool of 1
+        srv = server.PassphraseServer(pool_size=1, max_served=12, word_files=[path])
+        pool = await srv.get_pool(policy)
+        taken = []
+        for _ in range(12):
+            await asyncio.sleep(0)
+            taken.extend(pool.take(1))
+        assert len(set(taken)) == 12
+        with pytest.raises(server.RequestError, match="policy is exhausted"):
+            pool.take(1)
+        await srv.close()
+
+        srv = server.PassphraseServer(pool_size=1, max_served=13, word_files=[path])
+        with pytest.raises(server.RequestError, match="too few possible"):
+            await srv.get_pool(policy)
+
+    run(check())
+
+
+def test_get_pool_concurrent():
+    async def check():
+        srv = server.PassphraseServer(pool_size=4)
+        policy = {"word_list": "eff1", "num_words": 4}
+        pools = await asyncio.gather(*[srv.get_pool(policy) for _ in range(3)])
+        assert pools[0] is pools[1] is pools[2]
+        assert len(srv.pools) == 1
+        assert not srv._pending
+        await srv.close()
+
+    run(check())
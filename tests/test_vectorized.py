@@ -0,0 +1,68 @@
+# coding=utf-8
+
+import collections
+
+import pytest
+
+from mkpassphrase import api, internal, vectorized
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.mark.parametrize("n,k", [(10, 2), (7776, 6), (70000, 3)])
+def test_sample_index_matrix(n, k):
+    indices = vectorized.sample_index_matrix(internal.RandomBuffer(), n, 500, k)
+    assert indices.shape == (500, k)
+    assert indices.min() >= 0 and indices.max() < n
+    for row in indices.tolist():
+        assert len(set(row)) == k
+
+
+def test_sample_index_matrix_uniform():
+    rows = vectorized.sample_index_matrix(internal.RandomBuffer(), 5, 20000, 2)
+    counts = collections.Counter(map(tuple, rows.tolist()))
+    # all 20 ordered pairs of distinct indices, each about 1000 times
+    assert len(counts) == 20
+    assert all(800 < count < 1200 for count in counts.values())
+
+
+@pytest.mark.parametrize("random_case", [True, False])
+def test_generate(random_case):
+    words = internal.WORDS_CACHE.get_list("eff-large")
+    table = vectorized.WordTable(words, random_case)
+    passphrases = vectorized.generate(
+        table, internal.RandomBuffer(), 200, 4, "_", pad="|"
+    )
+    assert len(passphrases) == 200
+    lower = set(words)
+    titled = False
+    for passphrase in passphrases:
+        assert passphrase.startswith("|") and passphrase.endswith("|")
+        for word in passphrase[1:-1].split("_"):
+            assert word in lower or word.lower() in lower
+            titled = titled or word not in lower
+    assert titled == random_case
+
+
+def test_passphrase_generator_vectorized():
+    generator = api.PassphraseGenerator(word_list="eff-large", num_words=5)
+    count = api.VECTORIZE_MIN_COUNT
+    passphrases = generator.generate_many(count)
+    assert generator._vectorized()
+    assert len(passphrases) == count
+    for passphrase in passphrases:
+        generator.encode(passphrase)
+    iterated = list(generator.iterate(api.VECTORIZE_CHUNK_SIZE + 3))
+    assert len(iterated) == api.VECTORIZE_CHUNK_SIZE + 3
+    assert len(set(iterated)) == len(iterated)
+
+
+@pytest.mark.parametrize(
+    "params", [dict(vectorize=False), dict(seed=1), dict(word_list="eff1")]
+)
+def test_passphrase_generator_not_vectorized(params):
+    params.setdefault("word_list", "eff-large")
+    params["num_words"] = 400 if params["word_list"] == "eff1" else 5
+    generator = api.PassphraseGenerator(**params)
+    generator.generate_many(api.VECTORIZE_MIN_COUNT)
+    assert not generator._vectorized()